@@ -73,6 +73,7 @@ class ProjectPaths(BaseSettings):
     INTERIM_DATA: Path = DATA_PATH / "interim"
     EXTERNAL_DATA: Path = DATA_PATH / "external"
     PROCESSED_DATA: Path = DATA_PATH / "processed"
+    CACHE_DATA: Path = DATA_PATH / "cache"
 
 
 class ProjectEnvs(BaseSettings):
@@ -0,0 +1,136 @@
+import asyncio
+import os.path
+import signal
+from threading import Event
+from typing import List, Optional
+
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    TaskID,
+    TextColumn,
+    TimeRemainingColumn,
+    TransferSpeedColumn,
+)
+
+try:
+    import aiohttp
+except ImportError:  # only AsyncDownloadUtils needs it, DownloadUtils covers the same API with urllib
+    aiohttp = None
+
+
+class AsyncDownloadUtils:
+    """
+    Asyncio counterpart of `DownloadUtils` for many files, with the same `download_urls` API.
+
+    All downloads share one aiohttp session whose connector keeps connections alive and pools them per
+    host, so consecutive files from a host reuse a connection instead of paying a new TCP/TLS handshake
+    each. `max_workers` bounds the downloads running at once and `max_per_host` those against a single
+    host.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 64,
+        max_per_host: int = 8,
+        keepalive_timeout: float = 30.0,
+        chunk_size: int = 65536,
+        timeout: float = 60.0,
+    ):
+        """Initialize the download manager.
+
+        Args:
+            max_workers: Maximum number of concurrent downloads
+            max_per_host: Maximum number of concurrent downloads, and pooled connections, per host
+            keepalive_timeout: Seconds an idle connection is kept open for the next request to its host
+            chunk_size: Size of the chunks written to disk
+            timeout: Seconds without any byte received, or to connect, before a download fails
+        """
+        self.progress = Progress(
+            TextColumn("[bold blue]{task.fields[filename]}", justify="right"),
+            BarColumn(bar_width=None),
+            "[progress.percentage]{task.percentage:>3.1f}%",
+            "•",
+            DownloadColumn(),
+            "•",
+            TransferSpeedColumn(),
+            "•",
+            TimeRemainingColumn(),
+        )
+        self.done_event = Event()
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        # Setup signal handler
+        signal.signal(signal.SIGINT, self._handle_sigint)
+
+    def _handle_sigint(self, signum, frame):
+        """Handle SIGINT (Ctrl+C) signal."""
+        self.done_event.set()
+
+    def download_urls(self, urls: List[str], dest_dir: str) -> None:
+        """Download multiple files to the given directory.
+
+        Args:
+            urls: List of URLs to download
+            dest_dir: Destination directory for downloaded files
+        """
+        asyncio.run(self.download_urls_async(urls, dest_dir))
+
+    async def download_urls_async(self, urls: List[str], dest_dir: str) -> None:
+        """Download multiple files to the given directory from a running event loop.
+
+        Args:
+            urls: List of URLs to download
+            dest_dir: Destination directory for downloaded files
+        """
+        _require_aiohttp()
+        connector = aiohttp.TCPConnector(
+            limit=self.max_workers,
+            limit_per_host=self.max_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        headers = {"User-Agent": "Mozilla/5.0"}
+        with self.progress:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+                downloads = []
+                for url in urls:
+                    filename = url.split("/")[-1]
+                    dest_path = os.path.join(dest_dir, filename)
+                    task_id = self.progress.add_task("download", filename=filename, start=False)
+                    downloads.append(self._copy_url(session, url, dest_path, task_id))
+                # The connector limits bound the concurrency, pending downloads wait for a free connection
+                await asyncio.gather(*downloads)
+
+    async def _copy_url(
+        self, session: "aiohttp.ClientSession", url: str, path: str, task_id: Optional[TaskID] = None
+    ) -> None:
+        """Download a single file from URL to the specified path."""
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                if task_id is not None:
+                    self.progress.update(task_id, total=response.content_length)
+                    self.progress.start_task(task_id)
+
+                with open(path, "wb") as dest_file:
+                    async for data in response.content.iter_chunked(self.chunk_size):
+                        dest_file.write(data)
+                        if task_id is not None:
+                            self.progress.update(task_id, advance=len(data))
+                        if self.done_event.is_set():
+                            return
+
+        except Exception as e:
+            self.progress.console.log(f"Failed to download {url}: {e}")
+
+
+def _require_aiohttp() -> None:
+    if aiohttp is None:
+        raise ImportError("AsyncDownloadUtils requires the aiohttp package: pip install aiohttp")
@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+from threading import Lock
+from typing import Any, Dict, Tuple
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_POOL_CONNECTIONS = 64
+
+
+class AWSClientCache:
+    """
+    Process-wide cache of boto3 clients shared by every `AWSUtils` instance.
+
+    Clients are thread-safe and expensive to build (endpoint and service model loading take hundreds of
+    milliseconds), so one client is created per service, region and connection settings, on first use.
+    Each client gets its own boto3 session, since sessions are not thread-safe, and a connection pool of
+    `max_pool_connections` kept-alive connections so concurrent transfers reuse connections instead of
+    opening new ones. The process id is part of the key, so forked workers build their own clients rather
+    than sharing the parent connections.
+    """
+
+    _clients: Dict[Tuple, Any] = {}
+    _lock = Lock()
+
+    @classmethod
+    def get_client(
+        cls,
+        service: str,
+        region: str = "us-east-1",
+        max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+        **config: Any,
+    ):
+        """
+        Return the shared client for `service` in `region`, creating it on first use.
+
+        Args:
+            service: AWS service name, e.g. "s3" or "ssm".
+            region: AWS region name.
+            max_pool_connections: Size of the client connection pool, at least the number of threads using it.
+            **config: Extra `botocore.config.Config` options, part of the cache key, e.g. retries={"mode": "adaptive"}.
+        """
+        # Serialized, as config values may be unhashable, e.g. the nested retries dictionary
+        key = (os.getpid(), service, region, max_pool_connections, json.dumps(config, sort_keys=True, default=repr))
+        client = cls._clients.get(key)
+        if client is None:
+            with cls._lock:
+                client = cls._clients.get(key)
+                if client is None:
+                    client = boto3.session.Session().client(
+                        service,
+                        region_name=region,
+                        config=cls.client_config(max_pool_connections, **config),
+                    )
+                    cls._clients[key] = client
+                    logger.debug(f"Created {service} client for {region} with {max_pool_connections} connections")
+        return client
+
+    @staticmethod
+    def client_config(max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS, **config: Any) -> Config:
+        """Connection settings used for the shared clients, also usable for per-instance resources."""
+        return Config(max_pool_connections=max_pool_connections, tcp_keepalive=True, **config)
+
+    @classmethod
+    def clear(cls) -> None:
+        """Drop every cached client, e.g. after rotating credentials."""
+        with cls._lock:
+            cls._clients.clear()
@@ -0,0 +1,283 @@
+from array import array
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+class DocumentIdInterner:
+    """Maps document IDs to dense int32 codes, each distinct ID being stored only once."""
+
+    MAX_CODE = np.iinfo(np.int32).max
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def intern(self, doc_id: str) -> int:
+        """
+        Return the code of a document ID, assigning the next free code on first sight.
+
+        Args:
+            doc_id (str): Document ID.
+
+        Returns:
+            int: The int32 code of the document ID.
+        """
+        codes = self._codes
+        if doc_id not in codes:
+            self._check_capacity(1)
+            codes[doc_id] = len(codes)
+        return codes[doc_id]
+
+    def intern_many(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """
+        Intern a sequence of document IDs.
+
+        Args:
+            doc_ids (Iterable[str]): Document IDs.
+
+        Returns:
+            np.ndarray: int32 array of codes.
+        """
+        return np.fromiter(self.intern_all(list(doc_ids)), dtype=np.int32)
+
+    def lookup(self, code: int) -> str:
+        """
+        Return the document ID of a code.
+
+        Args:
+            code (int): Code returned by `intern`.
+
+        Returns:
+            str: The original document ID.
+        """
+        if len(self._ids) != len(self._codes):
+            self._ids = list(self._codes)
+        return self._ids[code]
+
+    def intern_all(self, doc_ids: List[str]) -> Iterable[int]:
+        """
+        Intern a list of document IDs, keeping the per-ID work in C-level dict calls.
+
+        Args:
+            doc_ids (List[str]): Document IDs.
+
+        Returns:
+            Iterable[int]: Lazy iterator over the codes, e.g. to extend an `array("i")`.
+        """
+        codes = self._codes
+        for doc_id in doc_ids:
+            if doc_id not in codes:
+                codes[doc_id] = len(codes)
+        self._check_capacity(0)
+        return map(codes.__getitem__, doc_ids)
+
+    def _check_capacity(self, extra: int) -> None:
+        if len(self._codes) + extra - 1 > self.MAX_CODE:
+            raise OverflowError("More distinct document IDs than int32 codes")
+
+
+class CompactRuns:
+    """
+    Ragged list of document ID lists stored as one contiguous int32 code array plus int64 offsets:
+    the documents of query `i` are `codes[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, codes: np.ndarray, offsets: np.ndarray):
+        """
+        Args:
+            codes (np.ndarray): Concatenated int32 document codes of all queries.
+            offsets (np.ndarray): int64 start offset of every query followed by the total length.
+        """
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_lists(cls, doc_lists: Iterable[Iterable[str]], interner: DocumentIdInterner) -> "CompactRuns":
+        """
+        Build compact runs from lists of document IDs without materializing intermediate Python lists.
+
+        Args:
+            doc_lists (Iterable[Iterable[str]]): Document IDs per query.
+            interner (DocumentIdInterner): Interner shared by every run evaluated together.
+
+        Returns:
+            CompactRuns: The compact representation.
+        """
+        codes = array("i")
+        offsets = array("q", [0])
+        for doc_ids in doc_lists:
+            codes.extend(interner.intern_all(list(doc_ids)))
+            offsets.append(len(codes))
+        return cls(np.frombuffer(codes, dtype=np.int32), np.frombuffer(offsets, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.codes[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Number of documents per query."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the code and offset arrays."""
+        return self.codes.nbytes + self.offsets.nbytes
+
+
+class CompactRetrievalEvaluator:
+    """
+    Computes the `RetrievalEvaluator` metrics for many queries at once on `CompactRuns`.
+
+    Membership of every retrieved document in the relevant set of its query is resolved with a single
+    sorted search over `(query, code)` keys instead of two Python sets per query. Queries are processed
+    in blocks of `block_size` to bound the size of the temporary arrays.
+    """
+
+    _METRICS = (
+        "average_precision",
+        "reciprocal_rank",
+        "ndcg",
+        "precision",
+        "recall",
+        "precision_at_k",
+        "recall_at_k",
+    )
+
+    def __init__(self, retrieved: CompactRuns, relevant: CompactRuns, block_size: int = 100_000):
+        """
+        Args:
+            retrieved (CompactRuns): Retrieved document codes per query.
+            relevant (CompactRuns): Relevant document codes per query, interned with the same interner.
+            block_size (int): Number of queries evaluated per vectorized block.
+        """
+        if len(retrieved) != len(relevant):
+            raise ValueError(f"Got {len(retrieved)} retrieved lists for {len(relevant)} relevant lists")
+        self.retrieved = retrieved
+        self.relevant = relevant
+        self.block_size = block_size
+
+    def per_query_metrics(self, k: int = 10) -> Dict[str, np.ndarray]:
+        """
+        Calculate every metric for every query.
+
+        Args:
+            k (int): Rank position for the `@k` metrics and NDCG.
+
+        Returns:
+            Dict[str, np.ndarray]: float64 arrays of length `len(retrieved)` keyed by metric name.
+        """
+        blocks = [
+            self._block_metrics(start, min(start + self.block_size, len(self.retrieved)), k)
+            for start in range(0, len(self.retrieved), self.block_size)
+        ]
+        if not blocks:
+            return {name: np.zeros(0) for name in self._METRICS}
+        return {name: np.concatenate([block[name] for block in blocks]) for name in self._METRICS}
+
+    def mean_metrics(self, k: int = 10) -> Dict[str, float]:
+        """
+        Calculate the mean of every metric over all queries.
+
+        Args:
+            k (int): Rank position for the `@k` metrics and NDCG.
+
+        Returns:
+            Dict[str, float]: Mean metric values keyed by metric name.
+        """
+        metrics = self.per_query_metrics(k)
+        return {name: float(values.mean()) if len(values) else 0.0 for name, values in metrics.items()}
+
+    def mean_average_precision(self) -> float:
+        """
+        Calculate Mean Average Precision (MAP) for all queries.
+
+        Returns:
+            float: Mean Average Precision score.
+        """
+        return self._mean("average_precision")
+
+    def mean_reciprocal_rank(self) -> float:
+        """
+        Calculate Mean Reciprocal Rank (MRR) for all queries.
+
+        Returns:
+            float: Mean Reciprocal Rank score.
+        """
+        return self._mean("reciprocal_rank")
+
+    def _mean(self, name: str, k: int = 10) -> float:
+        values = self.per_query_metrics(k)[name]
+        return float(values.mean()) if len(values) else 0.0
+
+    def _block_metrics(self, start: int, stop: int, k: int) -> Dict[str, np.ndarray]:
+        num_queries = stop - start
+        ret_offsets = self.retrieved.offsets[start:stop + 1]
+        rel_offsets = self.relevant.offsets[start:stop + 1]
+        ret_lengths = np.diff(ret_offsets)
+        rel_lengths = np.diff(rel_offsets)
+
+        ret_query = np.repeat(np.arange(num_queries, dtype=np.int64), ret_lengths)
+        rel_query = np.repeat(np.arange(num_queries, dtype=np.int64), rel_lengths)
+        ret_codes = self.retrieved.codes[ret_offsets[0]:ret_offsets[-1]].astype(np.int64)
+        rel_codes = self.relevant.codes[rel_offsets[0]:rel_offsets[-1]].astype(np.int64)
+        ret_keys = (ret_query << 32) | ret_codes
+        rel_keys = np.unique((rel_query << 32) | rel_codes)
+
+        if len(rel_keys):
+            positions = np.minimum(np.searchsorted(rel_keys, ret_keys), len(rel_keys) - 1)
+            hits = rel_keys[positions] == ret_keys
+        else:
+            hits = np.zeros(len(ret_keys), dtype=bool)
+        ranks = np.arange(len(ret_keys), dtype=np.int64) - np.repeat(ret_offsets[:-1] - ret_offsets[0], ret_lengths)
+
+        # Average precision over the hits of each query, as in RetrievalEvaluator.average_precision
+        hit_counts = np.cumsum(hits)
+        hits_before_query = np.concatenate(([0], hit_counts))[ret_offsets[:-1] - ret_offsets[0]]
+        hits_at_rank = hit_counts - np.repeat(hits_before_query, ret_lengths)
+        hit_query = ret_query[hits]
+        hit_ranks = ranks[hits]
+        precision_sum = np.bincount(hit_query, weights=hits_at_rank[hits] / (hit_ranks + 1), minlength=num_queries)
+        num_hits = np.bincount(hit_query, minlength=num_queries)
+        average_precision = _safe_divide(precision_sum, num_hits)
+
+        reciprocal_rank = np.zeros(num_queries)
+        first_hit_query, first_hit_index = np.unique(hit_query, return_index=True)
+        reciprocal_rank[first_hit_query] = 1.0 / (hit_ranks[first_hit_index] + 1)
+
+        # DCG over the whole ranking and IDCG over min(k, |relevant|) positions, as in RetrievalEvaluator.ndcg
+        dcg = np.bincount(hit_query, weights=1.0 / np.log2(hit_ranks + 2), minlength=num_queries)
+        ideal_lengths = np.minimum(rel_lengths, k)
+        ideal_ranks = np.arange(int(ideal_lengths.max(initial=0)))
+        discounts = np.concatenate(([0.0], np.cumsum(1.0 / np.log2(ideal_ranks + 2))))
+        ndcg = _safe_divide(dcg, discounts[ideal_lengths])
+
+        unique_hits = np.unique(ret_keys[hits])
+        unique_hit_counts = np.bincount(unique_hits >> 32, minlength=num_queries)
+        unique_hits_at_k = np.unique(ret_keys[hits][hit_ranks < k])
+        unique_hit_counts_at_k = np.bincount(unique_hits_at_k >> 32, minlength=num_queries)
+
+        return {
+            "average_precision": average_precision,
+            "reciprocal_rank": reciprocal_rank,
+            "ndcg": ndcg,
+            "precision": _safe_divide(unique_hit_counts, ret_lengths),
+            "recall": _safe_divide(unique_hit_counts, rel_lengths),
+            "precision_at_k": _safe_divide(unique_hit_counts_at_k, np.minimum(ret_lengths, k)),
+            "recall_at_k": _safe_divide(unique_hit_counts_at_k, rel_lengths),
+        }
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise division returning 0.0 where the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    result = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
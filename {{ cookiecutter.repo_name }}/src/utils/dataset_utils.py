@@ -0,0 +1,232 @@
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # only this module needs pyarrow, the rest of the project imports without it
+    pa = pc = ds = pq = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+# Filters are pyarrow expressions, e.g. `pc.field("score") > 0.5`, or DNF tuples, e.g. [("split", "=", "train")]
+Filter = Union["pc.Expression", List]
+
+
+class DatasetUtils:
+    """
+    Columnar dataset I/O for the data stages, in Parquet or Arrow IPC (Feather v2) files picked by suffix.
+
+    Parquet is compressed and suited to storage and exchange: reads only decode the projected `columns`,
+    and `filters` skip the row groups whose statistics cannot match before filtering the remaining rows.
+    Arrow IPC files are written uncompressed so they can be memory-mapped: reads are zero-copy views of
+    the page cache, which worker processes reading the same file share instead of each holding a copy.
+
+    `iter_batches` and `write_batches` stream record batches, so files larger than memory can be
+    transformed batch by batch.
+    """
+
+    @staticmethod
+    def from_records(records: Iterable[Dict[str, Any]], schema: Optional["pa.Schema"] = None) -> "pa.Table":
+        """
+        Build a table from dictionaries, e.g. the records of a JSONL file.
+
+        Args:
+            records: One dictionary per row
+            schema: Column types, inferred from the records if None
+
+        Returns:
+            The records as a table
+        """
+        _require_pyarrow()
+        return pa.Table.from_pylist(list(records), schema=schema)
+
+    @staticmethod
+    def write_table(
+        table: "pa.Table",
+        path: Union[str, Path],
+        compression: Optional[str] = None,
+        row_group_size: int = 128 * 1024,
+    ) -> None:
+        """
+        Write a table to a Parquet or Arrow IPC file, replacing it atomically.
+
+        Args:
+            table: Table to write
+            path: Target file, ".parquet" or ".arrow"/".feather"/".ipc"
+            compression: Parquet codec (default "zstd") or Arrow IPC codec (default None, required to memory-map)
+            row_group_size: Maximum number of rows per Parquet row group, the unit skipped by filters
+        """
+        _require_pyarrow()
+        with _atomic_path(path) as tmp_path:
+            match _format(path):
+                case "parquet":
+                    pq.write_table(table, tmp_path, compression=compression or "zstd", row_group_size=row_group_size)
+                case "arrow":
+                    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(
+                        sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=compression)
+                    ) as writer:
+                        writer.write_table(table, max_chunksize=row_group_size)
+        logger.info(f"Written {table.num_rows} rows to file: {path}")
+
+    @staticmethod
+    def write_batches(
+        batches: Iterable["pa.RecordBatch"],
+        path: Union[str, Path],
+        schema: "pa.Schema",
+        compression: Optional[str] = None,
+        row_group_size: int = 128 * 1024,
+    ) -> int:
+        """
+        Write record batches to a Parquet or Arrow IPC file as they come, replacing it atomically.
+
+        Args:
+            batches: Record batches of `schema`, e.g. a generator transforming `iter_batches` of another file
+            path: Target file, ".parquet" or ".arrow"/".feather"/".ipc"
+            schema: Schema of every batch
+            compression: Parquet codec (default "zstd") or Arrow IPC codec (default None, required to memory-map)
+            row_group_size: Maximum number of rows per Parquet row group
+
+        Returns:
+            Number of rows written
+        """
+        _require_pyarrow()
+        num_rows = 0
+        with _atomic_path(path) as tmp_path:
+            match _format(path):
+                case "parquet":
+                    with pq.ParquetWriter(tmp_path, schema, compression=compression or "zstd") as writer:
+                        for batch in batches:
+                            writer.write_batch(batch, row_group_size=row_group_size)
+                            num_rows += batch.num_rows
+                case "arrow":
+                    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(
+                        sink, schema, options=pa.ipc.IpcWriteOptions(compression=compression)
+                    ) as writer:
+                        for batch in batches:
+                            writer.write_batch(batch)
+                            num_rows += batch.num_rows
+        logger.info(f"Written {num_rows} rows to file: {path}")
+        return num_rows
+
+    @staticmethod
+    def read_table(
+        path: Union[str, Path],
+        columns: Optional[List[str]] = None,
+        filters: Optional[Filter] = None,
+        memory_map: bool = True,
+    ) -> "pa.Table":
+        """
+        Read a Parquet or Arrow IPC file, only decoding the requested columns and matching rows.
+
+        Args:
+            path: File to read, ".parquet" or ".arrow"/".feather"/".ipc"
+            columns: Columns to read, all if None
+            filters: Row filter, a pyarrow expression or DNF tuples such as [("split", "=", "train")]
+            memory_map: If True, map the file instead of reading it, zero-copy for uncompressed Arrow files
+
+        Returns:
+            The selected columns and rows
+        """
+        _require_pyarrow()
+        match _format(path):
+            case "parquet":
+                return pq.read_table(path, columns=columns, filters=filters, memory_map=memory_map)
+            case "arrow":
+                source = pa.memory_map(str(path), "r") if memory_map else pa.OSFile(str(path), "rb")
+                table = pa.ipc.open_file(source).read_all()
+                # Filter before projecting, the expression may use columns that are not returned
+                if filters is not None:
+                    table = table.filter(_expression(filters))
+                return table.select(columns) if columns is not None else table
+
+    @staticmethod
+    def iter_batches(
+        path: Union[str, Path],
+        columns: Optional[List[str]] = None,
+        filters: Optional[Filter] = None,
+        batch_size: int = 64 * 1024,
+    ) -> Iterator["pa.RecordBatch"]:
+        """
+        Stream the record batches of a Parquet or Arrow IPC file, holding about one batch in memory.
+
+        Parquet row groups whose statistics cannot match `filters` are skipped without being read.
+        Arrow files are memory-mapped and their batches filtered one at a time.
+
+        Args:
+            path: File to read, ".parquet" or ".arrow"/".feather"/".ipc"
+            columns: Columns to read, all if None
+            filters: Row filter, a pyarrow expression or DNF tuples such as [("split", "=", "train")]
+            batch_size: Maximum number of rows per Parquet batch, Arrow batches keep their written size
+
+        Yields:
+            Record batches with the selected columns and rows, empty batches skipped
+        """
+        _require_pyarrow()
+        expression = _expression(filters) if filters is not None else None
+        match _format(path):
+            case "parquet":
+                dataset = ds.dataset(str(path), format="parquet")
+                for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+                    if batch.num_rows:
+                        yield batch
+            case "arrow":
+                with pa.memory_map(str(path), "r") as source:
+                    reader = pa.ipc.open_file(source)
+                    for i in range(reader.num_record_batches):
+                        batches = [reader.get_batch(i)]
+                        if expression is not None:
+                            batches = pa.Table.from_batches(batches).filter(expression).to_batches()
+                        for batch in batches:
+                            if batch.num_rows:
+                                yield batch.select(columns) if columns is not None else batch
+
+    @staticmethod
+    def schema(path: Union[str, Path]) -> "pa.Schema":
+        """Schema of a Parquet or Arrow IPC file, read from its footer only."""
+        _require_pyarrow()
+        match _format(path):
+            case "parquet":
+                return pq.read_schema(path)
+            case "arrow":
+                with pa.memory_map(str(path), "r") as source:
+                    return pa.ipc.open_file(source).schema
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Dataset I/O requires the pyarrow package: pip install pyarrow")
+
+
+def _format(path: Union[str, Path]) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    if suffix in ARROW_SUFFIXES:
+        return "arrow"
+    raise ValueError(f"Unknown dataset format {suffix!r}, expected one of {PARQUET_SUFFIXES + ARROW_SUFFIXES}")
+
+
+def _expression(filters: Filter) -> "pc.Expression":
+    return filters if isinstance(filters, pc.Expression) else pq.filters_to_expression(filters)
+
+
+@contextmanager
+def _atomic_path(path: Union[str, Path]) -> Iterator[str]:
+    """Temporary path next to `path`, renamed over it when the block succeeds and removed otherwise."""
+    # Unique per call, threads of one process may write the same path concurrently
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
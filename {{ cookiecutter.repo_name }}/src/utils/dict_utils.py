@@ -52,7 +52,7 @@ class DictionaryUtils:
         elif isinstance(data, list):
             return [DictionaryUtils.sanitize_json(item) for item in data]
         elif isinstance(data, str):
-            return TextUtils.sanitize_string(data)
+            return TextUtils.sanitize(data)
         return data
 
     @staticmethod
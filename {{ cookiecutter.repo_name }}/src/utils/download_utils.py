@@ -1,11 +1,19 @@
+import hashlib
+import json
 import os.path
 import signal
+import time
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from threading import Event
-from typing import Optional, List
+from http.client import IncompleteRead
+from pathlib import Path
+from threading import BoundedSemaphore, Event, Lock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 
+from pydantic import BaseModel
 from rich.progress import (
     BarColumn,
     DownloadColumn,
@@ -16,12 +24,162 @@ from rich.progress import (
     TransferSpeedColumn,
 )
 
+from src import PROJECT_PATHS
+from src.utils.file_utils import FileUtils, json_dumps
+from src.utils.transfer_scheduler_utils import TransferScheduler, parse_retry_after
+
+MiB = 1024 * 1024
+USER_AGENT = "Mozilla/5.0"
+# Seconds between two saves of the segment offsets of a running download
+STATE_SAVE_INTERVAL = 2.0
+
+
+class DownloadResult(BaseModel):
+    url: str
+    path: str
+    status: str
+    size: int = 0
+    error: Optional[str] = None
+
+
+class ResourceChangedError(IOError):
+    """Raised when a resumed or segmented download finds the remote file changed since it started."""
+
+
+class ChecksumMismatchError(IOError):
+    """Raised when a downloaded file does not match its expected digest."""
+
+
+class DownloadSummary(BaseModel):
+    files: int = 0
+    downloaded: int = 0
+    not_modified: int = 0
+    skipped: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    bytes: int = 0
+    elapsed: float = 0.0
+
+
+class HttpCacheStats(BaseModel):
+    not_modified: int = 0
+    downloaded: int = 0
+    bytes_saved: int = 0
+    bytes_downloaded: int = 0
+
+
+class HttpCache:
+    """
+    Persistent index of the ETag and Last-Modified of every downloaded URL, used to send conditional
+    requests (If-None-Match / If-Modified-Since) and skip files the server reports unchanged with a 304.
+
+    An entry is only trusted while the local file still exists with the recorded size. The index is
+    written atomically by `save`, which `DownloadUtils.download_urls` calls once the downloads end.
+    """
+
+    def __init__(self, index_path: str | Path = PROJECT_PATHS.EXTERNAL_DATA / ".http_cache.json"):
+        self.index_path = Path(index_path)
+        self.stats = HttpCacheStats()
+        self._lock = Lock()
+        self._entries: Dict[str, Dict] = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def conditional_headers(self, url: str, path: str) -> Dict[str, str]:
+        """Conditional request headers for `url`, empty when `path` does not match its entry."""
+        with self._lock:
+            entry = self._entries.get(url)
+        if not entry or entry["path"] != os.path.abspath(path) or not os.path.exists(path):
+            return {}
+        if os.path.getsize(path) != entry["size"]:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_unchanged(self, url: str, remote: Dict) -> bool:
+        """Whether a response still carries the cached validators, for servers ignoring conditional requests."""
+        with self._lock:
+            entry = self._entries.get(url)
+        if not entry or remote.get("size") != entry["size"]:
+            return False
+        if entry.get("etag") and remote.get("etag"):
+            return entry["etag"] == remote["etag"]
+        return bool(entry.get("last_modified")) and entry["last_modified"] == remote.get("last_modified")
+
+    def record_hit(self, url: str) -> int:
+        with self._lock:
+            size = self._entries[url]["size"]
+            self.stats.not_modified += 1
+            self.stats.bytes_saved += size
+            return size
+
+    def record_download(self, url: str, path: str, remote: Dict) -> None:
+        size = os.path.getsize(path)
+        with self._lock:
+            self.stats.downloaded += 1
+            self.stats.bytes_downloaded += size
+            if remote.get("etag") or remote.get("last_modified"):
+                self._entries[url] = {
+                    "path": os.path.abspath(path),
+                    "size": size,
+                    "etag": remote.get("etag"),
+                    "last_modified": remote.get("last_modified"),
+                }
+            else:
+                self._entries.pop(url, None)
+
+    def save(self) -> None:
+        with self._lock:
+            entries = dict(self._entries)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_name(f"{self.index_path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.index_path)
+
+
 class DownloadUtils:
-    def __init__(self, max_workers: int = 4):
+    def __init__(
+        self,
+        max_workers: int = 4,
+        segments: int = 4,
+        segment_threshold: int = 32 * MiB,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+        chunk_size: int = MiB,
+        timeout: float = 60.0,
+        cache: Optional[HttpCache] = None,
+        scheduler: Optional[TransferScheduler] = None,
+        priority: str = "normal",
+    ):
         """Initialize the download manager.
-        
+
+        Every download starts with a single GET for `bytes=0-`: a 206 response tells the size and range
+        support, and files below `segment_threshold` are streamed from that same response. Larger files
+        are split in `segments` byte ranges downloaded in parallel, each retried on its own with
+        exponential backoff. Files are written to `<path>.part` next to a `<path>.part.json` state file,
+        saved every few seconds, so a failed or interrupted download resumes from the bytes already
+        written when the server supports ranges.
+
         Args:
             max_workers: Maximum number of concurrent downloads
+            segments: Number of parallel ranges per large file
+            segment_threshold: Minimum file size in bytes to download in several segments
+            max_attempts: Number of attempts per request or segment before the download fails
+            backoff: Delay in seconds before the first retry, doubled on every following one
+            chunk_size: Size of every read from a connection
+            timeout: Socket timeout in seconds
+            cache: Conditional-request cache, files the server reports unchanged are not downloaded again
+            scheduler: Bandwidth and request-rate limits shared with the other transfers of the process
+            priority: Priority class of these downloads in the scheduler, "high", "normal" or "low"
         """
         self.progress = Progress(
             TextColumn("[bold blue]{task.fields[filename]}", justify="right"),
@@ -36,7 +194,16 @@ class DownloadUtils:
         )
         self.done_event = Event()
         self.max_workers = max_workers
-        
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.priority = priority
+
         # Setup signal handler
         signal.signal(signal.SIGINT, self._handle_sigint)
 
@@ -44,45 +211,437 @@ class DownloadUtils:
         """Handle SIGINT (Ctrl+C) signal."""
         self.done_event.set()
 
-    def _copy_url(self, url: str, path: str, task_id: Optional[TaskID] = None) -> None:
-        """Download a single file from URL to the specified path."""
+    def _copy_url(
+        self,
+        url: str,
+        path: str,
+        task_id: Optional[TaskID] = None,
+        checksum: Optional[str] = None,
+        verbose: bool = True,
+    ) -> DownloadResult:
+        """Download a single file from URL to the specified path, resuming a previous partial download.
+
+        Args:
+            url: URL to download
+            path: Destination file path
+            task_id: Progress task advanced with the downloaded bytes
+            checksum: Expected digest as "<algorithm>:<hex>" or a SHA-256 hex digest, checked before
+                the file is moved to `path`
+            verbose: Whether to log every request and completed file, failures and retries are always logged
+        """
+        part_path, state_path = f"{path}.part", f"{path}.part.json"
         try:
-            self.progress.console.log(f"Requesting {url}")
-            request = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-            response = urlopen(request)
-            total_size = int(response.info()["Content-Length"])
-            
-            if task_id is not None:
-                self.progress.update(task_id, total=total_size)
-                
-            with open(path, "wb") as dest_file:
+            if verbose:
+                self.progress.console.log(f"Requesting {url}")
+            conditional_headers = self.cache.conditional_headers(url, path) if self.cache else {}
+            remote, response = self._probe(url, conditional_headers)
+            try:
+                if conditional_headers and (remote["not_modified"] or self.cache.is_unchanged(url, remote)):
+                    size = self.cache.record_hit(url)
+                    if task_id is not None:
+                        self.progress.update(task_id, total=size, completed=size)
+                    if verbose:
+                        self.progress.console.log(f"Not modified {path}")
+                    return DownloadResult(url=url, path=path, status="not_modified", size=size)
+                size = remote["size"]
                 if task_id is not None:
+                    self.progress.update(task_id, total=size)
                     self.progress.start_task(task_id)
-                    
-                for data in iter(partial(response.read, 32768), b""):
-                    dest_file.write(data)
-                    if task_id is not None:
-                        self.progress.update(task_id, advance=len(data))
-                    if self.done_event.is_set():
-                        return
-                        
-            self.progress.console.log(f"Downloaded {path}")
-            
+
+                segments = self._load_segments(state_path, part_path, url, remote) if remote["ranges"] else None
+                if segments is None and remote["ranges"] and size >= self.segment_threshold:
+                    segments = self._plan_segments(size)
+                    with open(part_path, "wb") as part_file:
+                        part_file.truncate(size)
+                elif segments is not None and task_id is not None:
+                    self.progress.update(task_id, advance=sum(segment["written"] for segment in segments))
+
+                if segments is not None:
+                    # Segments send their own ranged requests, the probe response is closed unread
+                    response.close()
+                    self._download_segments(url, part_path, state_path, remote, segments, task_id)
+                else:
+                    self._download_stream(url, part_path, task_id, response)
+            finally:
+                if response is not None:
+                    response.close()
+
+            if self.done_event.is_set():
+                self.progress.console.log(f"Paused {path}")
+                return DownloadResult(url=url, path=path, status="cancelled")
+            if checksum:
+                self._verify(part_path, checksum)
+            os.replace(part_path, path)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            if self.cache:
+                self.cache.record_download(url, path, remote)
+            if verbose:
+                self.progress.console.log(f"Downloaded {path}")
+            return DownloadResult(url=url, path=path, status="downloaded", size=os.path.getsize(path))
+
         except Exception as e:
+            # Restarting from the existing bytes would fail again, start over next time
+            if isinstance(e, (ResourceChangedError, ChecksumMismatchError)):
+                for stale_path in (part_path, state_path):
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
             self.progress.console.log(f"Failed to download {url}: {e}")
+            return DownloadResult(url=url, path=path, status="failed", error=str(e))
+
+    def _probe(self, url: str, conditional_headers: Optional[Dict[str, str]] = None) -> Tuple[Dict, Optional[Any]]:
+        """Size, validators and range support of a URL, from a possibly conditional GET for `bytes=0-`.
+
+        The response is returned unread, so a file too small to be segmented is streamed from it without
+        a second request. It is None when there is no body to read (304, or 416 for an empty file).
+        """
+        remote = {"size": None, "ranges": False, "validator": None, "etag": None, "last_modified": None}
+        headers = {"User-Agent": USER_AGENT, "Range": "bytes=0-", **(conditional_headers or {})}
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._acquire_request(url)
+                response = urlopen(Request(url, headers=headers), timeout=self.timeout)
+                break
+            except (URLError, OSError) as e:
+                if isinstance(e, HTTPError):
+                    if e.code == 304:
+                        return {**remote, "not_modified": True}, None
+                    # No byte 0 to return, i.e. an empty file, downloaded by a plain GET
+                    if e.code == 416:
+                        return {**remote, "not_modified": False}, None
+                retryable = not isinstance(e, HTTPError) or e.code >= 500 or e.code == 429
+                if not retryable or attempt == self.max_attempts:
+                    raise
+                delay = self._retry_delay(url, e, self.backoff * 2 ** (attempt - 1))
+                self.progress.console.log(f"Retrying {url} in {delay:.1f}s: {e}")
+                if self.done_event.wait(delay):
+                    raise
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        # A weak ETag cannot be used in If-Range, Last-Modified can
+        validator = etag if etag and not etag.startswith("W/") else last_modified
+        if response.status == 206:
+            # Content-Range: bytes 0-<last>/<size>, the size is "*" when unknown
+            size = response.headers.get("Content-Range", "").rpartition("/")[2]
+            ranges = True
+        else:
+            size = response.headers.get("Content-Length")
+            ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        size = int(size) if size and size.isdigit() else None
+        remote = {
+            "size": size,
+            "ranges": ranges and validator is not None and size is not None,
+            "validator": validator,
+            "etag": etag,
+            "last_modified": last_modified,
+            "not_modified": False,
+        }
+        return remote, response
+
+    def _plan_segments(self, size: int) -> List[Dict]:
+        num_segments = self.segments if size >= self.segment_threshold else 1
+        segment_size = -(-size // num_segments)
+        return [
+            {"start": start, "end": min(start + segment_size, size) - 1, "written": 0}
+            for start in range(0, size, segment_size)
+        ]
 
-    def download_urls(self, urls: List[str], dest_dir: str) -> None:
+    def _load_segments(self, state_path: str, part_path: str, url: str, remote: Dict) -> Optional[List[Dict]]:
+        if not (os.path.exists(state_path) and os.path.exists(part_path)):
+            return None
+        try:
+            with open(state_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (state.get("url"), state.get("size"), state.get("validator")) != (url, remote["size"], remote["validator"]):
+            self.progress.console.log(f"Restarting {url}: the remote file changed since the partial download")
+            return None
+        if os.path.getsize(part_path) != remote["size"]:
+            return None
+        self.progress.console.log(f"Resuming {url} from {sum(s['written'] for s in state['segments'])} bytes")
+        return state["segments"]
+
+    def _download_segments(
+        self,
+        url: str,
+        part_path: str,
+        state_path: str,
+        remote: Dict,
+        segments: List[Dict],
+        task_id: Optional[TaskID],
+    ) -> None:
+        lock = Lock()
+
+        def save_state() -> None:
+            with lock:
+                state = {"url": url, "size": remote["size"], "validator": remote["validator"], "segments": segments}
+                with FileUtils.open_atomic(state_path) as f:
+                    f.write(json_dumps(state))
+
+        download = partial(self._download_segment, url, part_path, remote["validator"], task_id, save_state)
+        pending = [segment for segment in segments if segment["start"] + segment["written"] <= segment["end"]]
+        if not pending:  # every segment written, e.g. a resume interrupted between the last byte and the rename
+            return
+        if len(pending) == 1:
+            download(pending[0])
+            return
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="download-segment") as pool:
+            for future in [pool.submit(download, segment) for segment in pending]:
+                future.result()
+
+    def _download_segment(
+        self, url: str, part_path: str, validator: str, task_id: Optional[TaskID], save_state, segment: Dict
+    ) -> None:
+        """Download the missing bytes of a segment, retrying from the last written byte with backoff."""
+        for attempt in range(1, self.max_attempts + 1):
+            start = segment["start"] + segment["written"]
+            try:
+                headers = {
+                    "User-Agent": USER_AGENT,
+                    "Range": f"bytes={start}-{segment['end']}",
+                    "If-Range": validator,
+                }
+                self._acquire_request(url)
+                with urlopen(Request(url, headers=headers), timeout=self.timeout) as response:
+                    # A full 200 response means the validator no longer matches
+                    if response.status != 206:
+                        raise ResourceChangedError(f"{url} changed during the download")
+                    with open(part_path, "r+b") as part_file:
+                        part_file.seek(start)
+                        saved_at = time.monotonic()
+                        for data in iter(partial(response.read, self.chunk_size), b""):
+                            data = data[:segment["end"] + 1 - segment["start"] - segment["written"]]
+                            part_file.write(data)
+                            segment["written"] += len(data)
+                            self._acquire_bytes(url, len(data))
+                            if task_id is not None:
+                                self.progress.update(task_id, advance=len(data))
+                            if self.done_event.is_set():
+                                return
+                            # The state must never count bytes still buffered, a killed process would lose them
+                            if time.monotonic() - saved_at >= STATE_SAVE_INTERVAL:
+                                part_file.flush()
+                                save_state()
+                                saved_at = time.monotonic()
+                if segment["start"] + segment["written"] <= segment["end"]:
+                    raise IncompleteRead(b"", segment["end"] + 1 - segment["start"] - segment["written"])
+                return
+            except (URLError, OSError, IncompleteRead) as e:
+                retryable = not isinstance(e, (ResourceChangedError, HTTPError)) or (
+                    isinstance(e, HTTPError) and (e.code >= 500 or e.code == 429)
+                )
+                if not retryable or attempt == self.max_attempts:
+                    raise
+                delay = self._retry_delay(url, e, self.backoff * 2 ** (attempt - 1))
+                self.progress.console.log(f"Retrying {url} bytes {start}-{segment['end']} in {delay:.1f}s: {e}")
+                if self.done_event.wait(delay):
+                    return
+            finally:
+                save_state()
+
+    def _download_stream(self, url: str, part_path: str, task_id: Optional[TaskID], response=None) -> None:
+        """Download without ranges, restarting from the first byte on every retry.
+
+        The first attempt reads `response` when given, e.g. the one of the probe request.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            written = 0
+            try:
+                if response is None:
+                    self._acquire_request(url)
+                    response = urlopen(Request(url, headers={"User-Agent": USER_AGENT}), timeout=self.timeout)
+                with response, open(part_path, "wb") as part_file:
+                    for data in iter(partial(response.read, self.chunk_size), b""):
+                        part_file.write(data)
+                        written += len(data)
+                        self._acquire_bytes(url, len(data))
+                        if task_id is not None:
+                            self.progress.update(task_id, advance=len(data))
+                        if self.done_event.is_set():
+                            return
+                return
+            except (URLError, OSError, IncompleteRead) as e:
+                response = None
+                if task_id is not None:
+                    self.progress.update(task_id, advance=-written)
+                if (isinstance(e, HTTPError) and e.code < 500 and e.code != 429) or attempt == self.max_attempts:
+                    raise
+                delay = self._retry_delay(url, e, self.backoff * 2 ** (attempt - 1))
+                self.progress.console.log(f"Retrying {url} in {delay:.1f}s: {e}")
+                if self.done_event.wait(delay):
+                    return
+
+    def _acquire_request(self, url: str) -> None:
+        if self.scheduler:
+            self.scheduler.acquire_request(urlparse(url).netloc, self.priority)
+
+    def _acquire_bytes(self, url: str, amount: int) -> None:
+        if self.scheduler:
+            self.scheduler.acquire_bytes(urlparse(url).netloc, amount, self.priority)
+
+    def _retry_delay(self, url: str, error: Exception, backoff: float = 0.0) -> float:
+        """Delay before retrying after `error`, at least the Retry-After of a 429 or 503 response.
+
+        The scheduler pauses the whole host for that delay, so the other downloads from it back off too.
+        """
+        if not (isinstance(error, HTTPError) and error.code in (429, 503)):
+            return backoff
+        retry_after = error.headers.get("Retry-After") if error.headers else None
+        if self.scheduler:
+            return max(backoff, self.scheduler.penalize(urlparse(url).netloc, retry_after, default=backoff))
+        return max(backoff, parse_retry_after(retry_after, default=backoff))
+
+    @staticmethod
+    def _verify(path: str, checksum: str) -> None:
+        algorithm, _, expected = checksum.rpartition(":")
+        digest = hashlib.new(algorithm or "sha256")
+        with open(path, "rb") as f:
+            for block in iter(partial(f.read, MiB), b""):
+                digest.update(block)
+        if digest.hexdigest() != expected.lower():
+            raise ChecksumMismatchError(
+                f"{algorithm or 'sha256'} checksum mismatch: expected {expected}, got {digest.hexdigest()}"
+            )
+
+    def download_urls(
+        self, urls: List[str], dest_dir: str, checksums: Optional[Dict[str, str]] = None
+    ) -> List[DownloadResult]:
         """Download multiple files to the given directory.
-        
+
         Args:
             urls: List of URLs to download
             dest_dir: Destination directory for downloaded files
+            checksums: Expected digest per URL, as "<algorithm>:<hex>" or a SHA-256 hex digest
+
+        Returns:
+            One result per URL, in the order of `urls`
+        """
+        checksums = checksums or {}
+        try:
+            with self.progress:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    futures = []
+                    for url in urls:
+                        filename = url.split("/")[-1]
+                        dest_path = os.path.join(dest_dir, filename)
+                        task_id = self.progress.add_task("download", filename=filename, start=False)
+                        self.progress.console.log(f"Starting download for {url}")
+                        futures.append(pool.submit(self._copy_url, url, dest_path, task_id, checksums.get(url)))
+                    return [future.result() for future in futures]
+        finally:
+            self._save_cache()
+
+    def download_stream(
+        self,
+        urls: Iterable[str],
+        dest_dir: str,
+        manifest_path: Optional[str] = None,
+        checksums: Optional[Dict[str, str]] = None,
+        queue_size: Optional[int] = None,
+        skip_completed: bool = True,
+    ) -> DownloadSummary:
+        """Download files from a lazily consumed iterator of URLs, for jobs too large to plan up front.
+
+        At most `queue_size` URLs are pulled from `urls` ahead of the running downloads, a single aggregate
+        progress line reports files/s, bytes/s and failures, and every result is appended to a JSONL
+        manifest as soon as its download ends. When the job is restarted with the same manifest, URLs
+        already downloaded (or not modified) are skipped.
+
+        Args:
+            urls: Iterable of URLs, e.g. a generator reading a file line by line
+            dest_dir: Destination directory for downloaded files
+            manifest_path: JSONL file receiving one `DownloadResult` per URL, defaults to `<dest_dir>/manifest.jsonl`
+            checksums: Expected digest per URL, as "<algorithm>:<hex>" or a SHA-256 hex digest
+            queue_size: Maximum number of URLs submitted and not finished, defaults to 4 per worker
+            skip_completed: Whether to skip the URLs recorded as completed in an existing manifest
+
+        Returns:
+            Counts of files and bytes per outcome
         """
-        with self.progress:
-            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
-                for url in urls:
-                    filename = url.split("/")[-1]
-                    dest_path = os.path.join(dest_dir, filename)
-                    task_id = self.progress.add_task("download", filename=filename, start=False)
-                    self.progress.console.log(f"Starting download for {url}")
-                    pool.submit(self._copy_url, url, dest_path, task_id)
+        checksums = checksums or {}
+        manifest_path = manifest_path or os.path.join(dest_dir, "manifest.jsonl")
+        completed = self._completed_urls(manifest_path) if skip_completed else set()
+        summary = DownloadSummary()
+        slots = BoundedSemaphore(queue_size or 4 * self.max_workers)
+        lock = Lock()
+        start = time.perf_counter()
+        progress = Progress(
+            TextColumn("[bold blue]{task.fields[files]} files"),
+            TextColumn("{task.fields[rate]:.1f} files/s"),
+            "•",
+            DownloadColumn(),
+            "•",
+            TransferSpeedColumn(),
+            "•",
+            TextColumn("[red]{task.fields[failed]} failed"),
+            console=self.progress.console,
+        )
+        task_id = progress.add_task("download", total=None, files=0, rate=0.0, failed=0)
+
+        def on_done(manifest, future) -> None:
+            try:
+                result = future.result()
+                with lock:
+                    manifest.write(result.model_dump_json() + "\n")
+                    manifest.flush()
+                    summary.files += 1
+                    summary.bytes += result.size if result.status == "downloaded" else 0
+                    setattr(summary, result.status, getattr(summary, result.status) + 1)
+                    summary.elapsed = time.perf_counter() - start
+                    progress.update(
+                        task_id,
+                        advance=result.size if result.status == "downloaded" else 0,
+                        files=summary.files,
+                        rate=summary.files / max(summary.elapsed, 1e-9),
+                        failed=summary.failed,
+                    )
+            finally:
+                # A failing callback must not leak its slot, the producer would block forever
+                slots.release()
+
+        try:
+            with progress, open(manifest_path, "a") as manifest:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    for url in urls:
+                        if url in completed:
+                            summary.skipped += 1
+                            continue
+                        # Blocks while queue_size downloads are pending, so the iterator is never read far ahead
+                        slots.acquire()
+                        if self.done_event.is_set():
+                            slots.release()
+                            break
+                        dest_path = os.path.join(dest_dir, url.split("/")[-1])
+                        future = pool.submit(self._copy_url, url, dest_path, None, checksums.get(url), False)
+                        future.add_done_callback(partial(on_done, manifest))
+        finally:
+            self._save_cache()
+        summary.elapsed = time.perf_counter() - start
+        self.progress.console.log(
+            f"Downloaded {summary.downloaded} files ({summary.bytes} bytes) in {summary.elapsed:.1f}s, "
+            f"{summary.not_modified} not modified, {summary.skipped} already done, {summary.failed} failed"
+        )
+        return summary
+
+    @staticmethod
+    def _completed_urls(manifest_path: str) -> Set[str]:
+        completed = set()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as manifest:
+                for line in manifest:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue
+                    if result.get("status") in ("downloaded", "not_modified"):
+                        completed.add(result["url"])
+        return completed
+
+    def _save_cache(self) -> None:
+        if self.cache:
+            self.cache.save()
+            stats = self.cache.stats
+            self.progress.console.log(
+                f"HTTP cache: {stats.not_modified} files not modified ({stats.bytes_saved} bytes saved), "
+                f"{stats.downloaded} downloaded ({stats.bytes_downloaded} bytes)"
+            )
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 
@@ -106,6 +106,30 @@ class RetrievalEvaluator:
             ap_sum += evaluator.average_precision()
         return ap_sum / len(retrievals)
 
+    @staticmethod
+    def per_query_metric(
+        retrievals: List[List[str]], relevant_docs: List[List[str]], metric: str = "average_precision", **kwargs
+    ) -> np.ndarray:
+        """
+        Calculate a metric for every query, e.g. as input of significance tests.
+
+        Args:
+            retrievals (List[List[str]]): List of lists of retrieved document IDs for multiple queries.
+            relevant_docs (List[List[str]]): List of lists of relevant document IDs for multiple queries.
+            metric (str): Name of a per-query metric method, e.g. "average_precision" or "ndcg".
+            **kwargs: Arguments of the metric method, e.g. `k=10`.
+
+        Returns:
+            np.ndarray: float64 array with one score per query.
+        """
+        return np.fromiter(
+            (
+                float(getattr(RetrievalEvaluator(retrieved, relevant), metric)(**kwargs))
+                for retrieved, relevant in zip(retrievals, relevant_docs)
+            ),
+            dtype=np.float64,
+        )
+
     def reciprocal_rank(self) -> float:
         """
         Calculate Reciprocal Rank (RR) of the retrieved documents.
@@ -242,3 +266,90 @@ class RetrievalEvaluator:
         if self.num_relevant == 0:
             return 0.0
         return self.precision_at_k(self.num_relevant)
+
+
+class MetricSums:
+    """
+    Additive per-query metric sums. Partial sums computed on separate shards, workers or
+    processes can be merged with `merge` and turned into means with `means`.
+    """
+
+    METRICS = ("map", "mrr", "ndcg", "precision_at_k", "recall_at_k")
+
+    def __init__(self, k: int = 10):
+        """
+        Args:
+            k (int): Rank position used for the NDCG, precision and recall metrics.
+        """
+        self.k = k
+        self.count = 0
+        self.sums: Dict[str, float] = {name: 0.0 for name in self.METRICS}
+
+    def add(self, retrieved: List[str], relevant: List[str]) -> None:
+        """
+        Add the metrics of a single query.
+
+        Args:
+            retrieved (List[str]): List of retrieved document IDs.
+            relevant (List[str]): List of relevant document IDs.
+        """
+        evaluator = RetrievalEvaluator(retrieved, relevant)
+        self.sums["map"] += evaluator.average_precision()
+        self.sums["mrr"] += evaluator.reciprocal_rank()
+        self.sums["ndcg"] += float(evaluator.ndcg(self.k))
+        self.sums["precision_at_k"] += evaluator.precision_at_k(self.k)
+        self.sums["recall_at_k"] += evaluator.recall_at_k(self.k)
+        self.count += 1
+
+    def merge(self, other: "MetricSums") -> "MetricSums":
+        """
+        Merge another partial state into this one. Merging is associative and commutative.
+
+        Args:
+            other (MetricSums): Partial sums computed with the same `k`.
+
+        Returns:
+            MetricSums: This instance, updated in place.
+        """
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge metric sums computed at k={other.k} into k={self.k}")
+        for name, value in other.sums.items():
+            self.sums[name] += value
+        self.count += other.count
+        return self
+
+    def means(self) -> Dict[str, float]:
+        """
+        Calculate the mean of every metric over the queries added so far.
+
+        Returns:
+            Dict[str, float]: Mean metric values, 0.0 when no query was added.
+        """
+        if self.count == 0:
+            return {name: 0.0 for name in self.METRICS}
+        return {name: value / self.count for name, value in self.sums.items()}
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the partial state, e.g. to ship it to another process as JSON.
+
+        Returns:
+            Dict: The `k`, `count` and `sums` of this instance.
+        """
+        return {"k": self.k, "count": self.count, "sums": dict(self.sums)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MetricSums":
+        """
+        Rebuild a partial state serialized with `to_dict`.
+
+        Args:
+            data (Dict): Serialized partial state.
+
+        Returns:
+            MetricSums: The partial state.
+        """
+        sums = cls(data["k"])
+        sums.count = data["count"]
+        sums.sums.update(data["sums"])
+        return sums
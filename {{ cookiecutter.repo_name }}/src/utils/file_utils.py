@@ -1,11 +1,32 @@
+import fnmatch
 import json
 import logging
+import mmap
 import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from typing import Union, List, Dict, Optional
+from queue import Empty, Full, Queue
+from threading import Event, Lock
+from typing import IO, Any, Callable, Iterable, Iterator, Union, List, Dict, Optional, Pattern, Tuple, TypeVar
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder and decoder are used instead
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+MiB = 1024 * 1024
+T = TypeVar("T")
+_DONE = object()
+# Start of an integer too long for 64 bits, i.e. 20 digits not following another digit or a decimal point
+_LONG_INT = re.compile(r"(?<![\d.])\d{20}")
+_LONG_INT_BYTES = re.compile(rb"(?<![\d.])\d{20}")
+
 
 class FileUtils:
     """A utility class for file operations including reading, writing, and directory management."""
@@ -38,20 +59,127 @@ class FileUtils:
         Raises:
             FileNotFoundError: If the specified file doesn't exist
         """
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"File {path} does not exist")
-            
+        if as_list:
+            return [line.strip() for line in FileUtils.iter_lines(path)]
         with open(path, "r") as file:
-            lines = file.readlines()
+            return file.read().strip()
 
-        if as_list:
-            return [line.strip() for line in lines]
-        return "".join(lines).strip()
+    @staticmethod
+    def iter_lines(
+        path: Union[str, Path], buffer_size: int = MiB, encoding: str = "utf-8", keepends: bool = False
+    ) -> Iterator[str]:
+        """
+        Lazily iterate over the lines of a text file, holding one buffer in memory instead of the whole file.
+
+        Args:
+            path: The file path to read from
+            buffer_size: Size in bytes of the read buffer, larger buffers mean fewer system calls
+            encoding: Text encoding of the file
+            keepends: If True, lines keep their trailing newline
+
+        Yields:
+            The lines of the file, in order
+        """
+        with open(path, "r", encoding=encoding, buffering=buffer_size) as file:
+            for line in file:
+                yield line if keepends else line.rstrip("\n")
+
+    @staticmethod
+    @contextmanager
+    def map_file(path: Union[str, Path]) -> Iterator[memoryview]:
+        """
+        Memory-map a file read-only and expose it as a `memoryview`.
+
+        Slicing the view does not copy: pages are only read from disk when touched and are shared with
+        the OS page cache, e.g. `view[offset:offset + size]` for a record at a known offset. `bytes(...)`
+        copies a slice out when it must outlive the mapping. Views and slices must be released (or dropped)
+        before the block exits, otherwise the mapping is only closed once they are garbage collected.
+
+        Args:
+            path: The file path to map
+
+        Yields:
+            A read-only view over the whole file, empty for an empty file
+        """
+        with open(path, "rb") as file:
+            # mmap rejects empty files
+            if os.fstat(file.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                logger.warning(f"Slices of the mapping of {path} are still referenced, it closes once they are freed")
+
+    @staticmethod
+    def chunk_offsets(path: Union[str, Path], num_chunks: int) -> List[Tuple[int, int]]:
+        """
+        Split a file into at most `num_chunks` byte ranges aligned on line boundaries.
+
+        Args:
+            path: The file path to split
+            num_chunks: Maximum number of ranges
+
+        Returns:
+            List of (start, end) byte offsets covering the whole file, end excluded
+        """
+        size = os.path.getsize(path)
+        if size == 0:
+            return []
+        step = max(size // max(num_chunks, 1), 1)
+        offsets = [0]
+        with open(path, "rb") as f:
+            while offsets[-1] + step < size:
+                f.seek(offsets[-1] + step)
+                f.readline()
+                position = f.tell()
+                if position >= size:
+                    break
+                offsets.append(position)
+        offsets.append(size)
+        return list(zip(offsets[:-1], offsets[1:]))
+
+    @staticmethod
+    def process_chunks(
+        path: Union[str, Path],
+        func: Callable[[Iterator[str]], T],
+        max_workers: Optional[int] = None,
+        encoding: str = "utf-8",
+    ) -> List[T]:
+        """
+        Process the lines of a large file in parallel, one line-aligned chunk per worker process.
+
+        `func` receives an iterator over the lines of its chunk, without trailing newlines, and returns
+        one result per chunk, e.g. a count or a partial aggregate the caller merges. It must be picklable,
+        i.e. defined at module level.
+
+        Args:
+            path: The file path to process
+            func: Function applied to the lines of every chunk
+            max_workers: Number of worker processes and chunks, defaults to the number of CPUs
+            encoding: Text encoding of the file
+
+        Returns:
+            The results of `func`, in the order of the chunks in the file
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        chunks = FileUtils.chunk_offsets(path, max_workers)
+        process = partial(_process_chunk, str(path), func=func, encoding=encoding)
+        if len(chunks) <= 1:
+            return [process(start, end) for start, end in chunks]
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            return list(pool.map(process, *zip(*chunks)))
 
     @staticmethod
     def read_json(path: Union[str, Path]) -> Dict:
         """
-        Read and parse a JSON file.
+        Read and parse a JSON file, with orjson when it is installed.
         
         Args:
             path: Path to the JSON file
@@ -62,26 +190,133 @@ class FileUtils:
         Raises:
             FileNotFoundError: If the specified file doesn't exist
         """
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"File {path} does not exist")
-            
-        with open(path, "r") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return json_loads(f.read())
 
     @staticmethod
-    def write_json(data: Dict, path: Union[str, Path], indent: int = 4) -> None:
+    def write_json(data: Dict, path: Union[str, Path], indent: Optional[int] = 4, atomic: bool = True) -> None:
         """
         Write data to a JSON file.
+
+        With orjson installed, compact (`indent=None`) and 2-space output are encoded by orjson, other
+        indents by the standard library. With `atomic`, the file is written next to its target and renamed
+        over it, so readers never see a partially written file.
         
         Args:
             data: Dictionary to be written as JSON
             path: Target file path
-            indent: Number of spaces for indentation in the JSON file
+            indent: Number of spaces for indentation in the JSON file, None for compact output
+            atomic: If True, replace the file only once it is completely written
         """
-        with open(path, "w") as f:
-            json.dump(data, f, indent=indent)
+        with FileUtils.open_atomic(path) if atomic else open(path, "wb") as f:
+            f.write(json_dumps(data, indent))
         logger.info(f"Written JSON to file: {path}")
 
+    @staticmethod
+    def iter_jsonl(path: Union[str, Path], buffer_size: int = MiB) -> Iterator[Any]:
+        """
+        Lazily parse a JSONL file, one record per non-blank line.
+
+        Args:
+            path: Path to the JSONL file
+            buffer_size: Size in bytes of the read buffer
+
+        Yields:
+            The parsed records, in order
+        """
+        with open(path, "rb", buffering=buffer_size) as f:
+            for line in f:
+                if line.strip():
+                    yield json_loads(line)
+
+    @staticmethod
+    def iter_jsonl_batches(
+        path: Union[str, Path], batch_size: int = 1000, buffer_size: int = MiB
+    ) -> Iterator[List[Any]]:
+        """
+        Lazily parse a JSONL file in lists of at most `batch_size` records, e.g. to insert them in bulk.
+
+        Args:
+            path: Path to the JSONL file
+            batch_size: Maximum number of records per list
+            buffer_size: Size in bytes of the read buffer
+
+        Yields:
+            Lists of parsed records, in order
+        """
+        batch = []
+        for record in FileUtils.iter_jsonl(path, buffer_size):
+            batch.append(record)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def write_jsonl(
+        records: Iterable[Any],
+        path: Union[str, Path],
+        batch_size: int = 1000,
+        append: bool = False,
+        atomic: bool = True,
+    ) -> int:
+        """
+        Write records to a JSONL file from any iterable, encoding and writing them `batch_size` at a time.
+
+        Args:
+            records: Records to write, e.g. a generator, consumed lazily
+            path: Target file path
+            batch_size: Number of records encoded into a single write
+            append: If True, add the records at the end of an existing file
+            atomic: If True and not appending, replace the file only once it is completely written
+
+        Returns:
+            Number of records written
+        """
+        count = 0
+        batch = []
+        with FileUtils.open_atomic(path) if atomic and not append else open(path, "ab" if append else "wb") as f:
+            for record in records:
+                batch.append(json_dumps(record))
+                if len(batch) == batch_size:
+                    f.write(b"\n".join(batch) + b"\n")
+                    count += len(batch)
+                    batch = []
+            if batch:
+                f.write(b"\n".join(batch) + b"\n")
+                count += len(batch)
+        logger.info(f"Written {count} records to file: {path}")
+        return count
+
+    @staticmethod
+    @contextmanager
+    def open_atomic(path: Union[str, Path], fsync: bool = False) -> Iterator[IO[bytes]]:
+        """
+        Open a temporary file next to `path` for binary writing, renamed over `path` when the block succeeds.
+
+        The temporary file is removed if the block raises, leaving any previous `path` untouched.
+
+        Args:
+            path: Target file path
+            fsync: If True, flush the file to disk before the rename, so it also survives a power loss
+
+        Yields:
+            The temporary file object
+        """
+        # Unique per call, threads of one process may write the same path concurrently
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "xb") as f:
+                yield f
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     @staticmethod
     def ensure_directory(file_path: Union[str, Path]) -> None:
         """
@@ -105,19 +340,236 @@ class FileUtils:
         
         Args:
             path: Root path to start the directory search
-            exclude_patterns: List of patterns to exclude from the search
+            exclude_patterns: List of substrings, a directory whose path contains any of them is skipped
+                with everything below it
             
         Returns:
             List of directory paths
         """
-        exclude_patterns = set(exclude_patterns or [])
+        exclude = [re.compile(re.escape(pattern)) for pattern in exclude_patterns or []]
+        return [entry.path for entry in FileUtils.walk(path, exclude=exclude, files=False, directories=True)]
 
-        def should_exclude(dir_path: str) -> bool:
-            return any(pattern in dir_path for pattern in exclude_patterns)
+    @staticmethod
+    def walk(
+        path: Union[str, Path],
+        exclude: Optional[Iterable[Union[str, Pattern]]] = None,
+        include: Optional[Iterable[str]] = None,
+        file_filter: Optional[Callable[[os.DirEntry], bool]] = None,
+        max_depth: Optional[int] = None,
+        files: bool = True,
+        directories: bool = False,
+        follow_symlinks: bool = False,
+        max_workers: int = 1,
+        queue_size: int = 1000,
+    ) -> Iterator[os.DirEntry]:
+        """
+        Lazily walk a directory tree with `os.scandir`, yielding entries as directories are read.
 
-        directories = []
-        for root, dirs, _ in os.walk(str(path)):
-            dirs[:] = [d for d in dirs if not should_exclude(os.path.join(root, d))]
-            directories.extend(os.path.join(root, d) for d in dirs)
-            
-        return directories
+        Entries carry the file type, and `entry.stat()` is cached, so filtering costs no extra system call
+        on most filesystems. Excluded directories are pruned without being read. With `max_workers` above 1,
+        directories are read by a thread pool, which hides the latency of network filesystems; entries then
+        come in no particular order and at most `queue_size` read directories wait for the consumer.
+
+        Args:
+            path: Root directory, not yielded itself
+            exclude: Entries to skip, directories with everything below them. Strings are glob patterns
+                matched against the entry name or its path relative to `path` (e.g. ".git", "*.tmp",
+                "raw/*/cache"), compiled patterns are searched in the full entry path
+            include: Glob patterns of the file names to yield, e.g. ["*.jsonl"], all files if None
+            file_filter: Called with every included file entry, which is yielded if it returns True
+            max_depth: Number of levels to read, 1 for the entries of `path` only, unlimited if None
+            files: If True, yield files
+            directories: If True, yield directories
+            follow_symlinks: If True, descend into symbolic links to directories
+            max_workers: Number of threads reading directories
+            queue_size: Maximum number of read directories waiting to be consumed in the parallel mode
+
+        Yields:
+            `os.DirEntry` objects, their `path` joined to `path`
+        """
+        tree = _TreeScanner(
+            str(path), exclude, include, file_filter, max_depth, files, directories, follow_symlinks
+        )
+        if max_workers > 1:
+            yield from _walk_parallel(tree, max_workers, queue_size)
+            return
+        stack = [(tree.root, 1)]
+        while stack:
+            directory, depth = stack.pop()
+            entries, subdirectories = tree.scan(directory, depth)
+            yield from entries
+            # Reversed so directories are read in the order they were listed, as with os.walk
+            stack.extend((subdirectory, depth + 1) for subdirectory in reversed(subdirectories))
+
+
+class _TreeScanner:
+    """Reads one directory at a time for `FileUtils.walk`, applying its filters."""
+
+    def __init__(
+        self,
+        root: str,
+        exclude: Optional[Iterable[Union[str, Pattern]]],
+        include: Optional[Iterable[str]],
+        file_filter: Optional[Callable[[os.DirEntry], bool]],
+        max_depth: Optional[int],
+        files: bool,
+        directories: bool,
+        follow_symlinks: bool,
+    ):
+        exclude = list(exclude or [])
+        self.root = root
+        self.exclude_glob = _compile_globs(pattern for pattern in exclude if isinstance(pattern, str))
+        self.exclude_regexes = [pattern for pattern in exclude if not isinstance(pattern, str)]
+        self.include_glob = _compile_globs(include or [])
+        self.file_filter = file_filter
+        self.max_depth = max_depth
+        self.files = files
+        self.directories = directories
+        self.follow_symlinks = follow_symlinks
+        self.prefix_length = len(os.path.join(root, ""))
+
+    def scan(self, directory: str, depth: int) -> Tuple[List[os.DirEntry], List[str]]:
+        """Entries of `directory` to yield and sub-directories to read next."""
+        entries, subdirectories = [], []
+        try:
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    if self._excluded(entry):
+                        continue
+                    try:
+                        is_directory = entry.is_dir()
+                    except OSError:
+                        is_directory = False
+                    if is_directory:
+                        if self.directories:
+                            entries.append(entry)
+                        if (self.max_depth is None or depth < self.max_depth) and (
+                            self.follow_symlinks or not entry.is_symlink()
+                        ):
+                            subdirectories.append(entry.path)
+                    elif self.files and self._included(entry):
+                        entries.append(entry)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable directory {directory}: {e}")
+        return entries, subdirectories
+
+    def _excluded(self, entry: os.DirEntry) -> bool:
+        if self.exclude_glob is not None:
+            relative_path = entry.path[self.prefix_length:].replace(os.sep, "/")
+            if self.exclude_glob.match(entry.name) or self.exclude_glob.match(relative_path):
+                return True
+        return any(regex.search(entry.path) for regex in self.exclude_regexes)
+
+    def _included(self, entry: os.DirEntry) -> bool:
+        if self.include_glob is not None and not self.include_glob.match(entry.name):
+            return False
+        return self.file_filter is None or self.file_filter(entry)
+
+
+def _compile_globs(patterns: Iterable[str]) -> Optional[Pattern]:
+    """A single regex matching any of the glob `patterns`, or None without patterns."""
+    translated = [fnmatch.translate(pattern) for pattern in patterns]
+    return re.compile("|".join(f"(?:{regex})" for regex in translated)) if translated else None
+
+
+def _walk_parallel(tree: _TreeScanner, max_workers: int, queue_size: int) -> Iterator[os.DirEntry]:
+    results: Queue = Queue(maxsize=max(queue_size, 1))
+    closed = Event()
+    lock = Lock()
+    pending = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="walk")
+
+    def put(item) -> bool:
+        while not closed.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def submit(directory: str, depth: int) -> None:
+        nonlocal pending
+        with lock:
+            pending += 1
+        executor.submit(scan, directory, depth)
+
+    def scan(directory: str, depth: int) -> None:
+        nonlocal pending
+        try:
+            if closed.is_set():
+                return
+            entries, subdirectories = tree.scan(directory, depth)
+            for subdirectory in subdirectories:
+                submit(subdirectory, depth + 1)
+            if entries:
+                put(entries)
+        except Exception as e:
+            put(e)
+        finally:
+            with lock:
+                pending -= 1
+                done = pending == 0
+            if done:
+                put(_DONE)
+
+    submit(tree.root, 1)
+    try:
+        while True:
+            try:
+                item = results.get(timeout=0.1)
+            except Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        closed.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_chunk_lines(path: str, start: int, end: int, encoding: str) -> Iterator[str]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        for line in f:
+            if remaining <= 0:
+                break
+            remaining -= len(line)
+            yield line.decode(encoding).rstrip("\n")
+
+
+def _process_chunk(path: str, start: int, end: int, func: Callable[[Iterator[str]], T], encoding: str) -> T:
+    return func(_iter_chunk_lines(path, start, end, encoding))
+
+
+def json_dumps(data: Any, indent: Optional[int] = None) -> bytes:
+    """
+    Encode to UTF-8 JSON, with orjson when it is installed and supports the data and indent.
+
+    Unlike the standard library, orjson writes NaN and infinities as null.
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:  # e.g. integers above 64 bits or custom types, the standard library may still encode them
+            pass
+    return json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode JSON, with orjson when it is installed.
+
+    orjson decodes integers above 64 bits as floats, so documents with an integer of 20 digits or more
+    (or such a run of digits in a string) are decoded by the standard library, which keeps them exact.
+    """
+    if orjson is not None and not (_LONG_INT_BYTES if isinstance(data, bytes) else _LONG_INT).search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:  # e.g. NaN, accepted by the standard library
+            pass
+    return json.loads(data)
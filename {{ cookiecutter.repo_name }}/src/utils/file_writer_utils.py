@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from typing import Any, List, Optional, Set, Union
+
+from pydantic import BaseModel
+
+from src.utils.file_utils import FileUtils, json_dumps
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("never", "batch", "always")
+
+
+class WriterStats(BaseModel):
+    files: int = 0
+    bytes: int = 0
+    failed: int = 0
+    fsyncs: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / self.elapsed / 1e6 if self.elapsed else 0.0
+
+
+class BackgroundWriter:
+    """
+    Writes files on a background thread pool, for pipelines producing thousands of small files.
+
+    `write_text`, `write_json` and `write_bytes` encode the content in the calling thread, so it may be
+    modified right after, and return a `Future` once the write is queued; in async code,
+    `await asyncio.wrap_future(writer.write_text(...))` waits for one file. At most `queue_size` writes
+    are pending, further calls block until one completes. Writes to the same path always go to the same
+    worker, so they land in the order they were submitted.
+
+    `flush` (or `flush_async`) is a barrier: it returns once every write submitted before it is on disk,
+    and raises the first error since the previous flush. Durability follows `fsync`:
+
+    - "never": the OS writes the files back on its own, fastest;
+    - "batch": written files are synced in groups of `fsync_batch` and at every flush, with their directories;
+    - "always": every file is synced before its future completes.
+
+    Files are logged at DEBUG level and a summary with the throughput at INFO level on every flush. The
+    throughput is measured over the busy time, while writes are pending or a flush syncs them, so idle
+    time between batches does not lower it.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        queue_size: int = 1000,
+        fsync: str = "batch",
+        fsync_batch: int = 1000,
+        atomic: bool = False,
+    ):
+        """
+        Args:
+            max_workers: Number of writer threads
+            queue_size: Maximum number of writes submitted and not completed
+            fsync: Durability policy, "never", "batch" or "always"
+            fsync_batch: Number of written files synced together with the "batch" policy
+            atomic: If True, write every file next to its target and rename it over the target
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.fsync = fsync
+        self.fsync_batch = fsync_batch
+        self.atomic = atomic
+        self.stats = WriterStats()
+        self._lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"writer-{i}") for i in range(max_workers)]
+        self._slots = BoundedSemaphore(queue_size)
+        self._lock = Lock()
+        self._pending: Set[Future] = set()
+        self._unsynced: List[str] = []
+        self._errors: List[BaseException] = []
+        self._active = 0
+        self._busy_since = 0.0
+
+    def write_bytes(self, data: bytes, path: Union[str, Path]) -> Future:
+        """Queue writing `data` to `path`, the future resolves once the file is written."""
+        path = str(path)
+        self._slots.acquire()
+        lane = self._lanes[zlib.crc32(path.encode("utf-8")) % len(self._lanes)]
+        self._enter_busy()
+        try:
+            future = lane.submit(self._write, path, bytes(data))
+        except BaseException:
+            self._exit_busy()
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._release)
+        return future
+
+    def write_text(self, text: str, path: Union[str, Path], encoding: str = "utf-8") -> Future:
+        """Queue writing `text` to `path`, the future resolves once the file is written."""
+        return self.write_bytes(text.encode(encoding), path)
+
+    def write_json(self, data: Any, path: Union[str, Path], indent: Optional[int] = None) -> Future:
+        """Queue writing `data` as JSON to `path`, compact by default, the future resolves once the file is written."""
+        return self.write_bytes(json_dumps(data, indent), path)
+
+    def flush(self) -> WriterStats:
+        """
+        Wait until every write submitted so far is completed and synced according to the fsync policy.
+
+        Returns:
+            The counters since the writer was created, `elapsed` being the busy time
+
+        Raises:
+            The first error raised by a write or sync since the previous flush, once all writes are completed
+        """
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        with self._lock:
+            unsynced, self._unsynced = self._unsynced, []
+        if unsynced:
+            self._enter_busy()
+            try:
+                self._sync(unsynced)
+            finally:
+                self._exit_busy()
+        with self._lock:
+            errors, self._errors = self._errors, []
+            stats = self.stats.model_copy()
+            if self._active:
+                stats.elapsed += time.perf_counter() - self._busy_since
+        logger.info(
+            f"Written {stats.files} files ({stats.bytes} bytes, {stats.failed} failed) in {stats.elapsed:.2f}s: "
+            f"{stats.files_per_second:.0f} files/s, {stats.mb_per_second:.1f} MB/s"
+        )
+        if errors:
+            raise errors[0]
+        return stats
+
+    async def flush_async(self) -> WriterStats:
+        """`flush` without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def close(self) -> WriterStats:
+        """Flush and stop the writer threads."""
+        try:
+            return self.flush()
+        finally:
+            for lane in self._lanes:
+                lane.shutdown(wait=True)
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _write(self, path: str, data: bytes) -> None:
+        try:
+            with FileUtils.open_atomic(path, fsync=self.fsync == "always") if self.atomic else open(path, "wb") as f:
+                f.write(data)
+                if self.fsync == "always" and not self.atomic:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception as e:
+            with self._lock:
+                self.stats.failed += 1
+                self._errors.append(e)
+            logger.error(f"Failed to write {path}: {e}")
+            raise
+
+        batch = None
+        with self._lock:
+            self.stats.files += 1
+            self.stats.bytes += len(data)
+            if self.fsync == "always":
+                self.stats.fsyncs += 1
+            elif self.fsync == "batch":
+                self._unsynced.append(path)
+                if len(self._unsynced) >= self.fsync_batch:
+                    batch, self._unsynced = self._unsynced, []
+        logger.debug(f"Written {len(data)} bytes to file: {path}")
+        if batch:
+            self._sync(batch)
+
+    def _sync(self, paths: List[str]) -> None:
+        """Sync written files, then their directories so the new entries are durable too."""
+        directories = {os.path.dirname(os.path.abspath(path)) for path in paths}
+        synced = 0
+        for path in [*paths, *directories]:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError as e:  # e.g. removed since, or a directory on a platform that cannot open one
+                logger.warning(f"Could not sync {path}: {e}")
+                continue
+            try:
+                os.fsync(fd)
+                synced += 1
+            except OSError as e:  # the data may be lost, the next flush must not report success
+                with self._lock:
+                    self.stats.failed += 1
+                    self._errors.append(e)
+                logger.error(f"Failed to sync {path}: {e}")
+            finally:
+                os.close(fd)
+        with self._lock:
+            self.stats.fsyncs += synced
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        self._exit_busy()
+        self._slots.release()
+
+    def _enter_busy(self) -> None:
+        with self._lock:
+            if not self._active:
+                self._busy_since = time.perf_counter()
+            self._active += 1
+
+    def _exit_busy(self) -> None:
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self.stats.elapsed += time.perf_counter() - self._busy_since
@@ -0,0 +1,145 @@
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+from src.utils.evaluator_utils import MetricSums
+
+
+class OnlineMetricAccumulator:
+    """
+    Incrementally tracks retrieval metrics on live traffic.
+
+    Every query is scored on its top `k` documents with the `RetrievalEvaluator` metrics, so an update
+    costs O(k). Scores are added to per-time-bucket `MetricSums`, which makes it possible to:
+
+    - snapshot the all-time or sliding-window means without re-scanning past queries,
+    - merge the state of several workers or processes (`merge` is associative and commutative),
+    - ship the state between processes with `to_dict` / `from_dict`.
+
+    Buckets older than `window_seconds` are dropped, only the all-time totals keep their contribution.
+    """
+
+    def __init__(self, k: int = 10, window_seconds: float = 3600.0, bucket_seconds: float = 60.0):
+        """
+        Args:
+            k (int): Number of top documents scored per query.
+            window_seconds (float): Length of the sliding window used by `snapshot`.
+            bucket_seconds (float): Time resolution of the sliding window.
+        """
+        if bucket_seconds <= 0 or window_seconds < bucket_seconds:
+            raise ValueError("bucket_seconds must be positive and not larger than window_seconds")
+        self.k = k
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.total = MetricSums(k)
+        self._buckets: Dict[int, MetricSums] = {}
+        self._lock = Lock()
+
+    def update(self, retrieved: List[str], relevant: List[str], timestamp: Optional[float] = None) -> None:
+        """
+        Add one query.
+
+        Args:
+            retrieved (List[str]): Retrieved document IDs, only the top `k` are scored.
+            relevant (List[str]): Relevant document IDs.
+            timestamp (Optional[float]): Epoch seconds of the query, defaults to now.
+        """
+        query = MetricSums(self.k)
+        query.add(retrieved[:self.k], relevant)
+        bucket = self._bucket_of(time.time() if timestamp is None else timestamp)
+        with self._lock:
+            self.total.merge(query)
+            if bucket not in self._buckets:
+                self._buckets[bucket] = MetricSums(self.k)
+                self._expire(bucket)
+            self._buckets[bucket].merge(query)
+
+    def merge(self, other: "OnlineMetricAccumulator") -> "OnlineMetricAccumulator":
+        """
+        Merge the state of another accumulator with the same `k` and bucket size into this one.
+
+        Args:
+            other (OnlineMetricAccumulator): Accumulator of another worker.
+
+        Returns:
+            OnlineMetricAccumulator: This instance, updated in place.
+        """
+        if other.k != self.k or other.bucket_seconds != self.bucket_seconds:
+            raise ValueError("Cannot merge accumulators with a different k or bucket size")
+        with other._lock:
+            total = MetricSums.from_dict(other.total.to_dict())
+            buckets = {bucket: MetricSums.from_dict(sums.to_dict()) for bucket, sums in other._buckets.items()}
+        with self._lock:
+            self.total.merge(total)
+            for bucket, sums in buckets.items():
+                self._buckets.setdefault(bucket, MetricSums(self.k)).merge(sums)
+            if self._buckets:
+                self._expire(max(self._buckets))
+        return self
+
+    def snapshot(self, window: bool = True, now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Return the current metric means.
+
+        Args:
+            window (bool): If True, only the queries of the last `window_seconds` are included,
+                otherwise every query seen so far.
+            now (Optional[float]): Epoch seconds the window ends at, defaults to now.
+
+        Returns:
+            Dict[str, float]: Mean metric values and the number of included queries under `num_queries`.
+        """
+        with self._lock:
+            if window:
+                sums = MetricSums(self.k)
+                oldest = self._bucket_of(time.time() if now is None else now) - self._num_buckets() + 1
+                for bucket, bucket_sums in self._buckets.items():
+                    if bucket >= oldest:
+                        sums.merge(bucket_sums)
+            else:
+                sums = self.total
+            return {**sums.means(), "num_queries": sums.count}
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the accumulator state.
+
+        Returns:
+            Dict: JSON-serializable state.
+        """
+        with self._lock:
+            return {
+                "k": self.k,
+                "window_seconds": self.window_seconds,
+                "bucket_seconds": self.bucket_seconds,
+                "total": self.total.to_dict(),
+                "buckets": {str(bucket): sums.to_dict() for bucket, sums in self._buckets.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "OnlineMetricAccumulator":
+        """
+        Rebuild an accumulator serialized with `to_dict`.
+
+        Args:
+            data (Dict): Serialized state.
+
+        Returns:
+            OnlineMetricAccumulator: The accumulator.
+        """
+        accumulator = cls(data["k"], data["window_seconds"], data["bucket_seconds"])
+        accumulator.total = MetricSums.from_dict(data["total"])
+        accumulator._buckets = {int(bucket): MetricSums.from_dict(sums) for bucket, sums in data["buckets"].items()}
+        return accumulator
+
+    def _bucket_of(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def _num_buckets(self) -> int:
+        return max(int(self.window_seconds // self.bucket_seconds), 1)
+
+    def _expire(self, newest: int) -> None:
+        """Drop the buckets that fell out of the window ending at bucket `newest`."""
+        oldest = newest - self._num_buckets() + 1
+        for bucket in [bucket for bucket in self._buckets if bucket < oldest]:
+            del self._buckets[bucket]
@@ -0,0 +1,434 @@
+import fnmatch
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel
+
+from src import PROJECT_PATHS
+from src.utils.file_utils import FileUtils, json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+MiB = 1024 * 1024
+GLOB_CHARACTERS = set("*?[")
+
+
+class StageResult(BaseModel):
+    name: str
+    status: str = "pending"
+    shards_run: int = 0
+    shards_cached: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+class PipelineReport(BaseModel):
+    stages: Dict[str, StageResult] = {}
+
+    @property
+    def failed(self) -> List[str]:
+        return [name for name, result in self.stages.items() if result.status in ("failed", "blocked")]
+
+
+class Stage:
+    """
+    One step of a `Pipeline`, e.g. parsing `raw/docs` into `interim/docs.parquet`.
+
+    A plain stage calls `func(inputs, outputs, **params)` with the lists of input paths, glob patterns
+    expanded, and output paths. A sharded stage calls `func(input_file, output_file, **params)` once per
+    file found in its inputs, writing into its single output directory under the same relative path (with
+    its suffix replaced by `shard_suffix` if given), and only the shards whose input changed run again.
+
+    `func` runs in a worker process, so it must be defined at module level.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Iterable[Union[str, Path]],
+        outputs: Iterable[Union[str, Path]],
+        params: Optional[Dict[str, Any]] = None,
+        sharded: bool = False,
+        shard_suffix: Optional[str] = None,
+    ):
+        """
+        Args:
+            name: Unique name of the stage in its pipeline
+            func: Function doing the work, see the class documentation for its arguments
+            inputs: Files, directories or glob patterns read by the stage, relative to the pipeline root
+                unless absolute, e.g. "raw/docs" or "interim/*.jsonl"
+            outputs: Files or directories written by the stage, relative to the pipeline root unless absolute
+            params: Keyword arguments of `func`, part of the cache key
+            sharded: If True, run `func` once per input file into the single output directory
+            shard_suffix: Suffix of the shard outputs, e.g. ".parquet", the input suffix if None
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.sharded = sharded
+        self.shard_suffix = shard_suffix
+        if sharded and len(self.outputs) != 1:
+            raise ValueError(f"Sharded stage {name!r} needs exactly one output directory")
+
+
+class Pipeline:
+    """
+    Incremental runner of a DAG of stages over the data layout (`raw` -> `interim` -> `processed`).
+
+    A stage depends on every stage writing one of its inputs. Before running, a stage is keyed by the
+    content hash of its input files, the source of the module defining its function, its params and its
+    outputs; when the key and the outputs are unchanged since the last successful run, the stage is
+    skipped. An upstream stage that runs again but writes identical files therefore does not invalidate
+    the stages below it.
+
+    Independent stages, and the shards of sharded stages, run concurrently in a process pool. A failed
+    stage blocks the stages depending on it while the others go on, and the shards that succeeded are
+    kept for the next run.
+
+    File digests are memoized by size and modification time in the state file, so unchanged inputs are
+    not read again on every run.
+    """
+
+    def __init__(
+        self,
+        stages: Iterable[Stage],
+        root: Union[str, Path] = PROJECT_PATHS.DATA_PATH,
+        state_path: Optional[Union[str, Path]] = None,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Args:
+            stages: Stages of the pipeline, in any order
+            root: Directory relative stage paths are resolved against
+            state_path: JSON file holding the cache keys, defaults to `<root>/.pipeline_state.json`
+            max_workers: Number of worker processes, defaults to the number of CPUs
+        """
+        self.root = Path(root)
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name {stage.name!r}")
+            self.stages[stage.name] = stage
+        self.state_path = Path(state_path) if state_path else self.root / ".pipeline_state.json"
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.dependencies = {name: self._find_dependencies(stage) for name, stage in self.stages.items()}
+        self.order = self._sort()
+        self._state: Dict[str, Any] = {}
+
+    def run(self, targets: Optional[List[str]] = None, force: bool = False) -> PipelineReport:
+        """
+        Run the stages whose inputs, code or params changed, and the stages they invalidate.
+
+        Args:
+            targets: Names of the stages to bring up to date with their upstream stages, all if None
+            force: If True, run every selected stage and shard even when cached
+
+        Returns:
+            The status of every selected stage: "run", "cached", "failed", or "blocked" by a failed upstream
+        """
+        selected = self._select(targets)
+        report = PipelineReport(stages={name: StageResult(name=name) for name in self.order if name in selected})
+        self._state = self._load_state()
+        running: Dict[Future, Tuple[str, Optional[str], Optional[str]]] = {}
+        started: Dict[str, float] = {}
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                for name, result in report.stages.items():
+                    if result.status != "pending":
+                        continue
+                    upstream = [report.stages[dependency].status for dependency in self.dependencies[name]]
+                    if any(status in ("failed", "blocked") for status in upstream):
+                        result.status = "blocked"
+                        logger.warning(f"Stage {name} blocked by a failed upstream stage")
+                    elif all(status in ("run", "cached") for status in upstream):
+                        started[name] = time.perf_counter()
+                        result.status = "running"
+                        self._start(pool, self.stages[name], result, force, running)
+                        if result.status != "running":
+                            result.elapsed = time.perf_counter() - started[name]
+                            # Statuses changed, so stages waiting on this one may start on the next pass
+                            break
+                else:
+                    if not running:
+                        break
+                    for future in wait(running, return_when=FIRST_COMPLETED).done:
+                        name, shard, shard_key = running.pop(future)
+                        result = report.stages[name]
+                        self._complete(future, self.stages[name], result, shard, shard_key)
+                        if not any(job[0] == name for job in running.values()):
+                            self._finish(self.stages[name], result)
+                            result.elapsed = time.perf_counter() - started[name]
+        self._save_state()
+        for result in report.stages.values():
+            logger.info(
+                f"Stage {result.name}: {result.status} in {result.elapsed:.2f}s "
+                f"({result.shards_run} shards run, {result.shards_cached} cached)"
+            )
+        return report
+
+    def _start(
+        self,
+        pool: ProcessPoolExecutor,
+        stage: Stage,
+        result: StageResult,
+        force: bool,
+        running: Dict[Future, Tuple[str, Optional[str], Optional[str]]],
+    ) -> None:
+        """Skip `stage` when cached, otherwise submit its work to the pool."""
+        try:
+            shard_keys: Dict[str, str] = {}
+            stage_state = self._state["stages"].setdefault(stage.name, {"key": None, "shards": shard_keys})
+            if not stage.sharded:
+                inputs = [(str(path), self._file_digest(path)) for _, path in self._input_files(stage)]
+                key = self._stage_key(stage, inputs)
+                outputs = [self._resolve(output) for output in stage.outputs]
+                if not force and stage_state["key"] == key and all(output.exists() for output in outputs):
+                    result.status = "cached"
+                    return
+                for output in outputs:
+                    output.parent.mkdir(parents=True, exist_ok=True)
+                # The outputs are about to change, so a failed run must not leave them keyed as up to date
+                stage_state["key"] = None
+                stage_state["pending_key"] = key
+                inputs = [match for _, match in self._matches(stage)]
+                future = pool.submit(_run_stage, stage.func, inputs, outputs, stage.params)
+                running[future] = (stage.name, None, None)
+                return
+
+            shards = self._shards(stage)
+            # Outputs of inputs that disappeared would otherwise leak into the downstream stages
+            for shard in set(stage_state["shards"]) - set(shards):
+                output = self._shard_output(stage, shard)
+                if output.exists():
+                    output.unlink()
+                del stage_state["shards"][shard]
+            code = _code_digest(stage.func)
+            for shard, input_file in shards.items():
+                shard_key = _hash([code, stage.params, self._file_digest(input_file)])
+                output = self._shard_output(stage, shard)
+                if not force and stage_state["shards"].get(shard) == shard_key and output.exists():
+                    result.shards_cached += 1
+                    continue
+                output.parent.mkdir(parents=True, exist_ok=True)
+                stage_state["shards"].pop(shard, None)
+                future = pool.submit(_run_stage, stage.func, input_file, output, stage.params)
+                running[future] = (stage.name, shard, shard_key)
+            if not any(job[0] == stage.name for job in running.values()):
+                result.status = "cached"
+        except Exception as e:
+            result.status, result.error = "failed", f"{type(e).__name__}: {e}"
+            logger.error(f"Stage {stage.name} failed: {result.error}")
+
+    def _complete(
+        self, future: Future, stage: Stage, result: StageResult, shard: Optional[str], shard_key: Optional[str]
+    ) -> None:
+        try:
+            future.result()
+        except Exception as e:
+            if result.error is None:
+                result.error = f"{type(e).__name__}: {e}" + (f" (shard {shard})" if shard else "")
+            logger.error(f"Stage {stage.name} failed{f' on shard {shard}' if shard else ''}: {e}")
+            return
+        if shard is not None:
+            result.shards_run += 1
+            self._state["stages"][stage.name]["shards"][shard] = shard_key
+
+    def _finish(self, stage: Stage, result: StageResult) -> None:
+        stage_state = self._state["stages"][stage.name]
+        pending_key = stage_state.pop("pending_key", None)
+        if result.error is None and not stage.sharded:
+            missing = [str(output) for output in map(self._resolve, stage.outputs) if not output.exists()]
+            if missing:
+                result.error = f"Stage did not write its outputs {missing}"
+                logger.error(f"Stage {stage.name} failed: {result.error}")
+        if result.error is None:
+            stage_state["key"] = pending_key
+            result.status = "run"
+        else:
+            result.status = "failed"
+        # Saved after every stage, so an interrupted run keeps the stages and shards already done
+        self._save_state()
+
+    def _find_dependencies(self, stage: Stage) -> Set[str]:
+        inputs = [self._resolve(path) for path in stage.inputs]
+        dependencies = set()
+        for name, other in self.stages.items():
+            if name == stage.name:
+                continue
+            for output in map(self._resolve, other.outputs):
+                if any(self._reads(pattern, output, other) for pattern in inputs):
+                    dependencies.add(name)
+                    break
+        return dependencies
+
+    def _reads(self, pattern: Path, output: Path, stage: Stage) -> bool:
+        """Whether the input `pattern` may read the `output` of `stage`."""
+        if self._static_prefix(pattern) == pattern:
+            return _overlaps(pattern, output)
+        # A file output must match the pattern, a directory output may hold files matching it. Outputs are
+        # directories for sharded stages, or when they exist as one or have no suffix
+        is_directory = stage.sharded or output.is_dir() or not output.suffix
+        return _glob_match(pattern.parts, output.parts, partial_match=is_directory)
+
+    def _sort(self) -> List[str]:
+        order, visiting, visited = [], set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage {name!r} depends on itself through its inputs")
+            visiting.add(name)
+            for dependency in sorted(self.dependencies[name]):
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _select(self, targets: Optional[List[str]]) -> Set[str]:
+        if targets is None:
+            return set(self.stages)
+        selected, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name!r}")
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.dependencies[name])
+        return selected
+
+    def _resolve(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        return path if path.is_absolute() else self.root / path
+
+    @staticmethod
+    def _static_prefix(path: Path) -> Path:
+        """Leading part of `path` without glob characters."""
+        parts = []
+        for part in path.parts:
+            if GLOB_CHARACTERS & set(part):
+                break
+            parts.append(part)
+        return Path(*parts)
+
+    def _matches(self, stage: Stage) -> List[Tuple[Path, Path]]:
+        """Inputs of `stage` with glob patterns expanded, each with the directory shard paths start from."""
+        matches = []
+        for pattern in map(self._resolve, stage.inputs):
+            base = self._static_prefix(pattern)
+            if base != pattern:
+                matches.extend((base, Path(match)) for match in sorted(glob.glob(str(pattern), recursive=True)))
+            elif pattern.exists():
+                matches.append((pattern if pattern.is_dir() else pattern.parent, pattern))
+            else:
+                raise FileNotFoundError(f"Input {pattern} of stage {stage.name!r} does not exist")
+        return matches
+
+    def _input_files(self, stage: Stage) -> List[Tuple[Path, Path]]:
+        """Every input file of `stage`, directories walked, with the directory shard paths start from."""
+        files = []
+        for base, match in self._matches(stage):
+            if match.is_dir():
+                files.extend((base, Path(path)) for path in sorted(entry.path for entry in FileUtils.walk(match)))
+            else:
+                files.append((base, match))
+        return files
+
+    def _shards(self, stage: Stage) -> Dict[str, Path]:
+        shards = {}
+        for base, path in self._input_files(stage):
+            shard = path.relative_to(base).as_posix()
+            if shard in shards:
+                raise ValueError(f"Inputs {shards[shard]} and {path} of stage {stage.name!r} map to the same shard")
+            shards[shard] = path
+        return shards
+
+    def _shard_output(self, stage: Stage, shard: str) -> Path:
+        output = self._resolve(stage.outputs[0]) / shard
+        return output.with_suffix(stage.shard_suffix) if stage.shard_suffix else output
+
+    def _stage_key(self, stage: Stage, input_digests: List[Tuple[str, str]]) -> str:
+        outputs = [str(self._resolve(output)) for output in stage.outputs]
+        return _hash([_code_digest(stage.func), stage.params, input_digests, outputs])
+
+    def _file_digest(self, path: Path) -> str:
+        stat = path.stat()
+        cached = self._state["files"].get(str(path))
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(partial(f.read, MiB), b""):
+                digest.update(block)
+        self._state["files"][str(path)] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _load_state(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = {"stages": {}, "files": dict()}
+        if self.state_path.exists():
+            try:
+                with open(self.state_path, "rb") as f:
+                    state.update(json_loads(f.read()))
+            except (OSError, ValueError):
+                logger.warning(f"Ignoring unreadable pipeline state {self.state_path}, every stage runs again")
+        return state
+
+    def _save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with FileUtils.open_atomic(self.state_path) as f:
+            f.write(json_dumps(self._state))
+
+
+def _run_stage(func: Callable[..., Any], inputs: Any, outputs: Any, params: Dict[str, Any]) -> None:
+    func(inputs, outputs, **params)
+
+
+def _overlaps(path: Path, other: Path) -> bool:
+    return path == other or path in other.parents or other in path.parents
+
+
+def _glob_match(pattern: Tuple[str, ...], parts: Tuple[str, ...], partial_match: bool = False) -> bool:
+    """
+    Whether the path `parts` match the glob `pattern` parts, "**" matching any number of directories.
+    With `partial_match`, it is enough for `parts` to match a leading part of `pattern`, i.e. for a
+    directory to possibly hold matching files.
+    """
+    if not parts:
+        return partial_match or all(part == "**" for part in pattern)
+    if not pattern:
+        return False
+    if pattern[0] == "**":
+        return _glob_match(pattern[1:], parts, partial_match) or _glob_match(pattern, parts[1:], partial_match)
+    return fnmatch.fnmatchcase(parts[0], pattern[0]) and _glob_match(pattern[1:], parts[1:], partial_match)
+
+
+def _code_digest(func: Callable[..., Any]) -> str:
+    """Hash of the module source defining `func`, so edits to its helpers invalidate the stage too."""
+    digest = hashlib.sha256(f"{func.__module__}.{func.__qualname__}".encode("utf-8"))
+    source_file = inspect.getsourcefile(func)
+    if source_file:
+        with open(source_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _hash(parts: List[Any]) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
@@ -0,0 +1,303 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Event
+from typing import Callable, Dict, Iterator, Optional
+
+from src import PROJECT_PATHS
+from src.utils.s3_transfer_utils import MiB, TransferCancelledError
+
+try:
+    import fcntl
+except ImportError:  # Windows, fills stay atomic but concurrent processes may download the same object twice
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GiB = 1024 * MiB
+LINK_MODES = ("hardlink", "symlink", "copy")
+FICLONE = 0x40049409  # Linux ioctl sharing the extents of a file on copy-on-write filesystems (btrfs, XFS)
+
+
+class S3ObjectCache:
+    """
+    Size-capped local disk cache for S3 objects, content-addressed by ETag.
+
+    Layout under `cache_dir`:
+        objects/<sha256(etag, size)>   read-only object contents, shared by every key with the same content
+        index/<sha256(bucket, key)>    JSON entry with the ETag, size, encoding and time of the last HEAD for a key
+        locks/, tmp/                   fill locks and in-progress downloads
+
+    A key whose entry was validated less than `ttl_seconds` ago is served without any request, otherwise
+    a HEAD revalidates its ETag. Fills download into `tmp/` and are renamed into `objects/` under a file
+    lock, so concurrent processes never see a partial object and fetch it only once. Objects are evicted
+    least recently used first once the cache grows past `max_bytes`.
+
+    Cached objects are delivered as hard links by default, so a hit costs neither a copy nor extra space.
+    Objects are read-only and so are the delivered files sharing their inode: replace a delivered file by
+    writing a new one and renaming it, never write to it in place, which would corrupt the cache for every
+    key with the same content (root ignores the permission). Across filesystems, where hard links are not
+    possible, delivery falls back to a copy, reflinked where the filesystem supports it. The "copy" mode
+    always gives the destination its own writable contents, the "symlink" mode leaves links that dangle
+    once their object is evicted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path = PROJECT_PATHS.CACHE_DATA / "s3",
+        max_bytes: int = 10 * GiB,
+        ttl_seconds: float = 300.0,
+        link_mode: str = "hardlink",
+    ):
+        """
+        Args:
+            cache_dir: Cache root directory, best placed on the same filesystem as the destinations for hard links.
+            max_bytes: Total size of cached objects above which the least recently used ones are evicted.
+            ttl_seconds: How long a key is trusted without revalidation, 0 sends a HEAD on every fetch.
+            link_mode: Delivery method, one of "hardlink", "symlink" or "copy". Hard links fall back to a copy
+                across filesystems, symbolic links whenever they cannot be created.
+        """
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link_mode!r}, expected one of {LINK_MODES}")
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.link_mode = link_mode
+        self.objects_dir = self.cache_dir / "objects"
+        self.index_dir = self.cache_dir / "index"
+        self.locks_dir = self.cache_dir / "locks"
+        self.tmp_dir = self.cache_dir / "tmp"
+        for directory in (self.objects_dir, self.index_dir, self.locks_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def fetch(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        dest_path: str | Path,
+        callback: Optional[Callable[[int], None]] = None,
+        cancel_event: Optional[Event] = None,
+    ) -> bool:
+        """
+        Deliver `s3://bucket/key` to `dest_path`, downloading it into the cache first on a miss.
+
+        Args:
+            s3_client: boto3 S3 client used for the HEAD and GET requests.
+            bucket: S3 bucket name.
+            key: S3 object key.
+            dest_path: Destination file path, replaced if it exists.
+            callback: Called with the number of bytes downloaded after every chunk of a fill.
+            cancel_event: When set, a running fill raises `TransferCancelledError` at its next chunk.
+
+        Returns:
+            True on a cache hit, False if the object was downloaded.
+        """
+        index_path = self.index_dir / f"{_digest(bucket, key)}.json"
+        entry = self._load_entry(index_path)
+        if entry and time.time() - entry["checked_at"] < self.ttl_seconds:
+            object_path = self._object_path(entry["etag"], entry["size"])
+            # Under the object lock, so the object cannot be evicted between the check and the delivery
+            with self._locked(object_path.name):
+                if object_path.exists():
+                    self._deliver(object_path, Path(dest_path))
+                    logger.debug(f"Cache hit for s3://{bucket}/{key} within TTL")
+                    return True
+
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        etag, size = head["ETag"].strip('"'), head["ContentLength"]
+        entry = {
+            "bucket": bucket,
+            "key": key,
+            "etag": etag,
+            "size": size,
+            "content_encoding": head.get("ContentEncoding"),
+            "checked_at": time.time(),
+        }
+
+        if size > self.max_bytes:
+            logger.warning(f"s3://{bucket}/{key} is larger than the cache ({size} bytes), downloading uncached")
+            tmp_path = Path(f"{dest_path}.{uuid.uuid4().hex}.tmp")
+            self._fill(s3_client, bucket, key, etag, tmp_path, callback, cancel_event)
+            os.replace(tmp_path, dest_path)
+            # Without an object the entry never serves a hit, but `lookup` still reports the encoding
+            self._save_entry(index_path, entry)
+            return False
+
+        object_path = self._object_path(etag, size)
+        hit = True
+        with self._locked(object_path.name):
+            if not object_path.exists():
+                hit = False
+                tmp_path = self.tmp_dir / f"{object_path.name}.{uuid.uuid4().hex}"
+                self._fill(s3_client, bucket, key, etag, tmp_path, callback, cancel_event)
+                os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(tmp_path, object_path)
+            self._deliver(object_path, Path(dest_path))
+        self._save_entry(index_path, entry)
+        logger.debug(f"Cache {'hit' if hit else 'miss'} for s3://{bucket}/{key} (ETag {etag})")
+
+        if not hit:
+            self.evict(keep=object_path)
+        return hit
+
+    def lookup(self, bucket: str, key: str) -> Optional[Dict]:
+        """Index entry of a cached key, with its ETag, size and content encoding, or None."""
+        return self._load_entry(self.index_dir / f"{_digest(bucket, key)}.json")
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        Remove least recently used objects until the cache fits in `max_bytes`.
+
+        Args:
+            keep: Object that must not be evicted, e.g. the one just delivered.
+
+        Returns:
+            Number of bytes freed.
+        """
+        with self._locked("evict"):
+            objects = []
+            for item in os.scandir(self.objects_dir):
+                if item.is_file(follow_symlinks=False):
+                    item_stat = item.stat(follow_symlinks=False)
+                    objects.append((item_stat.st_mtime, item_stat.st_size, Path(item.path)))
+            total = sum(size for _, size, _ in objects)
+            freed = 0
+            for _, size, path in sorted(objects, key=lambda item: item[0]):
+                if total - freed <= self.max_bytes:
+                    break
+                if keep is not None and path == keep:
+                    continue
+                # Waits for a delivery of the object in progress
+                with self._locked(path.name):
+                    try:
+                        path.unlink()
+                        freed += size
+                    except FileNotFoundError:
+                        continue
+                    finally:
+                        (self.locks_dir / f"{path.name}.lock").unlink(missing_ok=True)
+        if freed:
+            logger.info(f"Evicted {freed} bytes from the S3 cache {self.cache_dir}")
+        return freed
+
+    def size(self) -> int:
+        """Total size in bytes of the cached objects."""
+        return sum(item.stat().st_size for item in os.scandir(self.objects_dir) if item.is_file())
+
+    def _fill(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        etag: str,
+        tmp_path: Path,
+        callback: Optional[Callable[[int], None]],
+        cancel_event: Optional[Event],
+    ) -> None:
+        # IfMatch guarantees the bytes belong to the ETag the object is cached under
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=key, IfMatch=f'"{etag}"')
+            with open(tmp_path, "wb") as f:
+                for chunk in response["Body"].iter_chunks(chunk_size=MiB):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise TransferCancelledError(f"Download of s3://{bucket}/{key} cancelled")
+                    f.write(chunk)
+                    if callback:
+                        callback(len(chunk))
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+    def _deliver(self, object_path: Path, dest_path: Path) -> None:
+        """Place the object at `dest_path` atomically, and mark it as recently used."""
+        os.utime(object_path)
+        # Renaming a hard link over another link to the same file is a no-op that would leave tmp_path behind
+        if dest_path.exists() and os.path.samefile(object_path, dest_path):
+            return
+        tmp_path = dest_path.with_name(f"{dest_path.name}.{uuid.uuid4().hex}.tmp")
+        for mode in dict.fromkeys([self.link_mode, "copy"]):
+            try:
+                match mode:
+                    case "hardlink":
+                        os.link(object_path, tmp_path)
+                    case "symlink":
+                        os.symlink(object_path.resolve(), tmp_path)
+                    case "copy":
+                        _copy(object_path, tmp_path)
+                # A symlink to an object evicted meanwhile would dangle, never deliver one
+                if not tmp_path.exists():
+                    tmp_path.unlink(missing_ok=True)
+                    raise FileNotFoundError(f"Cached object {object_path} no longer exists")
+                os.replace(tmp_path, dest_path)
+                return
+            except OSError as e:
+                if mode == "copy" or (mode == "hardlink" and e.errno != errno.EXDEV):
+                    raise
+                logger.debug(f"Cannot {mode} {object_path} to {dest_path}, copying instead: {e}")
+
+    def _object_path(self, etag: str, size: int) -> Path:
+        return self.objects_dir / _digest(etag, str(size))
+
+    @contextmanager
+    def _locked(self, name: str) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        lock_path = self.locks_dir / f"{name}.lock"
+        while True:
+            with open(lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Eviction deletes the lock file under the lock, a waiter then holds a lock nobody else sees
+                    if _same_file(lock_file, lock_path):
+                        yield
+                        return
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _load_entry(index_path: Path) -> Optional[Dict]:
+        try:
+            with open(index_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_entry(self, index_path: Path, entry: Dict) -> None:
+        tmp_path = self.tmp_dir / f"{index_path.name}.{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, index_path)
+
+
+def _copy(src_path: Path, dest_path: Path) -> None:
+    """Reflink `src_path` to `dest_path` where supported, copy its contents otherwise."""
+    if fcntl is not None:
+        with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            try:
+                fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:  # not a copy-on-write filesystem, or across filesystems
+                pass
+    shutil.copyfile(src_path, dest_path)
+
+
+def _same_file(file, path: Path) -> bool:
+    try:
+        return os.path.samestat(os.fstat(file.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
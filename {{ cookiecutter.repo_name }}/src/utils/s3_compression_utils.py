@@ -0,0 +1,151 @@
+import io
+import logging
+import os
+import zlib
+from typing import BinaryIO, Optional
+
+from src.utils.s3_transfer_utils import MiB
+
+try:
+    import zstandard
+except ImportError:  # zstd stays unavailable, gzip only needs the standard library
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODECS = ("gzip", "zstd")
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+# Compressed bytes handed to the decompressor at once, which bounds the decompressed output held in memory
+DECOMPRESS_SLICE = 64 * 1024
+
+
+def _compressor(codec: str, level: Optional[int] = None):
+    level = DEFAULT_LEVELS.get(codec) if level is None else level
+    match codec:
+        case "gzip":
+            return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        case "zstd":
+            _require_zstandard()
+            return zstandard.ZstdCompressor(level=level).compressobj()
+        case _:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+
+
+def _decompressor(codec: str):
+    match codec:
+        case "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        case "zstd":
+            _require_zstandard()
+            return zstandard.ZstdDecompressor().decompressobj()
+        case _:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package: pip install zstandard")
+
+
+class CompressingReader(io.RawIOBase):
+    """
+    Readable stream returning the compressed bytes of `source`, compressing `chunk_size` bytes at a time
+    so memory stays flat whatever the source size. Pass it to an upload that reads a stream, e.g.
+    `StreamingMultipartUploader.upload`.
+    """
+
+    def __init__(self, source: BinaryIO, codec: str, level: Optional[int] = None, chunk_size: int = MiB):
+        super().__init__()
+        self.source = source
+        self.codec = codec
+        self.chunk_size = chunk_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._compressor = _compressor(codec, level)
+        self._buffer = b""
+        self._offset = 0
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while self._offset == len(self._buffer) and not self._eof:
+            chunk = self.source.read(self.chunk_size)
+            if chunk:
+                self.bytes_in += len(chunk)
+                self._buffer = self._compressor.compress(chunk)
+            else:
+                self._buffer = self._compressor.flush()
+                self._eof = True
+            self._offset = 0
+        length = min(len(target), len(self._buffer) - self._offset)
+        target[:length] = self._buffer[self._offset:self._offset + length]
+        self._offset += length
+        self.bytes_out += length
+        return length
+
+
+class DecompressingWriter(io.RawIOBase):
+    """
+    Writable, non-seekable stream decompressing everything written to it into `dest`, so a download can
+    write compressed chunks as they arrive. Closing it checks the compressed stream is complete and
+    flushes `dest`, without closing it. Leaving a `with` block on an error, or `abort`, closes it
+    without the check, so the original error is not hidden by a truncated stream.
+    """
+
+    def __init__(self, dest: BinaryIO, codec: str):
+        super().__init__()
+        self.dest = dest
+        self.codec = codec
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._decompressor = _decompressor(codec)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._checkClosed()
+        with memoryview(data) as view:
+            for start in range(0, len(view), DECOMPRESS_SLICE):
+                decompressed = self._decompressor.decompress(view[start:start + DECOMPRESS_SLICE])
+                self.dest.write(decompressed)
+                self.bytes_out += len(decompressed)
+            self.bytes_in += len(view)
+            return len(view)
+
+    def close(self) -> None:
+        if not self.closed:
+            if hasattr(self._decompressor, "flush"):
+                tail = self._decompressor.flush()
+                self.dest.write(tail)
+                self.bytes_out += len(tail)
+            if not self._decompressor.eof:
+                super().close()
+                raise IOError(f"Truncated {self.codec} stream after {self.bytes_in} bytes")
+            self.dest.flush()
+        super().close()
+
+    def abort(self) -> None:
+        """Close the writer after a failed transfer, leaving the partial output as is."""
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def decompress_file(path: str, codec: str, chunk_size: int = MiB) -> None:
+    """Decompress the file at `path` in place, through a temporary file renamed over it."""
+    tmp_path = f"{path}.decompress"
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as dest, DecompressingWriter(dest, codec) as writer:
+            while chunk := src.read(chunk_size):
+                writer.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,195 @@
+import io
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import RLock
+from typing import Dict, List, Optional
+
+from src.utils.s3_transfer_utils import MiB
+
+logger = logging.getLogger(__name__)
+
+
+class S3File(io.RawIOBase):
+    """
+    Seekable read-only file object over an S3 object that fetches byte ranges on demand.
+
+    The object is split in `block_size` blocks fetched with ranged GETs and kept in an LRU cache of
+    `cache_blocks` blocks. Reads spanning several missing blocks fetch them in parallel, and sequential
+    reads prefetch the next `read_ahead` blocks in the background. Every range is requested with
+    `IfMatch` on the ETag seen when the file was opened, so a read fails instead of mixing two versions
+    of an object that changed in the meantime.
+
+    The file can be passed to readers that only need a seekable binary file, e.g. `pq.ParquetFile(f)`,
+    `pd.read_parquet(f)` or `np.load(f)`, which then only download the bytes they read. It reads the
+    bytes as stored: an object uploaded with a `ContentEncoding` (see `content_encoding`) reads compressed.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        block_size: int = MiB,
+        cache_blocks: int = 64,
+        read_ahead: int = 2,
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            s3_client: boto3 S3 client used for the HEAD and range requests.
+            bucket: S3 bucket name.
+            key: S3 object key.
+            block_size: Size of every range request and cache block in bytes.
+            cache_blocks: Number of blocks kept in memory.
+            read_ahead: Number of blocks prefetched after a sequential read, 0 disables read-ahead.
+            max_workers: Number of concurrent range requests.
+        """
+        super().__init__()
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.size: int = head["ContentLength"]
+        self.etag: str = head["ETag"]
+        self.content_encoding: Optional[str] = head.get("ContentEncoding")
+        self.block_size = block_size
+        self.cache_blocks = max(cache_blocks, 1)
+        self.read_ahead = read_ahead
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._position = 0
+        self._last_block = -1
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+        self._pending: Dict[int, Future] = {}
+        # Reentrant because a block fetched before its done callback is registered stores itself in _schedule
+        self._lock = RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-file")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        match whence:
+            case io.SEEK_SET:
+                position = offset
+            case io.SEEK_CUR:
+                position = self._position + offset
+            case io.SEEK_END:
+                position = self.size + offset
+            case _:
+                raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        self._checkClosed()
+        remaining = max(self.size - self._position, 0)
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        buffer = bytearray(size)
+        length = self.readinto(buffer)
+        return bytes(buffer) if length == size else bytes(buffer[:length])
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def readinto(self, target) -> int:
+        self._checkClosed()
+        start = self._position
+        end = min(start + len(target), self.size)
+        if start >= end:
+            return 0
+        first, last = start // self.block_size, (end - 1) // self.block_size
+        blocks = self._get_blocks(list(range(first, last + 1)))
+
+        with memoryview(target) as view:
+            offset = 0
+            for index, block in zip(range(first, last + 1), blocks):
+                block_start = index * self.block_size
+                lo = max(start - block_start, 0)
+                hi = min(end - block_start, len(block))
+                view[offset:offset + hi - lo] = block[lo:hi]
+                offset += hi - lo
+
+        if self.read_ahead and first in (self._last_block, self._last_block + 1):
+            self._schedule(range(last + 1, last + 1 + self.read_ahead))
+        self._last_block = last
+        self._position = end
+        return end - start
+
+    def close(self) -> None:
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._cache.clear()
+                self._pending.clear()
+            logger.debug(
+                f"Closed s3://{self.bucket}/{self.key}: {self.bytes_fetched} of {self.size} bytes "
+                f"fetched in {self.requests} requests"
+            )
+        super().close()
+
+    def _get_blocks(self, indices: List[int]) -> List[bytes]:
+        futures = self._schedule(indices)
+        return [futures[index].result() if index in futures else self._cached(index) for index in indices]
+
+    def _schedule(self, indices) -> Dict[int, Future]:
+        """Start fetching the blocks neither cached nor in flight, returning the futures of those not cached."""
+        futures = {}
+        num_blocks = (self.size + self.block_size - 1) // self.block_size
+        with self._lock:
+            for index in indices:
+                if index >= num_blocks or index in self._cache:
+                    continue
+                if index in self._pending:
+                    futures[index] = self._pending[index]
+                    continue
+                future = self._executor.submit(self._fetch, index)
+                self._pending[index] = futures[index] = future
+                future.add_done_callback(lambda done, index=index: self._store(index, done))
+        return futures
+
+    def _cached(self, index: int) -> bytes:
+        while True:
+            with self._lock:
+                block = self._cache.get(index)
+                if block is not None:
+                    self._cache.move_to_end(index)
+                    return block
+            # Evicted between the cache check and now, fetch it again
+            future = self._schedule([index]).get(index)
+            if future is not None:
+                return future.result()
+
+    def _fetch(self, index: int) -> bytes:
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}", IfMatch=self.etag
+        )
+        block = response["Body"].read()
+        if len(block) != end - start + 1:
+            raise IOError(f"Range {start}-{end} of s3://{self.bucket}/{self.key} returned {len(block)} bytes")
+        return block
+
+    def _store(self, index: int, future: Future) -> None:
+        with self._lock:
+            self._pending.pop(index, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            block = future.result()
+            self.bytes_fetched += len(block)
+            self.requests += 1
+            self._cache[index] = block
+            self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
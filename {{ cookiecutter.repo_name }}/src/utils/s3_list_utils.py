@@ -0,0 +1,184 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from queue import Empty, Full, Queue
+from threading import Event, Lock
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from src.utils.s3_transfer_utils import TransferCancelledError
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class DeleteReport(BaseModel):
+    deleted: int = 0
+    errors: Dict[str, str] = {}
+
+
+class S3Lister:
+    """
+    Lists and deletes S3 objects at scale.
+
+    `iter_objects` streams the objects under a prefix as they are listed. In parallel mode the first
+    `max_depth` levels are listed with a "/" delimiter, every discovered sub-prefix is listed by its own
+    worker, and prefixes below `max_depth` are paginated without delimiter. Pages go through a bounded
+    queue, so listing never runs more than `queue_size` objects ahead of the consumer and stops as soon as
+    the generator is closed. Objects are yielded as returned by `list_objects_v2`, in no particular order
+    across sub-prefixes.
+
+    `delete_objects` deletes keys from any iterable, including `iter_objects`, in batches of 1000 keys,
+    the maximum of a single `delete_objects` call.
+    """
+
+    def __init__(self, s3_client, max_workers: int = 16, queue_size: int = 10_000, page_size: int = 1000):
+        """
+        Args:
+            s3_client: boto3 S3 client, shared by the listing workers.
+            max_workers: Number of sub-prefixes listed concurrently.
+            queue_size: Maximum number of listed objects waiting to be consumed.
+            page_size: Number of keys per `list_objects_v2` page, at most 1000.
+        """
+        self.s3_client = s3_client
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.page_size = page_size
+
+    def iter_objects(
+        self, bucket: str, prefix: str = "", parallel: bool = True, max_depth: int = 2
+    ) -> Iterator[Dict]:
+        """
+        Yield every object under `prefix`, listing lazily.
+
+        Args:
+            bucket: S3 bucket name.
+            prefix: Key prefix to list, e.g. "datasets/raw/".
+            parallel: Whether to fan out over the "/" sub-prefixes, otherwise pages are listed in key order.
+            max_depth: Number of "/" levels below `prefix` split into parallel listings.
+
+        Returns:
+            Iterator over object dicts with "Key", "Size", "ETag" and "LastModified".
+        """
+        if not parallel:
+            for page in self._paginate(bucket, prefix):
+                yield from page.get("Contents", [])
+            return
+
+        # Pages hold up to page_size objects, so the queue holds about queue_size objects
+        results: Queue = Queue(maxsize=max(self.queue_size // self.page_size, 1))
+        closed = Event()
+        lock = Lock()
+        pending = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="s3-list")
+
+        def put(item) -> None:
+            while not closed.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except Full:
+                    continue
+            raise TransferCancelledError("Listing consumer closed")
+
+        def submit(sub_prefix: str, depth: int) -> None:
+            nonlocal pending
+            with lock:
+                pending += 1
+            executor.submit(list_prefix, sub_prefix, depth)
+
+        def list_prefix(sub_prefix: str, depth: int) -> None:
+            nonlocal pending
+            try:
+                delimiter = "/" if depth < max_depth else None
+                for page in self._paginate(bucket, sub_prefix, delimiter):
+                    for common_prefix in page.get("CommonPrefixes", []):
+                        submit(common_prefix["Prefix"], depth + 1)
+                    if page.get("Contents"):
+                        put(page["Contents"])
+            except TransferCancelledError:
+                pass
+            except Exception as e:
+                put(e)
+            finally:
+                with lock:
+                    pending -= 1
+                    done = pending == 0
+                if done:
+                    put(_DONE)
+
+        submit(prefix, 0)
+        try:
+            while True:
+                try:
+                    item = results.get(timeout=0.1)
+                except Empty:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+        finally:
+            closed.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def delete_objects(
+        self,
+        bucket: str,
+        keys: Iterable[str],
+        batch_size: int = 1000,
+        max_workers: int = 4,
+        cancel_event: Optional[Event] = None,
+    ) -> DeleteReport:
+        """
+        Delete `keys` from `bucket` in batches, e.g. the keys of `iter_objects(bucket, prefix)` to clear a prefix.
+
+        Args:
+            bucket: S3 bucket name.
+            keys: Keys to delete, consumed lazily.
+            batch_size: Keys per `delete_objects` call, at most 1000.
+            max_workers: Number of batches deleted concurrently.
+            cancel_event: When set, no further batch is started.
+
+        Returns:
+            Report with the number of deleted keys and the error message of every key that failed.
+        """
+        report = DeleteReport()
+        keys = iter(keys)
+
+        def delete_batch(batch: List[str]) -> Dict:
+            return self.s3_client.delete_objects(
+                Bucket=bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            )
+
+        def collect(done) -> None:
+            for future in done:
+                batch, response = in_flight.pop(future), future.result()
+                errors = {error["Key"]: error.get("Message", error.get("Code")) for error in response.get("Errors", [])}
+                report.errors.update(errors)
+                report.deleted += len(batch) - len(errors)
+
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-delete") as executor:
+            while not (cancel_event is not None and cancel_event.is_set()):
+                batch = list(islice(keys, batch_size))
+                if not batch:
+                    break
+                in_flight[executor.submit(delete_batch, batch)] = batch
+                # Keep at most max_workers batches in flight, so keys are not read far ahead of the deletes
+                if len(in_flight) >= max_workers:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            collect(wait(in_flight).done)
+
+        logger.info(f"Deleted {report.deleted} objects from s3://{bucket}, {len(report.errors)} failed")
+        return report
+
+    def _paginate(self, bucket: str, prefix: str, delimiter: Optional[str] = None) -> Iterator[Dict]:
+        pagination = {"PageSize": self.page_size}
+        kwargs = {"Bucket": bucket, "Prefix": prefix, "PaginationConfig": pagination}
+        if delimiter:
+            kwargs["Delimiter"] = delimiter
+        yield from self.s3_client.get_paginator("list_objects_v2").paginate(**kwargs)
@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Event, Lock
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.utils.s3_list_utils import S3Lister
+from src.utils.s3_transfer_utils import MiB, StreamingMultipartUploader, TransferCancelledError
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".s3sync.json"
+MANIFEST_TMP_NAME = f"{MANIFEST_NAME}.tmp"
+
+
+class SyncReport(BaseModel):
+    direction: str
+    transferred_files: int = 0
+    transferred_bytes: int = 0
+    skipped_files: int = 0
+    skipped_bytes: int = 0
+    failed: List[str] = []
+
+
+class PrefixSync:
+    """
+    Mirrors an S3 prefix and a local directory in either direction, transferring only changed objects.
+
+    A manifest stored in the local directory records, for every synced file, the object size and ETag and
+    the local mtime right after the last transfer. A file is skipped when the listed object and the local
+    file both still match their manifest entry. Uploads take the ETag from the upload response, so keeping
+    the manifest up to date costs no extra request per object.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        prefix: str,
+        local_dir: str | Path,
+        max_workers: int = 8,
+        part_size: int = 16 * MiB,
+    ):
+        """
+        Args:
+            s3_client: boto3 S3 client, shared by the transfer workers.
+            bucket: S3 bucket name.
+            prefix: Key prefix mirrored into `local_dir`, e.g. "datasets/raw", treated as a folder.
+            local_dir: Local directory, e.g. `PROJECT_PATHS.RAW_DATA`.
+            max_workers: Number of concurrent object transfers.
+            part_size: Files larger than this are uploaded in parts of this size, one part at a time per file.
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix if not prefix or prefix.endswith("/") else f"{prefix}/"
+        self.local_dir = Path(local_dir)
+        self.max_workers = max_workers
+        self.part_size = part_size
+        self.manifest_path = self.local_dir / MANIFEST_NAME
+        self._lock = Lock()
+
+    def download(self, cancel_event: Optional[Event] = None) -> SyncReport:
+        """Bring the local directory up to date with the S3 prefix."""
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        remote = self._list_remote()
+        manifest = self._load_manifest()
+        report = SyncReport(direction="download")
+        jobs = []
+        for rel_path, (size, etag) in remote.items():
+            entry = manifest.get(rel_path)
+            local_path = self.local_dir / rel_path
+            if entry and entry["etag"] == etag and entry["size"] == size and _matches_local(local_path, entry):
+                report.skipped_files += 1
+                report.skipped_bytes += size
+            else:
+                jobs.append((rel_path, size, etag))
+
+        def transfer(rel_path: str, size: int, etag: str) -> Dict:
+            local_path = self.local_dir / rel_path
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = local_path.with_name(f"{local_path.name}.sync")
+            try:
+                self.s3_client.download_file(self.bucket, self._key(rel_path), str(tmp_path))
+                os.replace(tmp_path, local_path)
+            finally:
+                # Left behind only when the download failed
+                tmp_path.unlink(missing_ok=True)
+            return {"size": size, "etag": etag, "mtime": local_path.stat().st_mtime}
+
+        self._run(jobs, transfer, manifest, report, cancel_event)
+        return report
+
+    def upload(self, cancel_event: Optional[Event] = None) -> SyncReport:
+        """Bring the S3 prefix up to date with the local directory."""
+        remote = self._list_remote()
+        manifest = self._load_manifest()
+        report = SyncReport(direction="upload")
+        jobs = []
+        for local_path in sorted(self.local_dir.rglob("*")):
+            # The manifest and its temporary copy belong to the sync, not to the mirrored directory
+            if (
+                not local_path.is_file()
+                or (local_path.parent == self.local_dir and local_path.name in (MANIFEST_NAME, MANIFEST_TMP_NAME))
+                or local_path.name.endswith(".sync")
+            ):
+                continue
+            rel_path = local_path.relative_to(self.local_dir).as_posix()
+            size = local_path.stat().st_size
+            entry = manifest.get(rel_path)
+            remote_object = remote.get(rel_path)
+            if entry and remote_object and remote_object == (entry["size"], entry["etag"]) and _matches_local(
+                local_path, entry
+            ):
+                report.skipped_files += 1
+                report.skipped_bytes += size
+            else:
+                jobs.append((rel_path, size, None))
+
+        def transfer(rel_path: str, size: int, _) -> Dict:
+            local_path = self.local_dir / rel_path
+            mtime = local_path.stat().st_mtime
+            key = self._key(rel_path)
+            with open(local_path, "rb") as f:
+                if size < self.part_size:
+                    etag = self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=f)["ETag"].strip('"')
+                else:
+                    uploader = StreamingMultipartUploader(self.s3_client, part_size=self.part_size, max_concurrency=1)
+                    etag = uploader.upload(f, self.bucket, key, cancel_event=cancel_event).etag
+            return {"size": size, "etag": etag, "mtime": mtime}
+
+        self._run(jobs, transfer, manifest, report, cancel_event)
+        return report
+
+    def _run(self, jobs, transfer, manifest: Dict, report: SyncReport, cancel_event: Optional[Event]) -> None:
+        """Run the transfers on a bounded pool, saving the manifest even if the sync is interrupted."""
+
+        def run_job(rel_path: str, size: int, etag: Optional[str]) -> None:
+            if cancel_event is not None and cancel_event.is_set():
+                raise TransferCancelledError("Sync cancelled")
+            try:
+                entry = transfer(rel_path, size, etag)
+            except TransferCancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to sync {rel_path}: {e}")
+                with self._lock:
+                    report.failed.append(rel_path)
+                return
+            with self._lock:
+                manifest[rel_path] = entry
+                report.transferred_files += 1
+                report.transferred_bytes += size
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="s3-sync") as pool:
+                for future in [pool.submit(run_job, *job) for job in jobs]:
+                    future.result()
+        finally:
+            self._save_manifest(manifest)
+        logger.info(
+            f"Synced s3://{self.bucket}/{self.prefix} ({report.direction}): "
+            f"{report.transferred_files} files / {report.transferred_bytes} bytes transferred, "
+            f"{report.skipped_files} files / {report.skipped_bytes} bytes skipped, {len(report.failed)} failed"
+        )
+
+    def _list_remote(self) -> Dict[str, Tuple[int, str]]:
+        remote = {}
+        for obj in S3Lister(self.s3_client, max_workers=self.max_workers).iter_objects(self.bucket, self.prefix):
+            rel_path = obj["Key"][len(self.prefix):]
+            if rel_path and not rel_path.endswith("/"):
+                remote[rel_path] = (obj["Size"], obj["ETag"].strip('"'))
+        return remote
+
+    def _key(self, rel_path: str) -> str:
+        return f"{self.prefix}{rel_path}"
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, "r") as f:
+            data = json.load(f)
+        if data.get("bucket") != self.bucket or data.get("prefix") != self.prefix:
+            logger.warning(f"Ignoring manifest {self.manifest_path} written for another bucket or prefix")
+            return {}
+        return data["objects"]
+
+    def _save_manifest(self, manifest: Dict[str, Dict]) -> None:
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(MANIFEST_TMP_NAME)
+        with open(tmp_path, "w") as f:
+            json.dump({"bucket": self.bucket, "prefix": self.prefix, "objects": manifest}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def _matches_local(path: Path, entry: Dict) -> bool:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    return stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]
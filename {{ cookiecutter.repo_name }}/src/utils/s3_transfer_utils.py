@@ -0,0 +1,483 @@
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from queue import Queue
+from threading import Event, Lock
+from typing import BinaryIO, Callable, Dict, List, Optional, Set
+
+from botocore.exceptions import BotoCoreError, ClientError
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+MiB = 1024 * 1024
+_MD5_ETAG = re.compile(r"^[0-9a-f]{32}(-\d+)?$")
+
+
+class TransferCancelledError(Exception):
+    """Raised from a transfer callback or worker to stop a blocking S3 transfer once it has been cancelled."""
+
+
+class ChecksumMismatchError(Exception):
+    """Raised when a transferred object does not match its S3 ETag."""
+
+
+class RangedDownloader:
+    """
+    Downloads an S3 object with parallel byte-range GETs written into a preallocated file.
+
+    The object is written to `<path>.download` while a sidecar `<path>.download.json` records the
+    completed parts, so an interrupted download resumes with the missing parts only, as long as the
+    object ETag did not change. Every range is requested with `IfMatch` on the ETag seen at the start.
+    Once all parts are written the file is checked against the ETag (plain or multipart MD5) and moved
+    to `path`.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        part_size: int = 16 * MiB,
+        max_concurrency: int = 8,
+        max_attempts: int = 3,
+        verify: bool = True,
+    ):
+        """
+        Args:
+            s3_client: boto3 S3 client, shared by the part workers.
+            part_size: Size of every byte range in bytes.
+            max_concurrency: Number of ranges downloaded in parallel.
+            max_attempts: Number of attempts per range before the download fails.
+            verify: Whether to check the downloaded file against the object ETag.
+        """
+        self.s3_client = s3_client
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.verify = verify
+
+    def download(
+        self,
+        bucket: str,
+        key: str,
+        path: str,
+        callback: Optional[Callable[[int], None]] = None,
+        cancel_event: Optional[Event] = None,
+        throttle: Optional[Callable[[int], None]] = None,
+        head: Optional[Dict] = None,
+    ) -> None:
+        """
+        Download `s3://bucket/key` to `path`, resuming a previous interrupted attempt if possible.
+
+        Args:
+            bucket: S3 bucket name.
+            key: S3 object key.
+            path: Destination file path.
+            callback: Called with the number of bytes written after every chunk, e.g. to advance a progress bar.
+            cancel_event: When set, part workers raise `TransferCancelledError` at their next chunk and the
+                partial state is kept for resume.
+            throttle: Called with the size of every chunk received, before it is written, and may block to
+                limit the bandwidth. Unlike `callback`, it never sees the bytes resumed from a previous attempt.
+            head: `head_object` response of the object if the caller already has it, requested otherwise.
+        """
+        head = head or self.s3_client.head_object(Bucket=bucket, Key=key)
+        size, etag = head["ContentLength"], head["ETag"].strip('"')
+        tmp_path, state_path = f"{path}.download", f"{path}.download.json"
+        state = self._load_state(state_path, tmp_path, size, etag)
+        completed: Set[int] = set(state["completed"])
+
+        if not os.path.exists(tmp_path) or not completed:
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+            completed.clear()
+        elif callback:
+            callback(sum(self._part_length(part, size) for part in completed))
+
+        num_parts = max((size + self.part_size - 1) // self.part_size, 1)
+        pending = [part for part in range(num_parts) if part not in completed]
+        state_lock = Lock()
+        stop_event = cancel_event or Event()
+
+        def download_part(part: int) -> None:
+            self._download_part(bucket, key, etag, tmp_path, part, size, callback, stop_event, throttle)
+            with state_lock:
+                completed.add(part)
+                self._save_state(state_path, {**state, "completed": sorted(completed)})
+
+        if size:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3-range") as pool:
+                futures = [pool.submit(download_part, part) for part in pending]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    # Stop running parts at their next chunk and drop the queued ones before they send a request
+                    stop_event.set()
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+
+        if self.verify:
+            self._verify(bucket, key, tmp_path, etag, size)
+        os.replace(tmp_path, path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        logger.debug(f"Downloaded s3://{bucket}/{key} in {num_parts} parts ({len(pending)} fetched)")
+
+    def _download_part(
+        self,
+        bucket: str,
+        key: str,
+        etag: str,
+        tmp_path: str,
+        part: int,
+        size: int,
+        callback: Optional[Callable[[int], None]],
+        stop_event: Event,
+        throttle: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        start = part * self.part_size
+        end = start + self._part_length(part, size) - 1
+        for attempt in range(1, self.max_attempts + 1):
+            written = 0
+            if stop_event.is_set():
+                raise TransferCancelledError(f"Download of s3://{bucket}/{key} cancelled")
+            try:
+                response = self.s3_client.get_object(
+                    Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=f'"{etag}"'
+                )
+                with open(tmp_path, "r+b") as f:
+                    f.seek(start)
+                    for chunk in response["Body"].iter_chunks(chunk_size=MiB):
+                        if stop_event.is_set():
+                            raise TransferCancelledError(f"Download of s3://{bucket}/{key} cancelled")
+                        if throttle:
+                            throttle(len(chunk))
+                        f.write(chunk)
+                        written += len(chunk)
+                        if callback:
+                            callback(len(chunk))
+                if written != end - start + 1:
+                    raise IOError(f"Range {start}-{end} returned {written} bytes")
+                return
+            except (BotoCoreError, ClientError, IOError) as e:
+                if callback and written:
+                    callback(-written)
+                if attempt == self.max_attempts or _is_precondition_error(e):
+                    raise
+                logger.warning(f"Retrying range {start}-{end} of s3://{bucket}/{key} after error: {e}")
+
+    def _part_length(self, part: int, size: int) -> int:
+        return min(self.part_size, size - part * self.part_size)
+
+    def _load_state(self, state_path: str, tmp_path: str, size: int, etag: str) -> Dict:
+        state = {"etag": etag, "size": size, "part_size": self.part_size, "completed": []}
+        if os.path.exists(state_path) and os.path.exists(tmp_path):
+            try:
+                with open(state_path, "r") as f:
+                    saved = json.load(f)
+                if all(saved.get(field) == state[field] for field in ("etag", "size", "part_size")):
+                    logger.info(f"Resuming download with {len(saved['completed'])} completed parts")
+                    return saved
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable download state {state_path}: {e}")
+        return state
+
+    @staticmethod
+    def _save_state(state_path: str, state: Dict) -> None:
+        tmp_state_path = f"{state_path}.tmp"
+        with open(tmp_state_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_state_path, state_path)
+
+    def _verify(self, bucket: str, key: str, path: str, etag: str, size: int) -> None:
+        if not _MD5_ETAG.match(etag):
+            logger.warning(f"Cannot verify s3://{bucket}/{key}: ETag {etag} is not an MD5 checksum")
+            return
+        if "-" in etag:
+            # The first part of a multipart object tells the part size used at upload time
+            part_size = self.s3_client.head_object(Bucket=bucket, Key=key, PartNumber=1)["ContentLength"]
+            actual = multipart_etag(path, part_size, multipart=True)
+        else:
+            actual = multipart_etag(path, max(size, 1), multipart=False)
+        if actual != etag:
+            os.remove(path)
+            raise ChecksumMismatchError(f"s3://{bucket}/{key}: expected ETag {etag}, downloaded file has {actual}")
+
+
+class MultipartUploadReport(BaseModel):
+    bucket: str
+    key: str
+    etag: str
+    size: int
+    parts: int
+    sha256: str
+
+
+class StreamingMultipartUploader:
+    """
+    Uploads a non-seekable stream, e.g. an HTTP response body, to S3 with parallel multipart upload in
+    bounded memory.
+
+    The stream is read in `part_size` parts into a pool of `max_concurrency + 1` reusable buffers: reading
+    blocks while every buffer is waiting to be uploaded, so memory stays at about
+    `(max_concurrency + 1) * part_size` whatever the stream size. Every part is sent with its Content-MD5
+    and retried on its own, the MD5s are checked against the ETag returned by S3 on completion, and the
+    upload is aborted on any failure so no orphan parts are left billed. A stream that fits in one part is
+    sent with a single `put_object`.
+
+    S3 allows at most 10,000 parts, so `part_size` bounds the stream size (16 MiB parts allow 156 GiB).
+    """
+
+    def __init__(self, s3_client, part_size: int = 16 * MiB, max_concurrency: int = 4, max_attempts: int = 3):
+        """
+        Args:
+            s3_client: boto3 S3 client, shared by the part workers.
+            part_size: Size of every part in bytes, at least 5 MiB as required by S3.
+            max_concurrency: Number of parts uploaded in parallel.
+            max_attempts: Number of attempts per part before the upload is aborted.
+        """
+        if part_size < 5 * MiB:
+            raise ValueError("S3 multipart uploads require parts of at least 5 MiB")
+        self.s3_client = s3_client
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+
+    def upload(
+        self,
+        stream: BinaryIO,
+        bucket: str,
+        key: str,
+        extra_args: Optional[Dict] = None,
+        callback: Optional[Callable[[int], None]] = None,
+        cancel_event: Optional[Event] = None,
+    ) -> MultipartUploadReport:
+        """
+        Upload everything readable from `stream` to `s3://bucket/key`.
+
+        Args:
+            stream: Binary stream read sequentially, through `readinto` when available.
+            bucket: S3 bucket name.
+            key: S3 object key.
+            extra_args: Extra `create_multipart_upload`/`put_object` arguments, e.g. {"ContentType": "video/mp4"}.
+            callback: Called with the number of bytes of every uploaded part.
+            cancel_event: When set, the upload stops at the next part and is aborted.
+
+        Returns:
+            Report with the object ETag, size, number of parts and the SHA-256 of the uploaded bytes.
+        """
+        extra_args = extra_args or {}
+        stop_event = cancel_event or Event()
+        pool: Queue = Queue()
+        for _ in range(self.max_concurrency + 1):
+            pool.put(bytearray(self.part_size))
+        sha256 = hashlib.sha256()
+
+        buffer = pool.get()
+        length = _read_full(stream, buffer)
+        sha256.update(memoryview(buffer)[:length])
+        if length < self.part_size:
+            body = bytes(memoryview(buffer)[:length])
+            response = self._with_retries(
+                f"s3://{bucket}/{key}",
+                stop_event,
+                partial(
+                    self.s3_client.put_object,
+                    Bucket=bucket,
+                    Key=key,
+                    Body=body,
+                    ContentMD5=_content_md5(body),
+                    **extra_args,
+                ),
+            )
+            if callback:
+                callback(length)
+            return MultipartUploadReport(
+                bucket=bucket,
+                key=key,
+                etag=response["ETag"].strip('"'),
+                size=length,
+                parts=1,
+                sha256=sha256.hexdigest(),
+            )
+
+        upload_id = self.s3_client.create_multipart_upload(Bucket=bucket, Key=key, **extra_args)["UploadId"]
+        futures: List[Future] = []
+        size = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3-part") as executor:
+                part_number = 1
+                while length:
+                    if stop_event.is_set():
+                        raise TransferCancelledError(f"Upload of s3://{bucket}/{key} cancelled")
+                    if part_number > 10_000:
+                        raise ValueError(f"Stream exceeds 10,000 parts of {self.part_size} bytes")
+                    futures.append(
+                        executor.submit(
+                            self._upload_part,
+                            bucket, key, upload_id, part_number, buffer, length, pool, callback, stop_event,
+                        )
+                    )
+                    size += length
+                    part_number += 1
+                    # Blocks until a part upload returns its buffer to the pool
+                    buffer = pool.get()
+                    if any(future.done() and future.exception() for future in futures):
+                        break
+                    length = _read_full(stream, buffer)
+                    sha256.update(memoryview(buffer)[:length])
+                parts = [future.result() for future in futures]
+
+            etag = self.s3_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": part["PartNumber"], "ETag": part["ETag"]} for part in parts]},
+            )["ETag"].strip('"')
+        except BaseException:
+            stop_event.set()
+            logger.warning(f"Aborting multipart upload of s3://{bucket}/{key}")
+            self.s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+        expected = f"{hashlib.md5(b''.join(part['md5'] for part in parts)).hexdigest()}-{len(parts)}"
+        if _MD5_ETAG.match(etag) and etag != expected:
+            raise ChecksumMismatchError(f"s3://{bucket}/{key}: expected ETag {expected}, S3 returned {etag}")
+        logger.debug(f"Uploaded s3://{bucket}/{key} in {len(parts)} parts ({size} bytes)")
+        return MultipartUploadReport(
+            bucket=bucket, key=key, etag=etag, size=size, parts=len(parts), sha256=sha256.hexdigest()
+        )
+
+    def _upload_part(
+        self,
+        bucket: str,
+        key: str,
+        upload_id: str,
+        part_number: int,
+        buffer: bytearray,
+        length: int,
+        pool: Queue,
+        callback: Optional[Callable[[int], None]],
+        stop_event: Event,
+    ) -> Dict:
+        view = memoryview(buffer)[:length]
+        try:
+            md5 = hashlib.md5(view).digest()
+            response = self._with_retries(
+                f"part {part_number} of s3://{bucket}/{key}",
+                stop_event,
+                # A fresh reader per attempt, so a retry sends the part from its first byte
+                lambda: self.s3_client.upload_part(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=_BufferReader(view),
+                    ContentLength=length,
+                    ContentMD5=base64.b64encode(md5).decode(),
+                ),
+            )
+        finally:
+            view.release()
+            pool.put(buffer)
+        if callback:
+            callback(length)
+        return {"PartNumber": part_number, "ETag": response["ETag"], "md5": md5}
+
+    def _with_retries(self, description: str, stop_event: Event, request: Callable[[], Dict]) -> Dict:
+        """Send `request` up to `max_attempts` times, unless the upload is cancelled before an attempt."""
+        for attempt in range(1, self.max_attempts + 1):
+            if stop_event.is_set():
+                raise TransferCancelledError(f"Upload of {description} cancelled")
+            try:
+                return request()
+            except (BotoCoreError, ClientError) as e:
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning(f"Retrying {description} after error: {e}")
+
+
+def multipart_etag(path: str, part_size: int, multipart: bool = True) -> str:
+    """
+    Compute the S3 ETag of a local file: its MD5 for a single-part upload, or the MD5 of the part MD5s
+    followed by `-<num_parts>` for a multipart upload of `part_size` bytes parts.
+    """
+    part_digests: List[bytes] = []
+    with open(path, "rb") as f:
+        while True:
+            digest = hashlib.md5()
+            read = 0
+            while read < part_size:
+                chunk = f.read(min(8 * MiB, part_size - read))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                read += len(chunk)
+            if read == 0 and part_digests:
+                break
+            part_digests.append(digest.digest())
+            if read < part_size:
+                break
+    if not multipart:
+        return part_digests[0].hex()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only view over a part buffer, so a part can be sent and retried without copying it."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        length = min(len(target), len(self._view) - self._position)
+        target[:length] = self._view[self._position:self._position + length]
+        self._position += length
+        return length
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _read_full(stream: BinaryIO, buffer: bytearray) -> int:
+    """Fill `buffer` from `stream`, returning fewer bytes than its size only at the end of the stream."""
+    view = memoryview(buffer)
+    length = 0
+    while length < len(buffer):
+        if hasattr(stream, "readinto"):
+            read = stream.readinto(view[length:])
+        else:
+            chunk = stream.read(len(buffer) - length)
+            read = len(chunk)
+            view[length:length + read] = chunk
+        if not read:
+            break
+        length += read
+    view.release()
+    return length
+
+
+def _content_md5(body: bytes) -> str:
+    return base64.b64encode(hashlib.md5(body).digest()).decode()
+
+
+def _is_precondition_error(error: Exception) -> bool:
+    code = error.response.get("Error", {}).get("Code") if isinstance(error, ClientError) else None
+    return code in ("PreconditionFailed", "412")
@@ -1,8 +1,12 @@
+import asyncio
 import json
 import os.path
-from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from functools import cached_property, partial
 from pathlib import Path
-from threading import Event
+from threading import Event, Lock
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 import boto3
 import requests
@@ -17,15 +21,58 @@ from rich.progress import (
 )
 
 from src import logging
+from src.utils.aws_client_utils import DEFAULT_MAX_POOL_CONNECTIONS, AWSClientCache
+from src.utils.s3_cache_utils import S3ObjectCache
+from src.utils.s3_compression_utils import CODECS, CompressingReader, DecompressingWriter, decompress_file
+from src.utils.s3_file_utils import S3File
+from src.utils.s3_list_utils import DeleteReport, S3Lister
+from src.utils.s3_sync_utils import PrefixSync, SyncReport
+from src.utils.s3_transfer_utils import (
+    MiB,
+    MultipartUploadReport,
+    RangedDownloader,
+    StreamingMultipartUploader,
+    TransferCancelledError,
+)
+from src.utils.transfer_scheduler_utils import TransferScheduler
 
 logger = logging.getLogger(__name__)
 
+
 class AWSUtils:
-    """Manages AWS operations including S3, Secrets Manager, and SSM Parameter Store."""
-    
-    def __init__(self, region: str = "us-east-1", account_id: str = "641949442254"):
+    """
+    Manages AWS operations including S3, Secrets Manager, and SSM Parameter Store.
+
+    The async S3 transfer methods run the blocking boto3 calls on a thread pool owned by the instance,
+    so the event loop keeps serving other tasks. At most `max_concurrency` transfers run at once, and
+    cancelling the awaiting task stops the underlying transfer at its next chunk.
+
+    AWS clients are created on first use and shared across instances through `AWSClientCache`.
+
+    With a `cache`, `download_file_s3` serves objects from the local `S3ObjectCache` and links them
+    into the destination directory instead of downloading them again.
+
+    With a `scheduler`, every transfer takes a request token from it before starting and bandwidth tokens
+    for every chunk, sharing the limits with the `DownloadUtils` jobs of the process using the same one.
+    """
+
+    def __init__(
+        self,
+        region: str = "us-east-1",
+        account_id: str = "641949442254",
+        max_concurrency: int = 8,
+        cache: Optional[S3ObjectCache] = None,
+        max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+        scheduler: Optional[TransferScheduler] = None,
+        priority: str = "normal",
+    ):
         self.region = region
         self.account_id = account_id
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.max_pool_connections = max_pool_connections
+        self.scheduler = scheduler
+        self.priority = priority
         self.progress = Progress(
             TextColumn("[bold blue]{task.fields[filename]}", justify="right"),
             BarColumn(bar_width=None),
@@ -38,70 +85,377 @@ class AWSUtils:
             TimeRemainingColumn(),
         )
         self.done_event = Event()
-        
-        # Initialize AWS clients
-        self.s3_client = boto3.client("s3", region_name=self.region)
-        self.s3_resource = boto3.resource("s3", region_name=self.region)
-        self.ssm_client = boto3.client("ssm", region_name=self.region)
-        self.secrets_client = boto3.client("secretsmanager", region_name=self.region)
-
-    async def download_file_s3(self, bucket: str, filename: str, dest_dir: str) -> None:
-        """Download a file from S3 to a local file with progress tracking."""
-        with self.progress:
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="aws-transfer")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._progress_users = 0
+        self._progress_lock = Lock()
+
+    @property
+    def s3_client(self):
+        return AWSClientCache.get_client("s3", self.region, self.max_pool_connections)
+
+    @property
+    def ssm_client(self):
+        return AWSClientCache.get_client("ssm", self.region, self.max_pool_connections)
+
+    @property
+    def secrets_client(self):
+        return AWSClientCache.get_client("secretsmanager", self.region, self.max_pool_connections)
+
+    @cached_property
+    def s3_resource(self):
+        # Resources are not thread-safe, so unlike clients they are not shared across instances
+        return boto3.session.Session().resource(
+            "s3", region_name=self.region, config=AWSClientCache.client_config(self.max_pool_connections)
+        )
+
+    async def download_file_s3(self, bucket: str, filename: str, dest_dir: str, decompress: bool = True) -> None:
+        """
+        Download a file from S3 to a local file with progress tracking. Objects uploaded with a gzip or zstd
+        `ContentEncoding` are decompressed while downloading unless `decompress` is False.
+        """
+        with self._progress_session():
             file = filename.split("/")[-1]
             path = os.path.join(dest_dir, file)
             task_id = self.progress.add_task("download", filename=file, start=False)
             self.progress.console.log(f"Starting download for s3://{bucket}/{filename}")
-            
+
+            download = self._download_file_cached if self.cache else self._download_file
             try:
-                total_size = self.s3_client.head_object(Bucket=bucket, Key=filename)["ContentLength"]
-                if task_id is not None:
-                    self.progress.update(task_id, total=total_size)
-
-                def download_chunk(bytes_transferred):
-                    if task_id is not None:
-                        self.progress.update(task_id, advance=bytes_transferred)
-
-                with open(path, "wb") as dest_file:
-                    if task_id is not None:
-                        self.progress.start_task(task_id)
-                    self.s3_client.download_fileobj(
-                        Bucket=bucket,
-                        Key=filename,
-                        Fileobj=dest_file,
-                        Callback=download_chunk
-                    )
-                    if self.done_event.is_set():
-                        return
+                await self._run_transfer(download, bucket, filename, path, task_id, decompress)
                 self.progress.console.log(f"Downloaded {path}")
+            except asyncio.CancelledError:
+                self.progress.console.log(f"Cancelled download of s3://{bucket}/{filename}")
+                self._remove_partial(path)
+                raise
+            except TransferCancelledError:
+                self.progress.console.log(f"Stopped download of s3://{bucket}/{filename}")
+                self._remove_partial(path)
             except Exception as e:
                 self.progress.console.log(f"Failed to download s3://{bucket}/{filename}: {e}")
 
-    async def upload_file_s3(self, bucket: str, filename: str, path: str | Path) -> str:
-        """Upload a local file to S3."""
-        self.s3_resource.meta.client.upload_file(
+    def _download_file(
+        self, bucket: str, filename: str, path: str, task_id: int, decompress: bool, cancel_event: Event
+    ) -> None:
+        head = self.s3_client.head_object(Bucket=bucket, Key=filename)
+        self.progress.update(task_id, total=head["ContentLength"])
+        codec = head.get("ContentEncoding") if decompress and head.get("ContentEncoding") in CODECS else None
+
+        def download_chunk(bytes_transferred):
+            self.progress.update(task_id, advance=bytes_transferred)
+            self._raise_if_cancelled(cancel_event)
+            self._throttle(bytes_transferred)
+
+        with open(path, "wb") as dest_file:
+            # The writer is not seekable, so the transfer writes the chunks in order into the decompressor
+            target = DecompressingWriter(dest_file, codec) if codec else dest_file
+            self.progress.start_task(task_id)
+            try:
+                self.s3_client.download_fileobj(
+                    Bucket=bucket,
+                    Key=filename,
+                    Fileobj=target,
+                    Callback=download_chunk
+                )
+            except BaseException:
+                if codec:
+                    target.abort()
+                raise
+            if codec:
+                target.close()
+
+    def _download_file_cached(
+        self, bucket: str, filename: str, path: str, task_id: int, decompress: bool, cancel_event: Event
+    ) -> None:
+        def download_chunk(bytes_transferred):
+            self.progress.update(task_id, advance=bytes_transferred)
+            self._raise_if_cancelled(cancel_event)
+            self._throttle(bytes_transferred)
+
+        self.progress.start_task(task_id)
+        hit = self.cache.fetch(
+            self.s3_client, bucket, filename, path, callback=download_chunk, cancel_event=cancel_event
+        )
+        size = os.path.getsize(path)
+        self.progress.update(task_id, total=size, completed=size)
+        if hit:
+            self.progress.console.log(f"Served s3://{bucket}/{filename} from cache")
+        # The cache keeps objects as stored, so compressed ones are decompressed into a copy of the link
+        codec = (self.cache.lookup(bucket, filename) or {}).get("content_encoding")
+        if decompress and codec in CODECS:
+            decompress_file(path, codec)
+
+    async def download_file_s3_ranged(
+        self,
+        bucket: str,
+        filename: str,
+        dest_dir: str,
+        part_size: int = 16 * MiB,
+        max_concurrency: int = 8,
+        verify: bool = True,
+        decompress: bool = True,
+    ) -> str:
+        """
+        Download a large file from S3 with parallel byte-range requests, resuming an interrupted download
+        from its sidecar state file and verifying the result against the object ETag. The ranges are the
+        stored bytes, so objects with a gzip or zstd `ContentEncoding` are decompressed once downloaded
+        unless `decompress` is False.
+        """
+        file = filename.split("/")[-1]
+        path = os.path.join(dest_dir, file)
+        downloader = RangedDownloader(self.s3_client, part_size, max_concurrency, verify=verify)
+        with self._progress_session():
+            task_id = self.progress.add_task("download", filename=file, start=False)
+            self.progress.console.log(f"Starting ranged download for s3://{bucket}/{filename}")
+            await self._run_transfer(
+                self._download_file_ranged, downloader, bucket, filename, path, task_id, decompress
+            )
+            self.progress.console.log(f"Downloaded {path}")
+        return path
+
+    def _download_file_ranged(
+        self,
+        downloader: RangedDownloader,
+        bucket: str,
+        filename: str,
+        path: str,
+        task_id: int,
+        decompress: bool,
+        cancel_event: Event,
+    ) -> None:
+        head = self.s3_client.head_object(Bucket=bucket, Key=filename)
+        self.progress.update(task_id, total=head["ContentLength"])
+        self.progress.start_task(task_id)
+        downloader.download(
+            bucket,
+            filename,
+            path,
+            callback=lambda bytes_written: self.progress.update(task_id, advance=bytes_written),
+            cancel_event=cancel_event,
+            throttle=self._throttle,
+            head=head,
+        )
+        codec = head.get("ContentEncoding")
+        if decompress and codec in CODECS:
+            decompress_file(path, codec)
+
+    async def upload_file_s3(
+        self,
+        bucket: str,
+        filename: str,
+        path: str | Path,
+        compression: Optional[str] = None,
+        level: Optional[int] = None,
+    ) -> str:
+        """
+        Upload a local file to S3, optionally compressed on the fly with `compression="gzip"` or `"zstd"`.
+        Compressed objects are stored with the codec as `ContentEncoding` and their original size in the
+        `uncompressed-size` metadata, so `download_file_s3` restores the original file.
+        """
+        if compression is None:
+            await self._run_transfer(self._upload_file, bucket, filename, str(path))
+        else:
+            await self._run_transfer(self._upload_compressed_file, bucket, filename, str(path), compression, level)
+        return f"s3://{bucket}/{filename}"
+
+    def _upload_file(self, bucket: str, filename: str, path: str, cancel_event: Event) -> None:
+        self.s3_client.upload_file(
             Bucket=bucket,
             Key=filename,
-            Filename=str(path)
+            Filename=path,
+            Callback=lambda bytes_transferred: self._transfer_chunk(bytes_transferred, cancel_event)
+        )
+
+    def _upload_compressed_file(
+        self, bucket: str, filename: str, path: str, compression: str, level: Optional[int], cancel_event: Event
+    ) -> None:
+        uploader = StreamingMultipartUploader(self.s3_client)
+        with open(path, "rb") as source:
+            reader = CompressingReader(source, compression, level)
+            uploader.upload(
+                reader,
+                bucket,
+                filename,
+                extra_args={
+                    "ContentEncoding": compression,
+                    "Metadata": {"uncompressed-size": str(os.path.getsize(path))},
+                },
+                callback=lambda bytes_transferred: self._transfer_chunk(bytes_transferred, cancel_event),
+                cancel_event=cancel_event,
+            )
+        logger.info(
+            f"Uploaded s3://{bucket}/{filename} with {compression}: {reader.bytes_in} -> {reader.bytes_out} bytes"
         )
-        return f"s3://{bucket}/{filename}"
 
     async def upload_stream_file_s3(
         self,
         bucket: str,
         filename: str,
         url: str,
-        content_type: str = "video/mp4"
-    ) -> None:
-        """Upload a file to S3 from a URL stream."""
+        content_type: str = "video/mp4",
+        part_size: int = 16 * MiB,
+        max_concurrency: int = 4,
+    ) -> MultipartUploadReport:
+        """
+        Upload a file to S3 from a URL stream, with parallel multipart upload of `part_size` parts held in
+        at most `max_concurrency + 1` buffers.
+        """
         logger.info(f"Uploading file:{filename} to s3:{url}")
+        uploader = StreamingMultipartUploader(self.s3_client, part_size, max_concurrency)
+        return await self._run_transfer(self._upload_stream_file, uploader, bucket, filename, url, content_type)
+
+    def _upload_stream_file(
+        self,
+        uploader: StreamingMultipartUploader,
+        bucket: str,
+        filename: str,
+        url: str,
+        content_type: str,
+        cancel_event: Event,
+    ) -> MultipartUploadReport:
         with closing(requests.get(url, stream=True)) as r:
-            self.s3_resource.meta.client.upload_fileobj(
+            r.raise_for_status()
+            return uploader.upload(
                 r.raw,
                 bucket,
                 filename,
-                ExtraArgs={"ContentType": content_type}
+                extra_args={"ContentType": content_type},
+                callback=lambda bytes_transferred: self._transfer_chunk(bytes_transferred, cancel_event),
+                cancel_event=cancel_event,
+            )
+
+    def open(
+        self,
+        bucket: str,
+        filename: str,
+        block_size: int = MiB,
+        cache_blocks: int = 64,
+        read_ahead: int = 2,
+        raw: bool = False,
+    ) -> S3File:
+        """
+        Open an S3 object as a seekable read-only binary file that only downloads the byte ranges being
+        read, e.g. `pq.ParquetFile(aws.open(bucket, key))` reads the footer and the selected row groups only.
+
+        Byte ranges cannot be decompressed independently, so objects uploaded with a gzip or zstd
+        `ContentEncoding` raise a `ValueError` unless `raw` is True, which reads their compressed bytes;
+        download them with `download_file_s3` instead.
+        """
+        file = S3File(
+            self.s3_client, bucket, filename, block_size=block_size, cache_blocks=cache_blocks, read_ahead=read_ahead
+        )
+        if file.content_encoding in CODECS and not raw:
+            file.close()
+            raise ValueError(
+                f"s3://{bucket}/{filename} is stored with {file.content_encoding} encoding and cannot be read by range"
+            )
+        return file
+
+    def iter_objects(
+        self, bucket: str, prefix: str = "", parallel: bool = True, max_depth: int = 2, max_workers: int = 16
+    ) -> Iterator[dict]:
+        """
+        Lazily list the objects under `prefix`, fanning out over its "/" sub-prefixes in parallel.
+        Objects come in key order only with `parallel=False`.
+        """
+        lister = S3Lister(self.s3_client, max_workers=max_workers)
+        return lister.iter_objects(bucket, prefix, parallel=parallel, max_depth=max_depth)
+
+    async def delete_objects(self, bucket: str, keys: Iterable[str], max_workers: int = 4) -> DeleteReport:
+        """
+        Delete keys in batches of 1000 per request, e.g. to clear a prefix:
+        `await aws.delete_objects(bucket, (obj["Key"] for obj in aws.iter_objects(bucket, prefix)))`.
+        """
+        lister = S3Lister(self.s3_client)
+        return await self._run_transfer(
+            lambda cancel_event: lister.delete_objects(bucket, keys, max_workers=max_workers, cancel_event=cancel_event)
+        )
+
+    async def sync_prefix(
+        self,
+        bucket: str,
+        prefix: str,
+        local_dir: str | Path,
+        direction: str = "download",
+        max_workers: int = 8,
+    ) -> SyncReport:
+        """
+        Mirror an S3 prefix into a local directory (`direction="download"`) or a local directory into an
+        S3 prefix (`direction="upload"`), transferring only the objects that changed since the last sync.
+        """
+        sync = PrefixSync(self.s3_client, bucket, prefix, local_dir, max_workers=max_workers)
+        match direction:
+            case "download":
+                return await self._run_transfer(sync.download)
+            case "upload":
+                return await self._run_transfer(sync.upload)
+            case _:
+                raise ValueError(f"Unknown sync direction {direction!r}, expected 'download' or 'upload'")
+
+    async def _run_transfer(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking transfer `func(*args, cancel_event)` on the instance thread pool.
+
+        If the awaiting task is cancelled, `cancel_event` is set so the transfer callbacks raise
+        `TransferCancelledError`, and the concurrency slot is only released once the thread stopped.
+        """
+        cancel_event = Event()
+        async with self._semaphore:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self._scheduled, func, *args, cancel_event)
             )
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancel_event.set()
+                await asyncio.wait([future])
+                raise
+
+    def _scheduled(self, func: Callable[..., Any], *args: Any) -> Any:
+        # Waiting for a request token in the worker thread keeps the event loop free
+        if self.scheduler:
+            self.scheduler.acquire_request(self._scheduler_host, self.priority)
+        return func(*args)
+
+    @property
+    def _scheduler_host(self) -> str:
+        return f"s3.{self.region}.amazonaws.com"
+
+    def _throttle(self, bytes_transferred: int) -> None:
+        if self.scheduler:
+            self.scheduler.acquire_bytes(self._scheduler_host, bytes_transferred, self.priority)
+
+    def _transfer_chunk(self, bytes_transferred: int, cancel_event: Event) -> None:
+        self._raise_if_cancelled(cancel_event)
+        self._throttle(bytes_transferred)
+
+    @staticmethod
+    def _remove_partial(path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _raise_if_cancelled(self, cancel_event: Event) -> None:
+        if cancel_event.is_set() or self.done_event.is_set():
+            raise TransferCancelledError("Transfer cancelled")
+
+    @contextmanager
+    def _progress_session(self) -> Iterator[Progress]:
+        """Keep the progress display running while at least one concurrent transfer uses it."""
+        with self._progress_lock:
+            if self._progress_users == 0:
+                self.progress.start()
+            self._progress_users += 1
+        try:
+            yield self.progress
+        finally:
+            with self._progress_lock:
+                self._progress_users -= 1
+                if self._progress_users == 0:
+                    self.progress.stop()
+
+    def close(self) -> None:
+        """Release the transfer thread pool, waiting for running transfers."""
+        self._executor.shutdown(wait=True)
 
     def get_aws_secret(self, secret_name: str) -> dict:
         """Retrieve a secret from AWS Secrets Manager."""
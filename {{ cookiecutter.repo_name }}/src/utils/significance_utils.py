@@ -0,0 +1,165 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+
+class SignificanceUtils:
+    """
+    Confidence intervals and paired significance tests over per-query metric arrays, as returned by
+    `RetrievalEvaluator.per_query_metric` or `CompactRetrievalEvaluator.per_query_metrics`.
+
+    Resamples are drawn as NumPy matrices of `chunk_size` rows so memory stays bounded by
+    `max_workers * chunk_size * num_queries` whatever the number of resamples. Every chunk has its own
+    random generator spawned from `seed`, so results are reproducible for any number of workers, and
+    chunks run on a thread pool since NumPy releases the GIL while sampling, gathering and reducing.
+    """
+
+    @staticmethod
+    def bootstrap_ci(
+        scores: ArrayLike,
+        n_resamples: int = 10_000,
+        confidence: float = 0.95,
+        chunk_size: int = 64,
+        seed: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ) -> Dict[str, float]:
+        """
+        Percentile bootstrap confidence interval of the mean of a metric.
+
+        Args:
+            scores: Per-query scores of one system.
+            n_resamples: Number of bootstrap resamples.
+            confidence: Confidence level of the interval.
+            chunk_size: Number of resamples drawn per matrix.
+            seed: Seed of the random generators.
+            max_workers: Number of threads drawing chunks, defaults to the CPU count.
+
+        Returns:
+            Dict with the observed `mean` and the interval bounds `ci_low` / `ci_high`.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        means = SignificanceUtils._bootstrap_means(scores, n_resamples, chunk_size, seed, max_workers)
+        low, high = SignificanceUtils._percentiles(means, confidence)
+        return {"mean": float(scores.mean()), "ci_low": low, "ci_high": high}
+
+    @staticmethod
+    def paired_bootstrap(
+        scores_a: ArrayLike,
+        scores_b: ArrayLike,
+        n_resamples: int = 10_000,
+        confidence: float = 0.95,
+        chunk_size: int = 64,
+        seed: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ) -> Dict[str, float]:
+        """
+        Paired bootstrap of the mean difference `b - a` between two systems evaluated on the same queries.
+
+        The p-value is read off the bootstrap distribution shifted to a zero mean, i.e. under the null
+        hypothesis of no difference: the share of resampled differences at least as far from the observed
+        mean as the observed mean is from zero.
+
+        Args:
+            scores_a: Per-query scores of the baseline system.
+            scores_b: Per-query scores of the compared system, in the same query order.
+            n_resamples: Number of bootstrap resamples.
+            confidence: Confidence level of the interval.
+            chunk_size: Number of resamples drawn per matrix.
+            seed: Seed of the random generators.
+            max_workers: Number of threads drawing chunks, defaults to the CPU count.
+
+        Returns:
+            Dict with the observed `mean_diff`, its interval `ci_low` / `ci_high` and the two-sided `p_value`.
+        """
+        diff = SignificanceUtils._paired_diff(scores_a, scores_b)
+        means = SignificanceUtils._bootstrap_means(diff, n_resamples, chunk_size, seed, max_workers)
+        low, high = SignificanceUtils._percentiles(means, confidence)
+        observed = diff.mean()
+        p_value = np.mean(np.abs(means - observed) >= abs(observed) - 1e-12)
+        return {"mean_diff": float(observed), "ci_low": low, "ci_high": high, "p_value": float(p_value)}
+
+    @staticmethod
+    def randomization_test(
+        scores_a: ArrayLike,
+        scores_b: ArrayLike,
+        n_resamples: int = 10_000,
+        chunk_size: int = 64,
+        seed: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ) -> Dict[str, float]:
+        """
+        Paired (sign-flip) randomization test of the mean difference `b - a`.
+
+        Args:
+            scores_a: Per-query scores of the baseline system.
+            scores_b: Per-query scores of the compared system, in the same query order.
+            n_resamples: Number of random sign assignments.
+            chunk_size: Number of assignments drawn per matrix.
+            seed: Seed of the random generators.
+            max_workers: Number of threads drawing chunks, defaults to the CPU count.
+
+        Returns:
+            Dict with the observed `mean_diff` and the two-sided `p_value`.
+        """
+        diff = SignificanceUtils._paired_diff(scores_a, scores_b)
+        observed = abs(diff.mean())
+        total = diff.sum()
+
+        def permuted_means(rng: np.random.Generator, size: int) -> np.ndarray:
+            # A sign vector s = 2 * b - 1 built from random bits b gives s @ diff = 2 * (b @ diff) - sum(diff)
+            packed = rng.integers(0, 256, size=(size, (len(diff) + 7) // 8), dtype=np.uint8)
+            bits = np.unpackbits(packed, axis=1, count=len(diff))
+            return np.abs(2 * (bits @ diff) - total) / len(diff)
+
+        means = SignificanceUtils._resample(permuted_means, n_resamples, chunk_size, seed, max_workers)
+        extreme = int(np.count_nonzero(means >= observed - 1e-12))
+        return {"mean_diff": float(diff.mean()), "p_value": (extreme + 1) / (n_resamples + 1)}
+
+    @staticmethod
+    def _paired_diff(scores_a: ArrayLike, scores_b: ArrayLike) -> np.ndarray:
+        scores_a = np.asarray(scores_a, dtype=np.float64)
+        scores_b = np.asarray(scores_b, dtype=np.float64)
+        if scores_a.shape != scores_b.shape or scores_a.ndim != 1:
+            raise ValueError("Paired tests need two 1-D score arrays over the same queries")
+        if len(scores_a) == 0:
+            raise ValueError("Paired tests need at least one query")
+        return scores_b - scores_a
+
+    @staticmethod
+    def _bootstrap_means(
+        scores: np.ndarray, n_resamples: int, chunk_size: int, seed: Optional[int], max_workers: Optional[int]
+    ) -> np.ndarray:
+        index_dtype = np.int32 if len(scores) < np.iinfo(np.int32).max else np.int64
+
+        def resampled_means(rng: np.random.Generator, size: int) -> np.ndarray:
+            indices = rng.integers(0, len(scores), size=(size, len(scores)), dtype=index_dtype)
+            return np.take(scores, indices).sum(axis=1) / len(scores)
+
+        return SignificanceUtils._resample(resampled_means, n_resamples, chunk_size, seed, max_workers)
+
+    @staticmethod
+    def _resample(
+        draw: Callable[[np.random.Generator, int], np.ndarray],
+        n_resamples: int,
+        chunk_size: int,
+        seed: Optional[int],
+        max_workers: Optional[int],
+    ) -> np.ndarray:
+        """Run `draw(rng, size)` over chunks of at most `chunk_size` resamples and concatenate the results."""
+        sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+            chunks: List[np.ndarray] = list(
+                pool.map(lambda job: draw(np.random.default_rng(job[0]), job[1]), zip(seeds, sizes))
+            )
+        return np.concatenate(chunks) if chunks else np.zeros(0)
+
+    @staticmethod
+    def _percentiles(means: np.ndarray, confidence: float) -> tuple:
+        alpha = (1 - confidence) / 2
+        low, high = np.quantile(means, [alpha, 1 - alpha])
+        return float(low), float(high)
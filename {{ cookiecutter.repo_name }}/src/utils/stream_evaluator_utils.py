@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from src.utils.evaluator_utils import MetricSums
+from src.utils.file_utils import FileUtils
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingRetrievalEvaluator:
+    """
+    Evaluates retrieval runs stored as JSONL files without loading them in memory.
+
+    Each line of the run file holds one query, e.g. `{"query_id": "q1", "retrieved": ["d1", "d2"]}`,
+    and each line of the qrels file its judgments, e.g. `{"query_id": "q1", "relevant": ["d2"]}`.
+    Only queries present in both files are evaluated. A query appearing on several run lines is evaluated
+    once, on its retrieved documents concatenated in file order with repeated documents dropped; its
+    judgments are merged the same way.
+
+    Evaluation runs in two parallel passes over a process pool:
+
+    1. both files are split into newline-aligned byte ranges and every range is parsed and
+       partitioned into shard files by a stable hash of the query ID;
+    2. every shard loads its (small) qrels partition and the run rows of the judged queries, merges
+       the rows per query and returns `MetricSums` that are merged in the parent process.
+
+    Memory per worker is bounded by the size of one shard, which is controlled by `num_shards`.
+    """
+
+    def __init__(
+        self,
+        k: int = 10,
+        max_workers: Optional[int] = None,
+        num_shards: Optional[int] = None,
+        query_field: str = "query_id",
+        retrieved_field: str = "retrieved",
+        relevant_field: str = "relevant",
+    ):
+        """
+        Args:
+            k (int): Rank position used for the NDCG, precision and recall metrics.
+            max_workers (Optional[int]): Number of worker processes, defaults to the CPU count.
+            num_shards (Optional[int]): Number of query partitions, defaults to 4 per worker.
+            query_field (str): JSON field holding the query ID in both files.
+            retrieved_field (str): JSON field holding the retrieved document IDs in the run file.
+            relevant_field (str): JSON field holding the relevant document IDs in the qrels file.
+        """
+        self.k = k
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.num_shards = num_shards or self.max_workers * 4
+        self.query_field = query_field
+        self.retrieved_field = retrieved_field
+        self.relevant_field = relevant_field
+
+    def evaluate(self, run_path: Union[str, Path], qrels_path: Union[str, Path]) -> Dict[str, float]:
+        """
+        Evaluate a run file against a qrels file.
+
+        Args:
+            run_path (Union[str, Path]): JSONL file with the retrieved documents per query.
+            qrels_path (Union[str, Path]): JSONL file with the relevant documents per query.
+
+        Returns:
+            Dict[str, float]: Mean metric values and the number of evaluated queries under `num_queries`.
+        """
+        sums = self.evaluate_sums(run_path, qrels_path)
+        return {**sums.means(), "num_queries": sums.count}
+
+    def evaluate_sums(self, run_path: Union[str, Path], qrels_path: Union[str, Path]) -> MetricSums:
+        """
+        Same as `evaluate` but returns the mergeable partial sums, e.g. to combine several run files.
+        """
+        with tempfile.TemporaryDirectory(prefix="stream-eval-") as tmp_dir, ProcessPoolExecutor(
+            max_workers=self.max_workers
+        ) as pool:
+            partition_jobs = []
+            for kind, path, field in (
+                ("run", run_path, self.retrieved_field),
+                ("qrels", qrels_path, self.relevant_field),
+            ):
+                for chunk_id, (start, end) in enumerate(FileUtils.chunk_offsets(path, self.max_workers)):
+                    partition_jobs.append(
+                        pool.submit(
+                            _partition_chunk,
+                            str(path), start, end, kind, chunk_id, field,
+                            self.query_field, self.num_shards, tmp_dir,
+                        )
+                    )
+            for job in partition_jobs:
+                job.result()
+
+            totals = MetricSums(self.k)
+            shard_jobs = [pool.submit(_evaluate_shard, tmp_dir, shard, self.k) for shard in range(self.num_shards)]
+            for job in shard_jobs:
+                totals.merge(job.result())
+
+        logger.info(f"Evaluated {totals.count} queries from {run_path}")
+        return totals
+
+
+def _shard_of(query_id: str, num_shards: int) -> int:
+    """Stable across processes, unlike the salted built-in `hash`."""
+    return zlib.crc32(query_id.encode("utf-8")) % num_shards
+
+
+def _partition_chunk(
+    path: str,
+    start: int,
+    end: int,
+    kind: str,
+    chunk_id: int,
+    field: str,
+    query_field: str,
+    num_shards: int,
+    tmp_dir: str,
+) -> None:
+    """Parse one byte range of a JSONL file and append compact `[query_id, ids]` lines to shard files."""
+    shard_files = {}
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            position = start
+            while position < end:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                query_id = str(record[query_field])
+                shard = _shard_of(query_id, num_shards)
+                out = shard_files.get(shard)
+                if out is None:
+                    out = shard_files[shard] = open(os.path.join(tmp_dir, f"{kind}-{shard}-{chunk_id}.jsonl"), "w")
+                out.write(json.dumps([query_id, record.get(field) or []]))
+                out.write("\n")
+    finally:
+        for out in shard_files.values():
+            out.close()
+
+
+def _shard_files(tmp_dir: str, kind: str, shard: int) -> List[Path]:
+    """Partition files of one shard in chunk order, so rows of a query repeated on several lines keep their order."""
+    return sorted(Path(tmp_dir).glob(f"{kind}-{shard}-*.jsonl"), key=lambda path: int(path.stem.split("-")[-1]))
+
+
+def _evaluate_shard(tmp_dir: str, shard: int, k: int) -> MetricSums:
+    """Join the run and qrels partitions of one shard and compute their metric sums."""
+    # Judgments repeated across lines count once, as in the in-memory evaluator given a list per query
+    judged: Dict[str, Dict[str, None]] = {}
+    for path in _shard_files(tmp_dir, "qrels", shard):
+        with open(path, "r") as f:
+            for line in f:
+                query_id, relevant = json.loads(line)
+                judged.setdefault(query_id, dict()).update(dict.fromkeys(relevant))
+    qrels = {query_id: list(relevant) for query_id, relevant in judged.items()}
+
+    runs: Dict[str, Dict[str, None]] = {}
+    for path in _shard_files(tmp_dir, "run", shard):
+        with open(path, "r") as f:
+            for line in f:
+                query_id, retrieved = json.loads(line)
+                if query_id in qrels:
+                    # An insertion-ordered dict keeps the first rank of documents repeated across rows
+                    runs.setdefault(query_id, dict()).update(dict.fromkeys(retrieved))
+
+    sums = MetricSums(k)
+    for query_id, retrieved in runs.items():
+        sums.add(list(retrieved), qrels[query_id])
+    return sums
@@ -0,0 +1,188 @@
+import itertools
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from threading import Condition
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`, allowing a single request to go into debt."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens can be taken, amounts above the capacity only need a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing / self.rate, 0.0)
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= amount
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _Waiter:
+    def __init__(self, priority: int, ticket: int, host_buckets: List[TokenBucket], host: str, amount: float):
+        self.priority = priority
+        self.ticket = ticket
+        self.host_buckets = host_buckets
+        self.host = host
+        self.amount = amount
+
+
+class TransferScheduler:
+    """
+    Shares bandwidth and request rate between every transfer of the process that opts in.
+
+    Limits are token buckets in bytes per second and requests per second, both globally and per host.
+    A transfer calls `acquire_request` before every request and `acquire_bytes` after every chunk, which
+    block until the buckets allow it. Waiters are served by priority class ("high", "normal", "low"): a
+    lower class only goes ahead of a waiting higher class when that one is held back by its own host limit,
+    so a slow host never stalls the others. Request and byte waiters queue separately, since they take
+    tokens from different buckets. `penalize` pauses a host, e.g. for the Retry-After of a 429.
+
+    The buckets live in memory, so jobs share them when they run in the same process (threads or asyncio
+    tasks). Separate processes each need their own share of the limits.
+    """
+
+    def __init__(
+        self,
+        bytes_per_second: Optional[float] = None,
+        requests_per_second: Optional[float] = None,
+        host_bytes_per_second: Optional[float] = None,
+        host_requests_per_second: Optional[float] = None,
+        burst_seconds: float = 1.0,
+    ):
+        """
+        Args:
+            bytes_per_second: Global bandwidth limit, None for unlimited.
+            requests_per_second: Global request rate limit, None for unlimited.
+            host_bytes_per_second: Bandwidth limit of every host, None for unlimited.
+            host_requests_per_second: Request rate limit of every host, None for unlimited.
+            burst_seconds: Bucket capacity in seconds of its rate, the largest burst allowed after idling.
+        """
+        self.bytes_per_second = bytes_per_second
+        self.requests_per_second = requests_per_second
+        self.host_bytes_per_second = host_bytes_per_second
+        self.host_requests_per_second = host_requests_per_second
+        self.burst_seconds = burst_seconds
+        self._global = {
+            "bytes": self._bucket(bytes_per_second),
+            "requests": self._bucket(requests_per_second),
+        }
+        self._hosts: Dict[str, Dict[str, Optional[TokenBucket]]] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._waiters: Dict[str, List[_Waiter]] = {"bytes": [], "requests": []}
+        self._tickets = itertools.count()
+        self._condition = Condition()
+
+    def acquire_request(self, host: str, priority: str = "normal") -> None:
+        """Block until `host` may receive one more request."""
+        self._acquire("requests", host, 1, priority)
+
+    def acquire_bytes(self, host: str, amount: int, priority: str = "normal") -> None:
+        """Block until `amount` bytes exchanged with `host` fit in the bandwidth limits."""
+        if amount > 0:
+            self._acquire("bytes", host, amount, priority)
+
+    def penalize(self, host: str, retry_after: float | str | None, default: float = 1.0) -> float:
+        """
+        Pause every request to `host`, e.g. after a 429 or 503 response.
+
+        Args:
+            host: Host name, e.g. "example.com".
+            retry_after: Retry-After header value, in seconds or as an HTTP date, or None to use `default`.
+            default: Pause in seconds when `retry_after` is missing or unreadable.
+
+        Returns:
+            The pause in seconds.
+        """
+        delay = parse_retry_after(retry_after, default)
+        with self._condition:
+            now = time.monotonic()
+            # Drop the pauses that are over, of hosts that may never be contacted again
+            for paused_host, deadline in list(self._paused_until.items()):
+                if deadline <= now:
+                    del self._paused_until[paused_host]
+            self._paused_until[host] = max(self._paused_until.get(host, 0.0), now + delay)
+            self._condition.notify_all()
+        logger.warning(f"Pausing requests to {host} for {delay:.1f}s")
+        return delay
+
+    def _acquire(self, kind: str, host: str, amount: float, priority: str) -> None:
+        with self._condition:
+            self._expire_pause(host, time.monotonic())
+            host_buckets = [bucket for bucket in [self._host_buckets(host)[kind]] if bucket]
+            global_buckets = [bucket for bucket in [self._global[kind]] if bucket]
+            if not host_buckets and not global_buckets and host not in self._paused_until:
+                return
+            waiter = _Waiter(PRIORITIES[priority], next(self._tickets), host_buckets, host, amount)
+            waiters = self._waiters[kind]
+            waiters.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    host_wait = self._host_wait(waiter, now)
+                    global_wait = max((bucket.wait_time(amount, now) for bucket in global_buckets), default=0.0)
+                    blocked_by_priority = any(
+                        other.priority < waiter.priority and self._host_wait(other, now) <= 0
+                        for other in waiters
+                    )
+                    if host_wait <= 0 and global_wait <= 0 and not blocked_by_priority:
+                        for bucket in host_buckets + global_buckets:
+                            bucket.consume(amount, now)
+                        self._expire_pause(host, now)
+                        return
+                    # Woken early by every release, penalty or new waiter, otherwise when tokens are expected
+                    self._condition.wait(max(host_wait, global_wait, 0.001) if not blocked_by_priority else 0.05)
+            finally:
+                waiters.remove(waiter)
+                self._condition.notify_all()
+
+    def _expire_pause(self, host: str, now: float) -> None:
+        # An expired pause would keep every acquisition for the host off the unlimited fast path
+        if self._paused_until.get(host, float("inf")) <= now:
+            del self._paused_until[host]
+
+    def _host_wait(self, waiter: _Waiter, now: float) -> float:
+        paused = self._paused_until.get(waiter.host, 0.0) - now
+        bucket_wait = max((bucket.wait_time(waiter.amount, now) for bucket in waiter.host_buckets), default=0.0)
+        return max(paused, bucket_wait)
+
+    def _host_buckets(self, host: str) -> Dict[str, Optional[TokenBucket]]:
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "bytes": self._bucket(self.host_bytes_per_second),
+                "requests": self._bucket(self.host_requests_per_second),
+            }
+        return self._hosts[host]
+
+    def _bucket(self, rate: Optional[float]) -> Optional[TokenBucket]:
+        return TokenBucket(rate, rate * self.burst_seconds) if rate else None
+
+
+def parse_retry_after(value: float | str | None, default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header, given in seconds or as an HTTP date."""
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(parsedate_to_datetime(str(value)).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,49 @@
+import os
+import random
+import string
+from typing import Dict, List, Tuple
+
+import pytest
+
+# Large inputs only run with `make benchmark_full` (BENCHMARK_FULL=1) to keep the default suite fast
+full_only = pytest.mark.skipif(os.environ.get("BENCHMARK_FULL") != "1", reason="set BENCHMARK_FULL=1 to run")
+
+
+def make_runs(
+    num_queries: int, num_retrieved: int = 100, num_relevant: int = 5, num_docs: int = 1_000_000, seed: int = 0
+) -> Tuple[List[List[str]], List[List[str]]]:
+    """Random retrieval runs and judgments, with relevant documents mostly ranked in the top 20."""
+    rng = random.Random(seed)
+    retrievals, relevant_docs = [], []
+    for _ in range(num_queries):
+        retrieved = [f"doc-{rng.randrange(num_docs)}" for _ in range(num_retrieved)]
+        relevant = rng.sample(retrieved[:20], num_relevant // 2) + [
+            f"doc-{rng.randrange(num_docs)}" for _ in range(num_relevant - num_relevant // 2)
+        ]
+        retrievals.append(retrieved)
+        relevant_docs.append(relevant)
+    return retrievals, relevant_docs
+
+
+def make_nested_payload(depth: int = 4, width: int = 10, seed: int = 0) -> Dict:
+    """Nested dictionary of `width ** depth` leaves mixing strings, numbers and lists."""
+    rng = random.Random(seed)
+
+    def build(level: int) -> Dict:
+        if level == depth:
+            return {
+                "text": "".join(rng.choices(string.printable, k=32)),
+                "score": rng.random(),
+                "tags": [rng.randrange(100) for _ in range(3)],
+            }
+        return {f"key_{i}": build(level + 1) for i in range(width)}
+
+    return build(1)
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    """Random text with roughly 1% control characters."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + " " * 10
+    chars = [rng.choice(alphabet) if rng.random() > 0.01 else chr(rng.randrange(32)) for _ in range(size)]
+    return "".join(chars)
@@ -0,0 +1,43 @@
+import pytest
+
+from src.utils.file_utils import FileUtils
+
+pa = pytest.importorskip("pyarrow")
+pc = pytest.importorskip("pyarrow.compute")
+
+from src.utils.dataset_utils import DatasetUtils  # noqa: E402
+
+NUM_RECORDS = 100_000
+
+
+@pytest.fixture(scope="module")
+def records():
+    return [
+        {"query_id": f"q{i}", "split": "test" if i % 10 == 0 else "train", "score": i / NUM_RECORDS}
+        for i in range(NUM_RECORDS)
+    ]
+
+
+@pytest.fixture(scope="module")
+def files(records, tmp_path_factory):
+    root = tmp_path_factory.mktemp("dataset")
+    table = DatasetUtils.from_records(records)
+    FileUtils.write_jsonl(records, root / "records.jsonl")
+    DatasetUtils.write_table(table, root / "records.parquet", row_group_size=10_000)
+    DatasetUtils.write_table(table, root / "records.arrow", row_group_size=10_000)
+    return root
+
+
+def test_read_jsonl_filtered(benchmark, files):
+    def read():
+        records = FileUtils.iter_jsonl(files / "records.jsonl")
+        return [record["query_id"] for record in records if record["score"] >= 0.9]
+
+    assert len(benchmark(read)) == NUM_RECORDS // 10
+
+
+@pytest.mark.parametrize("suffix", ["parquet", "arrow"])
+def test_read_table_filtered(benchmark, files, suffix):
+    path = files / f"records.{suffix}"
+    table = benchmark(DatasetUtils.read_table, path, columns=["query_id"], filters=pc.field("score") >= 0.9)
+    assert table.num_rows == NUM_RECORDS // 10
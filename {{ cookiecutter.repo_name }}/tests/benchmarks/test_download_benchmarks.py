@@ -0,0 +1,59 @@
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from rich.console import Console
+from rich.progress import Progress
+
+from src.utils.async_download_utils import AsyncDownloadUtils
+from src.utils.download_utils import DownloadUtils
+
+NUM_FILES = 200
+FILE_SIZE = 16 * 1024
+
+
+class KeepAliveHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are sent separately, Nagle's algorithm would delay every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def urls(tmp_path_factory):
+    # A local server removes network latency, so the gap between engines is per-request overhead only
+    root = tmp_path_factory.mktemp("http")
+    for i in range(NUM_FILES):
+        (root / f"file-{i}.bin").write_bytes(os.urandom(FILE_SIZE))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(KeepAliveHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield [f"http://127.0.0.1:{server.server_port}/file-{i}.bin" for i in range(NUM_FILES)]
+    server.shutdown()
+    server.server_close()
+
+
+def quiet(downloader):
+    # Rendering one bar per file costs more than the transfers themselves, keep it out of the measurement
+    downloader.progress = Progress(console=Console(quiet=True), disable=True)
+    return downloader
+
+
+def test_download_urls_threads(benchmark, urls, tmp_path):
+    downloader = quiet(DownloadUtils(max_workers=8))
+    benchmark.extra_info["files"] = NUM_FILES
+    benchmark(downloader.download_urls, urls, str(tmp_path))
+    assert len(os.listdir(tmp_path)) == NUM_FILES
+
+
+def test_download_urls_async(benchmark, urls, tmp_path):
+    pytest.importorskip("aiohttp")
+    downloader = quiet(AsyncDownloadUtils(max_workers=8, max_per_host=8))
+    benchmark.extra_info["files"] = NUM_FILES
+    benchmark(downloader.download_urls, urls, str(tmp_path))
+    assert len(os.listdir(tmp_path)) == NUM_FILES
+    assert all(os.path.getsize(tmp_path / url.split("/")[-1]) == FILE_SIZE for url in urls)
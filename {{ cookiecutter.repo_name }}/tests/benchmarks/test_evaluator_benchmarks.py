@@ -0,0 +1,44 @@
+import pytest
+
+from src.utils.compact_evaluator_utils import CompactRetrievalEvaluator, CompactRuns, DocumentIdInterner
+from src.utils.evaluator_utils import RetrievalEvaluator
+from tests.benchmarks.helpers import full_only, make_runs
+
+SIZES = [1_000, pytest.param(100_000, marks=full_only), pytest.param(1_000_000, marks=full_only)]
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size}q")
+def runs(request):
+    return make_runs(request.param)
+
+
+@pytest.fixture(scope="module")
+def compact_evaluator(runs):
+    retrievals, relevant_docs = runs
+    interner = DocumentIdInterner()
+    return CompactRetrievalEvaluator(
+        CompactRuns.from_lists(retrievals, interner), CompactRuns.from_lists(relevant_docs, interner)
+    )
+
+
+def test_mean_average_precision(benchmark, runs):
+    retrievals, relevant_docs = runs
+    result = benchmark(RetrievalEvaluator.mean_average_precision, retrievals, relevant_docs)
+    assert 0.0 < result <= 1.0
+
+
+def test_mean_reciprocal_rank(benchmark, runs):
+    retrievals, relevant_docs = runs
+    result = benchmark(RetrievalEvaluator.mean_reciprocal_rank, retrievals, relevant_docs)
+    assert 0.0 < result <= 1.0
+
+
+def test_ndcg(benchmark, runs):
+    retrievals, relevant_docs = runs
+    result = benchmark(RetrievalEvaluator.per_query_metric, retrievals, relevant_docs, "ndcg", k=10)
+    assert len(result) == len(retrievals)
+
+
+def test_compact_mean_metrics(benchmark, runs, compact_evaluator):
+    result = benchmark(compact_evaluator.mean_metrics, 10)
+    assert result["average_precision"] == pytest.approx(RetrievalEvaluator.mean_average_precision(*runs))
@@ -0,0 +1,161 @@
+import json
+import os
+
+import pytest
+
+from src.utils.file_utils import FileUtils
+from src.utils.file_writer_utils import BackgroundWriter
+from tests.benchmarks.helpers import make_nested_payload
+
+NUM_RECORDS = 20_000
+
+
+@pytest.fixture(scope="module")
+def payload():
+    return make_nested_payload(depth=4, width=10)
+
+
+@pytest.fixture(scope="module")
+def records():
+    return [
+        {"query_id": f"q{i}", "retrieved": [f"doc-{j}" for j in range(20)], "score": i / 7} for i in range(NUM_RECORDS)
+    ]
+
+
+def report_throughput(benchmark, path):
+    # Saved with the timings in the benchmark JSON (`--benchmark-autosave` or `--benchmark-json`)
+    if benchmark.stats is None:  # --benchmark-disable runs the function once without timing it
+        return
+    benchmark.extra_info["MB/s"] = round(os.path.getsize(path) / benchmark.stats.stats.mean / 1e6, 1)
+
+
+def legacy_write_json(data, path):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
+
+
+def legacy_read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def legacy_write_jsonl(records, path):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def legacy_read_jsonl(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_write_json_legacy(benchmark, payload, tmp_path):
+    path = tmp_path / "payload.json"
+    benchmark(legacy_write_json, payload, path)
+    report_throughput(benchmark, path)
+
+
+def test_write_json(benchmark, payload, tmp_path):
+    path = tmp_path / "payload.json"
+    benchmark(FileUtils.write_json, payload, path, indent=None)
+    report_throughput(benchmark, path)
+    assert FileUtils.read_json(path) == payload
+
+
+def test_read_json_legacy(benchmark, payload, tmp_path):
+    path = tmp_path / "payload.json"
+    legacy_write_json(payload, path)
+    assert benchmark(legacy_read_json, path) == payload
+    report_throughput(benchmark, path)
+
+
+def test_read_json(benchmark, payload, tmp_path):
+    path = tmp_path / "payload.json"
+    legacy_write_json(payload, path)
+    assert benchmark(FileUtils.read_json, path) == payload
+    report_throughput(benchmark, path)
+
+
+def test_write_jsonl_legacy(benchmark, records, tmp_path):
+    path = tmp_path / "records.jsonl"
+    benchmark(legacy_write_jsonl, records, path)
+    report_throughput(benchmark, path)
+
+
+def test_write_jsonl(benchmark, records, tmp_path):
+    path = tmp_path / "records.jsonl"
+    assert benchmark(FileUtils.write_jsonl, records, path) == NUM_RECORDS
+    report_throughput(benchmark, path)
+
+
+def test_read_jsonl_legacy(benchmark, records, tmp_path):
+    path = tmp_path / "records.jsonl"
+    legacy_write_jsonl(records, path)
+    assert len(benchmark(legacy_read_jsonl, path)) == NUM_RECORDS
+    report_throughput(benchmark, path)
+
+
+def test_read_jsonl(benchmark, records, tmp_path):
+    path = tmp_path / "records.jsonl"
+    legacy_write_jsonl(records, path)
+    assert benchmark(lambda: list(FileUtils.iter_jsonl(path))) == records
+    report_throughput(benchmark, path)
+
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    root = tmp_path_factory.mktemp("tree")
+    for i in range(50):
+        for j in range(20):
+            directory = root / f"shard-{i}" / ("cache" if j == 0 else f"part-{j}")
+            directory.mkdir(parents=True)
+            for k in range(10):
+                (directory / f"file-{k}.jsonl").touch()
+    return root
+
+
+def legacy_walk_files(path, exclude_patterns):
+    return [
+        os.path.join(root, name)
+        for root, _, files in os.walk(path)
+        for name in files
+        if not any(pattern in os.path.join(root, name) for pattern in exclude_patterns)
+    ]
+
+
+def test_walk_files_legacy(benchmark, tree):
+    assert len(benchmark(legacy_walk_files, tree, ["cache"])) == 50 * 19 * 10
+
+
+def test_walk_files(benchmark, tree):
+    assert len(benchmark(lambda: list(FileUtils.walk(tree, exclude=["cache"])))) == 50 * 19 * 10
+
+
+def test_walk_files_parallel(benchmark, tree):
+    assert len(benchmark(lambda: list(FileUtils.walk(tree, exclude=["cache"], max_workers=8)))) == 50 * 19 * 10
+
+
+NUM_FILES = 2000
+
+
+def test_write_text_files(benchmark, tmp_path):
+    def write():
+        for i in range(NUM_FILES):
+            FileUtils.write_text(f"document {i}", tmp_path / f"file-{i}.txt")
+
+    benchmark(write)
+    assert len(os.listdir(tmp_path)) == NUM_FILES
+
+
+def test_background_writer_files(benchmark, tmp_path):
+    writer = BackgroundWriter(max_workers=4, fsync="never")
+
+    def write():
+        for i in range(NUM_FILES):
+            writer.write_text(f"document {i}", tmp_path / f"file-{i}.txt")
+        return writer.flush()
+
+    benchmark(write)
+    writer.close()
+    assert len(os.listdir(tmp_path)) == NUM_FILES
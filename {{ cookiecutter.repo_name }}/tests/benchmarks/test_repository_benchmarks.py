@@ -0,0 +1,77 @@
+import itertools
+import os
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from src.repository.base import BaseRepository
+
+Base = declarative_base()
+
+
+class ItemTable(Base):
+    __tablename__ = "benchmark_items"
+
+    id = sa.Column(sa.String, primary_key=True)
+    name = sa.Column(sa.String, nullable=False)
+    score = sa.Column(sa.Float, nullable=False)
+
+
+class ItemSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    name: str
+    score: float
+
+
+@pytest.fixture(scope="module")
+def repository():
+    # SQLite stands in for Postgres so the suite runs offline, BENCHMARK_DATABASE_URI can point to a real server
+    engine = sa.create_engine(os.environ.get("BENCHMARK_DATABASE_URI", "sqlite://"))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield BaseRepository(session, ItemSchema, ItemTable)
+    session.close()
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def seeded_ids(repository):
+    ids = [str(uuid.uuid4()) for _ in range(1_000)]
+    for _id in ids:
+        repository.create(ItemSchema(id=_id, name="seed", score=0.0))
+    return ids
+
+
+def test_create(benchmark, repository):
+    counter = itertools.count()
+    result = benchmark(lambda: repository.create(ItemSchema(id=f"create-{next(counter)}", name="item", score=1.0)))
+    assert result is not None
+
+
+def test_read(benchmark, repository, seeded_ids):
+    ids = itertools.cycle(seeded_ids)
+    result = benchmark(lambda: repository.read(next(ids)))
+    assert result is not None
+
+
+def test_update(benchmark, repository, seeded_ids):
+    ids = itertools.cycle(seeded_ids)
+    result = benchmark(lambda: repository.update(next(ids), {"score": 2.0}, fields=["score"]))
+    assert result.score == 2.0
+
+
+def test_delete(benchmark, repository):
+    counter = itertools.count()
+
+    def create_and_delete():
+        _id = f"delete-{next(counter)}"
+        repository.create(ItemSchema(id=_id, name="item", score=1.0))
+        return repository.delete(_id)
+
+    assert benchmark(create_and_delete) == 1
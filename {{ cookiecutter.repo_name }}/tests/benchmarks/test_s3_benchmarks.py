@@ -0,0 +1,66 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from src.utils.s3_cache_utils import S3ObjectCache  # noqa: E402
+from src.utils.s3_transfer_utils import MiB  # noqa: E402
+from src.utils.s3_utils import AWSUtils  # noqa: E402
+
+BUCKET = "benchmark-bucket"
+OBJECT_SIZE = 64 * MiB
+
+
+@pytest.fixture(scope="module")
+def aws(tmp_path_factory):
+    # moto serves S3 in-process, so these numbers compare client-side overhead rather than network throughput
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    with moto.mock_aws():
+        aws = AWSUtils()
+        aws.s3_client.create_bucket(Bucket=BUCKET)
+        source = tmp_path_factory.mktemp("s3") / "object.bin"
+        source.write_bytes(os.urandom(OBJECT_SIZE))
+        asyncio.run(aws.upload_file_s3(BUCKET, "object.bin", source))
+        yield aws
+        aws.close()
+
+
+def test_download_file_s3(benchmark, aws, tmp_path):
+    benchmark.extra_info["bytes"] = OBJECT_SIZE
+    benchmark(lambda: asyncio.run(aws.download_file_s3(BUCKET, "object.bin", str(tmp_path))))
+    assert (tmp_path / "object.bin").stat().st_size == OBJECT_SIZE
+
+
+@pytest.mark.parametrize("part_size", [8 * MiB, 32 * MiB], ids=["8MiB", "32MiB"])
+def test_download_file_s3_ranged(benchmark, aws, tmp_path, part_size):
+    benchmark.extra_info["bytes"] = OBJECT_SIZE
+    benchmark(
+        lambda: asyncio.run(aws.download_file_s3_ranged(BUCKET, "object.bin", str(tmp_path), part_size=part_size))
+    )
+    assert (tmp_path / "object.bin").stat().st_size == OBJECT_SIZE
+
+
+def test_download_file_s3_cache_hit(benchmark, aws, tmp_path):
+    cache = S3ObjectCache(tmp_path / "cache", ttl_seconds=0)
+    cache.fetch(aws.s3_client, BUCKET, "object.bin", tmp_path / "warmup.bin")
+    benchmark.extra_info["bytes"] = OBJECT_SIZE
+    hit = benchmark(lambda: cache.fetch(aws.s3_client, BUCKET, "object.bin", tmp_path / "object.bin"))
+    assert hit and (tmp_path / "object.bin").stat().st_size == OBJECT_SIZE
+
+
+def test_open_random_reads(benchmark, aws):
+    # 256 reads of 64 KiB at random offsets, only the touched 1 MiB blocks are fetched
+    offsets = random.Random(0).sample(range(OBJECT_SIZE - 64 * 1024), 256)
+
+    def read_slices():
+        with aws.open(BUCKET, "object.bin") as f:
+            for offset in offsets:
+                f.seek(offset)
+                f.read(64 * 1024)
+            return f.bytes_fetched
+
+    benchmark.extra_info["bytes_fetched"] = benchmark(read_slices)
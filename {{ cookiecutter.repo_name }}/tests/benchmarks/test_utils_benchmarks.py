@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from src.utils.dict_utils import DictionaryUtils
+from src.utils.text_utils import TextUtils
+from tests.benchmarks.helpers import make_nested_payload, make_text
+
+
+@pytest.fixture(scope="module")
+def payload():
+    return make_nested_payload(depth=4, width=10)
+
+
+@pytest.fixture(scope="module")
+def text():
+    return make_text(1_000_000)
+
+
+def test_flatten_dict(benchmark, payload):
+    result = benchmark(DictionaryUtils.flatten_dict, payload)
+    assert len(result) == 10 ** 3 * 3
+
+
+def test_sanitize_json_dict(benchmark, payload):
+    result = benchmark(DictionaryUtils.sanitize_json, payload)
+    assert result.keys() == payload.keys()
+
+
+def test_sanitize_json_string(benchmark, payload):
+    serialized = json.dumps(payload)
+    result = benchmark(DictionaryUtils.sanitize_json, serialized)
+    assert result.keys() == payload.keys()
+
+
+def test_text_sanitize(benchmark, text):
+    result = benchmark(TextUtils.sanitize, text)
+    assert len(result) < len(text)
+
+
+def test_fill_template(benchmark, payload):
+    template = " ".join(f"<field_{i}>" for i in range(200)) * 10
+    replacements = [
+        (f"<field_{i}>", payload["key_1"] if i % 10 == 0 else f"value {i}" if i % 3 else None)
+        for i in range(200)
+    ]
+    result = benchmark(TextUtils.fill_template, template, replacements)
+    assert "<field_" not in result
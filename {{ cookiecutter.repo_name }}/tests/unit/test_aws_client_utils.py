@@ -0,0 +1,25 @@
+import pytest
+
+from src.utils.aws_client_utils import AWSClientCache
+
+
+@pytest.fixture(autouse=True)
+def clients(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    AWSClientCache.clear()
+    yield
+    AWSClientCache.clear()
+
+
+def test_get_client_is_shared():
+    assert AWSClientCache.get_client("s3") is AWSClientCache.get_client("s3")
+    assert AWSClientCache.get_client("s3") is not AWSClientCache.get_client("s3", region="eu-west-1")
+
+
+def test_get_client_with_nested_config():
+    client = AWSClientCache.get_client("s3", retries={"mode": "adaptive", "max_attempts": 5})
+
+    assert AWSClientCache.get_client("s3", retries={"max_attempts": 5, "mode": "adaptive"}) is client
+    assert AWSClientCache.get_client("s3", retries={"mode": "standard", "max_attempts": 5}) is not client
+    assert client.meta.config.retries["mode"] == "adaptive"
@@ -0,0 +1,63 @@
+import pytest
+
+from src.utils.compact_evaluator_utils import CompactRetrievalEvaluator, CompactRuns, DocumentIdInterner
+from src.utils.evaluator_utils import RetrievalEvaluator
+
+RETRIEVALS = [
+    ["d1", "d2", "d3", "d4", "d5"],
+    ["d6", "d7"],
+    [],
+    ["d8", "d9", "d10"],
+    ["d1", "d11", "d12", "d13"],
+]
+RELEVANT = [
+    ["d2", "d5", "d20"],
+    ["d6"],
+    ["d1"],
+    [],
+    ["d13", "d1", "d11"],
+]
+K = 3
+
+
+def baseline_metrics(retrieved, relevant):
+    evaluator = RetrievalEvaluator(retrieved, relevant)
+    return {
+        "average_precision": evaluator.average_precision(),
+        "reciprocal_rank": evaluator.reciprocal_rank(),
+        "ndcg": float(evaluator.ndcg(K)),
+        "precision": evaluator.precision(),
+        "recall": evaluator.recall(),
+        "precision_at_k": evaluator.precision_at_k(K),
+        "recall_at_k": evaluator.recall_at_k(K),
+    }
+
+
+@pytest.mark.parametrize("block_size", [2, 100])
+def test_matches_baseline_evaluator(block_size):
+    interner = DocumentIdInterner()
+    evaluator = CompactRetrievalEvaluator(
+        CompactRuns.from_lists(RETRIEVALS, interner), CompactRuns.from_lists(RELEVANT, interner), block_size
+    )
+
+    metrics = evaluator.per_query_metrics(K)
+
+    for i, (retrieved, relevant) in enumerate(zip(RETRIEVALS, RELEVANT)):
+        assert {name: values[i] for name, values in metrics.items()} == pytest.approx(
+            baseline_metrics(retrieved, relevant)
+        )
+    assert evaluator.mean_average_precision() == pytest.approx(
+        RetrievalEvaluator.mean_average_precision(RETRIEVALS, RELEVANT)
+    )
+    assert evaluator.mean_reciprocal_rank() == pytest.approx(
+        RetrievalEvaluator.mean_reciprocal_rank(RETRIEVALS, RELEVANT)
+    )
+
+
+def test_intern_all_assigns_dense_codes():
+    interner = DocumentIdInterner()
+
+    assert list(interner.intern_all(["a", "b", "a", "c"])) == [0, 1, 0, 2]
+    assert list(interner.intern_many(["c", "d"])) == [2, 3]
+    assert interner.lookup(3) == "d"
+    assert len(interner) == 4
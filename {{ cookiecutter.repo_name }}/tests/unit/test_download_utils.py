@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from rich.console import Console
+from rich.progress import Progress
+
+from src.utils import download_utils
+from src.utils.download_utils import DownloadUtils, HttpCache
+
+SMALL = os.urandom(3000)
+LARGE = os.urandom(40000)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves `server.files` with strong ETags, conditional requests and single byte ranges."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.server.files[self.path]
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self.server.requests.append((self.command, self.path, self.headers.get("Range")))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match and self.headers.get("If-Range", etag) == etag:
+            start = int(match[1])
+            end = min(int(match[2] or len(body) - 1), len(body) - 1)
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            body = body[start : end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # Sends only part of the body of the listed requests, then drops the connection
+        cut = self.server.cut.pop((self.path, self.headers.get("Range")), None)
+        self.wfile.write(body[:cut])
+
+    def do_HEAD(self):
+        self.server.requests.append((self.command, self.path, None))
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.files = {"/small.bin": SMALL, "/large.bin": LARGE, "/empty.bin": b""}
+    server.requests = []
+    server.cut = {}
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def downloader(**kwargs):
+    options = dict(segments=4, segment_threshold=10000, chunk_size=1000, backoff=0.0)
+    options.update(kwargs)
+    utils = DownloadUtils(**options)
+    utils.progress = Progress(console=Console(quiet=True), disable=True)
+    return utils
+
+
+def test_small_file_takes_a_single_request(server, tmp_path):
+    results = downloader().download_urls([f"{server.url}/small.bin", f"{server.url}/empty.bin"], str(tmp_path))
+
+    assert [result.status for result in results] == ["downloaded", "downloaded"]
+    assert (tmp_path / "small.bin").read_bytes() == SMALL
+    assert (tmp_path / "empty.bin").read_bytes() == b""
+    assert sorted(request for request in server.requests if request[1] == "/small.bin") == [
+        ("GET", "/small.bin", "bytes=0-")
+    ]
+    # An empty file has no byte 0, it is fetched again without a range
+    assert [request[2] for request in server.requests if request[1] == "/empty.bin"] == ["bytes=0-", None]
+
+
+def test_large_file_is_segmented(server, tmp_path):
+    results = downloader().download_urls([f"{server.url}/large.bin"], str(tmp_path))
+
+    assert results[0].status == "downloaded"
+    assert (tmp_path / "large.bin").read_bytes() == LARGE
+    assert sorted(request[2] for request in server.requests) == [
+        "bytes=0-",
+        "bytes=0-9999",
+        "bytes=10000-19999",
+        "bytes=20000-29999",
+        "bytes=30000-39999",
+    ]
+    assert not os.path.exists(tmp_path / "large.bin.part.json")
+
+
+def test_unchanged_file_is_not_downloaded_again(server, tmp_path):
+    cache = HttpCache(tmp_path / "cache.json")
+    downloader(cache=cache).download_urls([f"{server.url}/small.bin"], str(tmp_path))
+    server.requests.clear()
+
+    results = downloader(cache=HttpCache(tmp_path / "cache.json")).download_urls(
+        [f"{server.url}/small.bin"], str(tmp_path)
+    )
+
+    assert results[0].status == "not_modified"
+    assert server.requests == [("GET", "/small.bin", "bytes=0-")]
+
+
+def test_interrupted_segments_resume_from_saved_state(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_utils, "STATE_SAVE_INTERVAL", 0.0)
+    saves = []
+    open_atomic = download_utils.FileUtils.open_atomic
+
+    def counting_open_atomic(path, fsync=False):
+        saves.append(path)
+        return open_atomic(path, fsync)
+
+    monkeypatch.setattr(download_utils.FileUtils, "open_atomic", counting_open_atomic)
+    server.cut[("/large.bin", "bytes=0-39999")] = 5500
+
+    results = downloader(segments=1, max_attempts=1).download_urls([f"{server.url}/large.bin"], str(tmp_path))
+
+    assert results[0].status == "failed"
+    # Saved after every chunk, not only once the segment ends
+    assert len(saves) >= 5
+    with open(tmp_path / "large.bin.part.json") as f:
+        assert json.load(f)["segments"][0]["written"] == 5500
+
+    server.requests.clear()
+    results = downloader(segments=1).download_urls([f"{server.url}/large.bin"], str(tmp_path))
+
+    assert results[0].status == "downloaded"
+    assert (tmp_path / "large.bin").read_bytes() == LARGE
+    assert sorted(request[2] for request in server.requests) == ["bytes=0-", "bytes=5500-39999"]
+
+
+def test_http_cache_entries(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"abc")
+    cache = HttpCache(tmp_path / "cache.json")
+    remote = {"size": 3, "etag": '"v1"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    cache.record_download("http://host/file.bin", str(path), remote)
+    cache.save()
+
+    reloaded = HttpCache(tmp_path / "cache.json")
+    assert reloaded.conditional_headers("http://host/file.bin", str(path)) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+    # Servers ignoring conditional requests are detected from the validators of their response
+    assert reloaded.is_unchanged("http://host/file.bin", remote)
+    assert not reloaded.is_unchanged("http://host/file.bin", dict(remote, etag='"v2"'))
+
+    # A local file that changed size is downloaded again without conditions
+    path.write_bytes(b"abcd")
+    assert reloaded.conditional_headers("http://host/file.bin", str(path)) == {}
+    assert reloaded.conditional_headers("http://host/other.bin", str(path)) == {}
@@ -0,0 +1,181 @@
+import os
+import re
+
+import pytest
+
+from src.utils.file_utils import FileUtils, json_loads
+
+LINES = [f"line {i} " + "x" * (i % 7) for i in range(100)] + ["", "last"]
+RECORDS = [{"query_id": f"q{i}", "retrieved": [f"d{j}" for j in range(i % 4)], "score": i / 3} for i in range(25)]
+
+
+def test_write_jsonl_and_iter_jsonl_batches(tmp_path):
+    path = tmp_path / "records.jsonl"
+
+    assert FileUtils.write_jsonl(iter(RECORDS), path, batch_size=7) == len(RECORDS)
+
+    batches = list(FileUtils.iter_jsonl_batches(path, batch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [record for batch in batches for record in batch] == RECORDS
+    assert list(FileUtils.iter_jsonl(path)) == RECORDS
+
+
+def test_write_jsonl_append_and_blank_lines(tmp_path):
+    path = tmp_path / "records.jsonl"
+    FileUtils.write_jsonl(RECORDS[:3], path)
+    with open(path, "a") as f:
+        f.write("\n")
+    FileUtils.write_jsonl(RECORDS[3:5], path, append=True)
+
+    assert list(FileUtils.iter_jsonl(path)) == RECORDS[:5]
+    assert list(FileUtils.iter_jsonl_batches(tmp_path / "records.jsonl", batch_size=5)) == [RECORDS[:5]]
+
+
+def test_json_roundtrip_keeps_big_integers(tmp_path):
+    data = {"id": 2**70, "values": [1, -(2**65), 0.5], "name": "x"}
+    FileUtils.write_json(data, tmp_path / "data.json")
+
+    assert FileUtils.read_json(tmp_path / "data.json") == data
+    assert json_loads(b"[12345678901234567890123]") == [12345678901234567890123]
+
+
+def test_open_atomic_replaces_on_success(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"old")
+
+    with FileUtils.open_atomic(path, fsync=True) as f:
+        f.write(b"new")
+        assert path.read_bytes() == b"old"
+
+    assert path.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+def test_open_atomic_cleans_up_on_error(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"old")
+
+    with pytest.raises(RuntimeError):
+        with FileUtils.open_atomic(path) as f:
+            f.write(b"partial")
+            raise RuntimeError("interrupted")
+
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+def test_failed_write_jsonl_keeps_previous_file(tmp_path):
+    path = tmp_path / "records.jsonl"
+    FileUtils.write_jsonl(RECORDS, path)
+
+    def records():
+        yield from RECORDS[:3]
+        raise ValueError("bad record")
+
+    with pytest.raises(ValueError):
+        FileUtils.write_jsonl(records(), path, batch_size=1)
+
+    assert list(FileUtils.iter_jsonl(path)) == RECORDS
+    assert os.listdir(tmp_path) == ["records.jsonl"]
+
+
+
+# Chunks are processed in worker processes, so the function lives at module level
+def collect(lines):
+    return list(lines)
+
+
+def test_iter_lines(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("\n".join(LINES) + "\n")
+
+    assert list(FileUtils.iter_lines(path, buffer_size=16)) == LINES
+    assert "".join(FileUtils.iter_lines(path, keepends=True)) == path.read_text()
+
+
+@pytest.mark.parametrize("num_chunks", [1, 3, 7, 1000])
+def test_chunk_offsets_are_line_aligned(tmp_path, num_chunks):
+    path = tmp_path / "lines.txt"
+    path.write_text("\n".join(LINES) + "\n")
+    data = path.read_bytes()
+
+    chunks = FileUtils.chunk_offsets(path, num_chunks)
+
+    assert 1 <= len(chunks) <= num_chunks
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    assert all(data[end - 1:end] == b"\n" for _, end in chunks)
+    assert FileUtils.chunk_offsets(tmp_path / "lines.txt", 0) == [(0, len(data))]
+
+
+def test_process_chunks(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("\n".join(LINES) + "\n")
+    (tmp_path / "empty.txt").write_text("")
+
+    results = FileUtils.process_chunks(path, collect, max_workers=3)
+
+    assert len(results) == 3
+    assert [line for chunk in results for line in chunk] == LINES
+    assert FileUtils.process_chunks(tmp_path / "empty.txt", collect, max_workers=3) == []
+
+
+def test_map_file(tmp_path):
+    (tmp_path / "data.bin").write_bytes(b"header" + bytes(range(256)))
+    (tmp_path / "empty.bin").write_bytes(b"")
+
+    with FileUtils.map_file(tmp_path / "data.bin") as view:
+        assert view.readonly
+        assert bytes(view[6:10]) == bytes([0, 1, 2, 3])
+        assert len(view) == 262
+    with FileUtils.map_file(tmp_path / "empty.bin") as view:
+        assert len(view) == 0
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in [
+        "a.jsonl",
+        "b.txt",
+        "raw/c.jsonl",
+        "raw/cache/d.jsonl",
+        "raw/part-1/e.jsonl",
+        "raw/part-1/cache/f.jsonl",
+        ".git/config",
+    ]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("x")
+    return tmp_path
+
+
+def relative(root, entries):
+    return sorted(os.path.relpath(entry.path, root) for entry in entries)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_walk(tree, max_workers):
+    assert relative(tree, FileUtils.walk(tree, exclude=[".git", "cache"], max_workers=max_workers)) == [
+        "a.jsonl",
+        "b.txt",
+        "raw/c.jsonl",
+        "raw/part-1/e.jsonl",
+    ]
+    assert relative(tree, FileUtils.walk(tree, exclude=[".git"], include=["*.jsonl"], max_workers=max_workers)) == [
+        "a.jsonl",
+        "raw/c.jsonl",
+        "raw/cache/d.jsonl",
+        "raw/part-1/cache/f.jsonl",
+        "raw/part-1/e.jsonl",
+    ]
+
+
+def test_walk_options(tree):
+    assert relative(tree, FileUtils.walk(tree, max_depth=1)) == ["a.jsonl", "b.txt"]
+    assert relative(tree, FileUtils.walk(tree, exclude=["raw/*/cache", ".git"], files=False, directories=True)) == [
+        "raw",
+        "raw/cache",
+        "raw/part-1",
+    ]
+    assert relative(tree, FileUtils.walk(tree, exclude=[re.compile(r"\.git|raw")])) == ["a.jsonl", "b.txt"]
+    assert relative(tree, FileUtils.walk(tree, file_filter=lambda entry: entry.name.startswith("e"))) == [
+        "raw/part-1/e.jsonl"
+    ]
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.utils import file_writer_utils
+from src.utils.file_writer_utils import BackgroundWriter
+
+
+def test_writes_to_the_same_path_keep_their_order(tmp_path):
+    with BackgroundWriter(max_workers=4) as writer:
+        for i in range(200):
+            writer.write_text(str(i), tmp_path / "last.txt")
+            writer.write_json({"i": i}, tmp_path / f"{i}.json")
+
+    assert (tmp_path / "last.txt").read_text() == "199"
+    assert (tmp_path / "150.json").read_text() == '{"i":150}'
+
+
+def test_flush_raises_the_first_error_then_resets(tmp_path):
+    writer = BackgroundWriter(max_workers=2)
+    writer.write_text("a", tmp_path / "a.txt")
+    failed = writer.write_text("b", tmp_path / "missing" / "b.txt")
+
+    with pytest.raises(FileNotFoundError):
+        writer.flush()
+    assert isinstance(failed.exception(), FileNotFoundError)
+
+    writer.write_text("c", tmp_path / "c.txt")
+    stats = writer.close()
+    assert (stats.files, stats.failed) == (2, 1)
+
+
+@pytest.mark.parametrize("fsync, expected", [("never", 0), ("batch", 25 + 3), ("always", 25)])
+def test_fsync_counts(tmp_path, fsync, expected):
+    with BackgroundWriter(max_workers=3, fsync=fsync, fsync_batch=10) as writer:
+        for i in range(25):
+            writer.write_bytes(b"x", tmp_path / f"{i}.bin")
+        # Batches of 10 files are synced with their directory as they fill up, the last 5 on flush
+        stats = writer.flush()
+
+    assert stats.fsyncs == expected
+
+
+def test_failed_fsync_is_reported(tmp_path, monkeypatch):
+    def fsync(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(file_writer_utils.os, "fsync", fsync)
+    writer = BackgroundWriter(fsync="batch")
+    writer.write_text("a", tmp_path / "a.txt")
+
+    with pytest.raises(OSError):
+        writer.flush()
+    assert (writer.stats.fsyncs, writer.stats.failed) == (0, 2)
+
+
+def test_atomic_writes_leave_no_temporary_files(tmp_path):
+    with BackgroundWriter(atomic=True, fsync="always") as writer:
+        for i in range(50):
+            writer.write_text(str(i), tmp_path / f"{i % 10}.txt")
+        failed = writer.write_text("x", tmp_path / "missing" / "x.txt")
+        with pytest.raises(FileNotFoundError):
+            writer.flush()
+
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{i}.txt" for i in range(10))
+    assert (tmp_path / "3.txt").read_text() == "43"
+    assert failed.exception() is not None
+
+
+def test_elapsed_is_busy_time(tmp_path):
+    writer = BackgroundWriter(fsync="never")
+    time.sleep(0.2)
+    writer.write_text("a", tmp_path / "a.txt").result()
+    time.sleep(0.2)
+
+    assert writer.close().elapsed < 0.2
+
+
+def test_asyncio(tmp_path):
+    async def main(writer):
+        await asyncio.wrap_future(writer.write_text("a", tmp_path / "a.txt"))
+        assert (tmp_path / "a.txt").read_text() == "a"
+        writer.write_text("b", tmp_path / "b.txt")
+        return await writer.flush_async()
+
+    with BackgroundWriter() as writer:
+        stats = asyncio.run(main(writer))
+
+    assert stats.files == 2
+    assert (tmp_path / "b.txt").read_text() == "b"
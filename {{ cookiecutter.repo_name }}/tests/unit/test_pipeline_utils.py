@@ -0,0 +1,110 @@
+import pytest
+
+from src.utils.pipeline_utils import Pipeline, Stage
+
+
+# Stages run in worker processes, so their functions live at module level
+def concat(inputs, outputs, separator=""):
+    outputs[0].write_text(separator.join(path.read_text() for path in inputs))
+
+
+def upper(input_file, output_file):
+    output_file.write_text(input_file.read_text().upper())
+
+
+def fail(inputs, outputs):
+    outputs[0].write_text("partial")
+    raise RuntimeError("boom")
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "a.txt").write_text("a")
+    (tmp_path / "raw" / "b.txt").write_text("b")
+    return tmp_path
+
+
+def statuses(report):
+    return {name: result.status for name, result in report.stages.items()}
+
+
+def test_glob_input_depends_on_matching_file_outputs_only(root):
+    pipeline = Pipeline(
+        [
+            Stage("merge", concat, ["interim/*.jsonl"], ["interim/merged.parquet"]),
+            Stage("stats", concat, ["interim/merged.parquet"], ["interim/stats.parquet"]),
+            Stage("split", upper, ["raw"], ["interim/parts"], sharded=True),
+            Stage("collect", concat, ["interim/parts/*.txt"], ["processed/parts.txt"]),
+        ],
+        root=root,
+    )
+
+    assert pipeline.dependencies == {
+        "merge": set(),
+        "stats": {"merge"},
+        "split": set(),
+        "collect": {"split"},
+    }
+
+
+def test_unchanged_stages_are_cached(root):
+    stages = [
+        Stage("concat", concat, ["raw/*.txt"], ["interim/all.txt"]),
+        Stage("upper", upper, ["raw"], ["interim/upper"], sharded=True),
+    ]
+
+    assert statuses(Pipeline(stages, root=root).run()) == {"concat": "run", "upper": "run"}
+    report = Pipeline(stages, root=root).run()
+
+    assert statuses(report) == {"concat": "cached", "upper": "cached"}
+    assert report.stages["upper"].shards_cached == 2
+    assert (root / "interim" / "all.txt").read_text() == "ab"
+
+
+def test_changed_input_and_params_run_again(root):
+    stages = [
+        Stage("concat", concat, ["raw/*.txt"], ["interim/all.txt"]),
+        Stage("upper", upper, ["raw"], ["interim/upper"], sharded=True),
+    ]
+    Pipeline(stages, root=root).run()
+
+    (root / "raw" / "b.txt").write_text("c")
+    report = Pipeline(stages, root=root).run()
+
+    assert statuses(report) == {"concat": "run", "upper": "run"}
+    assert (report.stages["upper"].shards_run, report.stages["upper"].shards_cached) == (1, 1)
+    assert (root / "interim" / "upper" / "b.txt").read_text() == "C"
+
+    stages[0].params = {"separator": ","}
+    assert statuses(Pipeline(stages, root=root).run())["concat"] == "run"
+    assert (root / "interim" / "all.txt").read_text() == "a,c"
+
+
+def test_removed_input_removes_its_shard(root):
+    stages = [Stage("upper", upper, ["raw"], ["interim/upper"], sharded=True, shard_suffix=".out")]
+    Pipeline(stages, root=root).run()
+    assert (root / "interim" / "upper" / "b.out").exists()
+
+    (root / "raw" / "b.txt").unlink()
+    Pipeline(stages, root=root).run()
+
+    assert sorted(path.name for path in (root / "interim" / "upper").iterdir()) == ["a.out"]
+
+
+def test_failure_blocks_downstream_and_is_not_cached(root):
+    stages = [
+        Stage("concat", concat, ["raw/*.txt"], ["interim/all.txt"]),
+        Stage("stats", concat, ["interim/all.txt"], ["processed/stats.txt"]),
+    ]
+    Pipeline(stages, root=root).run()
+
+    stages[0].func = fail
+    report = Pipeline(stages, root=root).run()
+    assert statuses(report) == {"concat": "failed", "stats": "blocked"}
+    assert "boom" in report.stages["concat"].error
+
+    # Back to the code of the last successful run, the partial output must still be rewritten
+    stages[0].func = concat
+    assert statuses(Pipeline(stages, root=root).run()) == {"concat": "run", "stats": "cached"}
+    assert (root / "interim" / "all.txt").read_text() == "ab"
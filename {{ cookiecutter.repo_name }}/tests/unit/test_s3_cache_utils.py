@@ -0,0 +1,70 @@
+import errno
+import os
+import stat
+
+import pytest
+
+from src.utils.s3_cache_utils import S3ObjectCache
+
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def s3_client():
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        client.create_bucket(Bucket="bucket-test")
+        for name in ("a", "b", "c"):
+            client.put_object(Bucket="bucket-test", Key=f"data/{name}.bin", Body=name.encode() * 100)
+        yield client
+
+
+def test_hardlinks_read_only_objects(tmp_path, s3_client):
+    cache = S3ObjectCache(tmp_path / "cache")
+
+    assert not cache.fetch(s3_client, "bucket-test", "data/a.bin", tmp_path / "first.bin")
+    assert cache.fetch(s3_client, "bucket-test", "data/a.bin", tmp_path / "second.bin")
+
+    first, second = (tmp_path / "first.bin").stat(), (tmp_path / "second.bin").stat()
+    assert os.path.samestat(first, second) and first.st_nlink == 3
+    assert not first.st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    assert (tmp_path / "second.bin").read_bytes() == b"a" * 100
+
+
+def test_copies_across_filesystems(tmp_path, s3_client, monkeypatch):
+    def link(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", link)
+    cache = S3ObjectCache(tmp_path / "cache")
+
+    cache.fetch(s3_client, "bucket-test", "data/a.bin", tmp_path / "a.bin")
+
+    assert (tmp_path / "a.bin").stat().st_nlink == 1
+    assert (tmp_path / "a.bin").read_bytes() == b"a" * 100
+
+
+def test_other_link_errors_are_raised(tmp_path, s3_client, monkeypatch):
+    def link(src, dst):
+        raise PermissionError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", link)
+
+    with pytest.raises(PermissionError):
+        S3ObjectCache(tmp_path / "cache").fetch(s3_client, "bucket-test", "data/a.bin", tmp_path / "a.bin")
+
+
+def test_eviction_removes_objects_and_their_locks(tmp_path, s3_client):
+    cache = S3ObjectCache(tmp_path / "cache", max_bytes=250, link_mode="copy")
+
+    for name in ("a", "b", "c"):
+        cache.fetch(s3_client, "bucket-test", f"data/{name}.bin", tmp_path / f"{name}.bin")
+
+    assert cache.size() == 200
+    assert len(os.listdir(cache.objects_dir)) == 2
+    object_locks = {name for name in os.listdir(cache.locks_dir) if name != "evict.lock"}
+    assert object_locks == {f"{name}.lock" for name in os.listdir(cache.objects_dir)}
+    # The evicted object is downloaded again
+    assert not cache.fetch(s3_client, "bucket-test", "data/a.bin", tmp_path / "a.bin")
@@ -0,0 +1,70 @@
+import gzip
+import importlib.util
+import io
+import os
+
+import pytest
+
+from src.utils.s3_compression_utils import CompressingReader, DecompressingWriter, decompress_file
+
+requires_zstandard = pytest.mark.skipif(importlib.util.find_spec("zstandard") is None, reason="needs zstandard")
+CODECS = ["gzip", pytest.param("zstd", marks=requires_zstandard)]
+
+
+@pytest.fixture
+def data():
+    # Mixes compressible and random bytes, over several reader chunks
+    return (b"query document relevance " * 20_000) + os.urandom(300_000)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_compress_and_decompress_file_roundtrip(tmp_path, data, codec):
+    reader = CompressingReader(io.BytesIO(data), codec, chunk_size=64 * 1024)
+    compressed = reader.read()
+    assert (reader.bytes_in, reader.bytes_out) == (len(data), len(compressed))
+    assert len(compressed) < len(data)
+
+    path = tmp_path / "data.bin"
+    path.write_bytes(compressed)
+    decompress_file(str(path), codec, chunk_size=10_000)
+
+    assert path.read_bytes() == data
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+def test_gzip_output_is_standard(data):
+    assert gzip.decompress(CompressingReader(io.BytesIO(data), "gzip").read()) == data
+
+
+def test_decompressing_writer_rejects_truncated_stream(data):
+    compressed = CompressingReader(io.BytesIO(data), "gzip").read()
+    writer = DecompressingWriter(io.BytesIO(), "gzip")
+    writer.write(compressed[:-100])
+
+    with pytest.raises(IOError, match="Truncated"):
+        writer.close()
+
+
+def test_decompressing_writer_keeps_the_original_error(data):
+    compressed = CompressingReader(io.BytesIO(data), "gzip").read()
+
+    with pytest.raises(ConnectionError):
+        with DecompressingWriter(io.BytesIO(), "gzip") as writer:
+            writer.write(compressed[:1000])
+            raise ConnectionError("connection reset")
+    assert writer.closed
+
+
+def test_decompress_file_keeps_the_source_on_error(tmp_path, data):
+    path = tmp_path / "data.gz"
+    path.write_bytes(CompressingReader(io.BytesIO(data), "gzip").read()[:-100])
+
+    with pytest.raises(IOError):
+        decompress_file(str(path), "gzip")
+
+    assert os.listdir(tmp_path) == ["data.gz"]
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        CompressingReader(io.BytesIO(b""), "brotli")
@@ -0,0 +1,75 @@
+from threading import Event, Lock
+
+import pytest
+
+from src.utils.s3_list_utils import S3Lister
+
+
+class StubS3:
+    """Records every `delete_objects` batch, reporting the keys listed in `failing` as errors."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.batches = []
+        self._lock = Lock()
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [item["Key"] for item in Delete["Objects"]]
+        with self._lock:
+            self.batches.append(keys)
+        return {"Errors": [{"Key": key, "Code": "AccessDenied"} for key in keys if key in self.failing]}
+
+
+def test_delete_objects_in_batches():
+    client = StubS3(failing={"key-7", "key-2400"})
+    keys = [f"key-{i}" for i in range(2500)]
+
+    report = S3Lister(client).delete_objects("bucket", iter(keys), max_workers=2)
+
+    assert sorted(map(len, client.batches)) == [500, 1000, 1000]
+    assert sorted(key for batch in client.batches for key in batch) == sorted(keys)
+    assert report.deleted == 2498
+    assert report.errors == {"key-7": "AccessDenied", "key-2400": "AccessDenied"}
+
+
+def test_delete_objects_reads_keys_lazily():
+    client = StubS3()
+    consumed = []
+
+    def keys():
+        for i in range(10_000):
+            # With one worker, a batch is only read once the previous one is deleted
+            assert len(consumed) <= (len(client.batches) + 1) * 100
+            consumed.append(i)
+            yield f"key-{i}"
+
+    report = S3Lister(client).delete_objects("bucket", keys(), batch_size=100, max_workers=1)
+
+    assert report.deleted == 10_000
+    assert len(client.batches) == 100
+
+
+def test_delete_objects_stops_on_cancel():
+    client = StubS3()
+    cancel_event = Event()
+    cancel_event.set()
+
+    report = S3Lister(client).delete_objects("bucket", ["a", "b"], cancel_event=cancel_event)
+
+    assert (report.deleted, client.batches) == (0, [])
+
+
+def test_iter_objects():
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        client.create_bucket(Bucket="bucket-test")
+        keys = [f"data/{split}/part-{i}.jsonl" for split in ("train", "test") for i in range(30)] + ["data/README"]
+        for key in keys:
+            client.put_object(Bucket="bucket-test", Key=key, Body=b"x")
+        lister = S3Lister(client, page_size=7)
+
+        assert sorted(item["Key"] for item in lister.iter_objects("bucket-test", "data/")) == sorted(keys)
+        assert [item["Key"] for item in lister.iter_objects("bucket-test", "data/", parallel=False)] == sorted(keys)
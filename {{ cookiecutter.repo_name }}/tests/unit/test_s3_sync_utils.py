@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from src.utils.s3_sync_utils import MANIFEST_NAME, PrefixSync
+from src.utils.s3_transfer_utils import MiB, multipart_etag
+
+moto = pytest.importorskip("moto")
+
+
+class CountingS3:
+    """Wraps a boto3 client, counting calls and failing the downloads of the keys listed in `failing`."""
+
+    def __init__(self, client, failing=()):
+        self.client = client
+        self.failing = set(failing)
+        self.calls = []
+
+    def download_file(self, bucket, key, path):
+        self.calls.append("download_file")
+        if key in self.failing:
+            with open(path, "wb") as f:
+                f.write(b"partial")
+            raise IOError(f"Connection reset while downloading {key}")
+        return self.client.download_file(bucket, key, path)
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.client, name)
+
+
+@pytest.fixture
+def s3_client():
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        client.create_bucket(Bucket="bucket-test")
+        yield client
+
+
+def write_tree(root):
+    (root / "raw" / "train").mkdir(parents=True)
+    (root / "raw" / "a.jsonl").write_bytes(b"a" * 100)
+    (root / "raw" / "train" / "b.jsonl").write_bytes(b"b" * 200)
+    (root / "raw" / "train" / "big.bin").write_bytes(os.urandom(6 * MiB))
+
+
+def test_upload_then_download_skips_unchanged_objects(tmp_path, s3_client):
+    write_tree(tmp_path)
+    client = CountingS3(s3_client)
+    sync = PrefixSync(client, "bucket-test", "datasets/raw", tmp_path / "raw", max_workers=2, part_size=5 * MiB)
+
+    report = sync.upload()
+    assert (report.transferred_files, report.skipped_files, report.failed) == (3, 0, [])
+    assert "head_object" not in client.calls
+    big = s3_client.head_object(Bucket="bucket-test", Key="datasets/raw/train/big.bin")
+    assert big["ETag"].strip('"') == multipart_etag(str(tmp_path / "raw" / "train" / "big.bin"), 5 * MiB)
+
+    report = sync.upload()
+    assert (report.transferred_files, report.skipped_files) == (0, 3)
+
+    (tmp_path / "raw" / "a.jsonl").write_bytes(b"changed")
+    report = sync.upload()
+    assert (report.transferred_files, report.transferred_bytes, report.skipped_files) == (1, 7, 2)
+
+    # A fresh directory downloads everything once, then only what changed in the bucket
+    mirror = PrefixSync(s3_client, "bucket-test", "datasets/raw", tmp_path / "mirror", max_workers=2)
+    report = mirror.download()
+    assert (report.transferred_files, report.skipped_files) == (3, 0)
+    assert (tmp_path / "mirror" / "train" / "big.bin").read_bytes() == (
+        tmp_path / "raw" / "train" / "big.bin"
+    ).read_bytes()
+    assert mirror.download().skipped_files == 3
+
+    s3_client.put_object(Bucket="bucket-test", Key="datasets/raw/train/b.jsonl", Body=b"new")
+    report = mirror.download()
+    assert (report.transferred_files, report.skipped_files) == (1, 2)
+    assert (tmp_path / "mirror" / "train" / "b.jsonl").read_bytes() == b"new"
+
+
+def test_failed_download_leaves_no_temporary_file(tmp_path, s3_client):
+    write_tree(tmp_path)
+    PrefixSync(s3_client, "bucket-test", "datasets/raw", tmp_path / "raw").upload()
+    client = CountingS3(s3_client, failing=["datasets/raw/train/b.jsonl"])
+
+    report = PrefixSync(client, "bucket-test", "datasets/raw", tmp_path / "mirror").download()
+
+    assert (report.transferred_files, report.failed) == (2, ["train/b.jsonl"])
+    assert sorted(path.name for path in (tmp_path / "mirror").rglob("*")) == sorted(
+        [MANIFEST_NAME, "a.jsonl", "train", "big.bin"]
+    )
@@ -0,0 +1,123 @@
+import hashlib
+import io
+from threading import Event, Lock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src.utils.s3_transfer_utils import MiB, StreamingMultipartUploader, TransferCancelledError
+
+PART_SIZE = 5 * MiB
+
+
+def client_error(code="InternalError"):
+    return ClientError({"Error": dict(Code=code, Message=code)}, "Request")
+
+
+class StubS3:
+    """Records the requests of the uploader, failing the ones listed in `failures` as many times as given."""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.parts = {}
+        self._lock = Lock()
+
+    def _record(self, name, **kwargs):
+        with self._lock:
+            self.calls.append((name, kwargs))
+            key = (name, kwargs.get("PartNumber"))
+            if self.failures.get(key, 0):
+                self.failures[key] -= 1
+                raise client_error()
+
+    def put_object(self, **kwargs):
+        self._record("put_object", **kwargs)
+        return {"ETag": f'"{hashlib.md5(kwargs["Body"]).hexdigest()}"'}
+
+    def create_multipart_upload(self, **kwargs):
+        self._record("create_multipart_upload", **kwargs)
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, **kwargs):
+        body = kwargs["Body"].read()
+        self._record("upload_part", **kwargs)
+        self.parts[kwargs["PartNumber"]] = hashlib.md5(body).digest()
+        return {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, **kwargs):
+        self._record("complete_multipart_upload", **kwargs)
+        digests = b"".join(self.parts[number] for number in sorted(self.parts))
+        return {"ETag": f'"{hashlib.md5(digests).hexdigest()}-{len(self.parts)}"'}
+
+    def abort_multipart_upload(self, **kwargs):
+        self._record("abort_multipart_upload", **kwargs)
+
+    def names(self):
+        return [name for name, _ in self.calls]
+
+
+def test_multipart_upload():
+    data = bytes(range(256)) * (11 * MiB // 256)
+    client = StubS3(failures={("upload_part", 2): 1})
+
+    report = StreamingMultipartUploader(client, part_size=PART_SIZE).upload(io.BytesIO(data), "bucket", "key")
+
+    assert (report.parts, report.size) == (3, len(data))
+    assert report.sha256 == hashlib.sha256(data).hexdigest()
+    assert client.names().count("upload_part") == 4
+    assert "abort_multipart_upload" not in client.names()
+
+
+def test_multipart_upload_aborts_on_error():
+    client = StubS3(failures={("upload_part", 2): 3})
+
+    with pytest.raises(ClientError):
+        StreamingMultipartUploader(client, part_size=PART_SIZE).upload(io.BytesIO(b"x" * 11 * MiB), "bucket", "key")
+
+    assert client.names()[-1] == "abort_multipart_upload"
+    assert "complete_multipart_upload" not in client.names()
+
+
+def test_multipart_upload_aborts_on_cancel():
+    client = StubS3()
+    cancel_event = Event()
+
+    class CancelledStream(io.BytesIO):
+        # Cancels the upload while its second part is read
+        def readinto(self, buffer):
+            if self.tell() >= PART_SIZE:
+                cancel_event.set()
+            return super().readinto(buffer)
+
+    with pytest.raises(TransferCancelledError):
+        StreamingMultipartUploader(client, part_size=PART_SIZE).upload(
+            CancelledStream(b"x" * 11 * MiB), "bucket", "key", cancel_event=cancel_event
+        )
+
+    assert client.names()[-1] == "abort_multipart_upload"
+    assert "complete_multipart_upload" not in client.names()
+
+
+def test_single_part_upload_retries():
+    client = StubS3(failures={("put_object", None): 2})
+
+    report = StreamingMultipartUploader(client, part_size=PART_SIZE).upload(io.BytesIO(b"small"), "bucket", "key")
+
+    assert (report.parts, report.size, report.etag) == (1, 5, hashlib.md5(b"small").hexdigest())
+    assert client.names() == ["put_object"] * 3
+
+
+def test_single_part_upload_gives_up_and_honours_cancel():
+    client = StubS3(failures={("put_object", None): 3})
+    with pytest.raises(ClientError):
+        StreamingMultipartUploader(client, part_size=PART_SIZE).upload(io.BytesIO(b"small"), "bucket", "key")
+
+    cancel_event = Event()
+    cancel_event.set()
+    client = StubS3()
+    with pytest.raises(TransferCancelledError):
+        StreamingMultipartUploader(client, part_size=PART_SIZE).upload(
+            io.BytesIO(b"small"), "bucket", "key", cancel_event=cancel_event
+        )
+    assert client.calls == []
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from rich.console import Console
+from rich.progress import Progress
+
+from src.utils.aws_client_utils import AWSClientCache
+from src.utils.s3_utils import AWSUtils
+
+
+def quiet(aws):
+    aws.progress = Progress(console=Console(quiet=True), disable=True)
+    return aws
+
+
+def test_transfers_run_off_the_event_loop_with_bounded_concurrency():
+    aws = quiet(AWSUtils(max_concurrency=2))
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def transfer(index, cancel_event):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return index
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(aws._run_transfer(transfer, i) for i in range(6)))
+        ticking.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+
+    assert results == list(range(6))
+    assert peak[0] == 2
+    # The loop kept running while the threads slept
+    assert ticks >= 10
+
+
+def test_cancelling_the_task_stops_the_transfer():
+    aws = quiet(AWSUtils(max_concurrency=1))
+    stopped = threading.Event()
+
+    def transfer(cancel_event):
+        while not cancel_event.wait(0.01):
+            pass
+        time.sleep(0.05)
+        stopped.set()
+
+    async def main():
+        task = asyncio.create_task(aws._run_transfer(transfer))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The slot is only released once the thread stopped
+        assert stopped.is_set()
+        return await aws._run_transfer(lambda cancel_event: cancel_event.is_set())
+
+    assert asyncio.run(main()) is False
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_upload_and_download_roundtrip(tmp_path, monkeypatch, compression):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    data = b"".join(f"line {i}\n".encode() for i in range(10000))
+    (tmp_path / "data.txt").write_bytes(data)
+    (tmp_path / "out").mkdir()
+
+    with moto.mock_aws():
+        AWSClientCache.clear()
+        aws = quiet(AWSUtils())
+        aws.s3_client.create_bucket(Bucket="bucket-test")
+
+        async def main():
+            await aws.upload_file_s3("bucket-test", "raw/data.txt", tmp_path / "data.txt", compression=compression)
+            await aws.download_file_s3("bucket-test", "raw/data.txt", str(tmp_path / "out"))
+
+        asyncio.run(main())
+        head = aws.s3_client.head_object(Bucket="bucket-test", Key="raw/data.txt")
+        AWSClientCache.clear()
+
+    assert (tmp_path / "out" / "data.txt").read_bytes() == data
+    assert head.get("ContentEncoding") == compression
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from src.utils.significance_utils import SignificanceUtils
+
+
+@pytest.fixture
+def scores():
+    return np.random.default_rng(0).uniform(0.2, 0.8, size=200)
+
+
+def test_bootstrap_ci_contains_the_mean(scores):
+    result = SignificanceUtils.bootstrap_ci(scores, n_resamples=2000, seed=0)
+
+    assert result["mean"] == pytest.approx(scores.mean())
+    assert result["ci_low"] < result["mean"] < result["ci_high"]
+
+
+def test_paired_bootstrap_identical_systems(scores):
+    result = SignificanceUtils.paired_bootstrap(scores, scores, n_resamples=2000, seed=0)
+
+    assert result["mean_diff"] == 0.0
+    assert result["p_value"] == pytest.approx(1.0)
+
+
+def test_paired_bootstrap_dominant_system(scores):
+    result = SignificanceUtils.paired_bootstrap(scores, scores + 0.1, n_resamples=2000, seed=0)
+
+    assert result["mean_diff"] == pytest.approx(0.1)
+    assert result["p_value"] < 0.001
+    assert result["ci_low"] == pytest.approx(0.1)
+
+
+def test_paired_bootstrap_noise_is_not_significant(scores):
+    noise = np.random.default_rng(1).normal(0.0, 0.05, size=len(scores))
+    noise -= noise.mean()
+
+    result = SignificanceUtils.paired_bootstrap(scores, scores + noise, n_resamples=2000, seed=0)
+
+    assert result["p_value"] > 0.5
+
+
+def test_paired_bootstrap_keeps_float64_precision():
+    # A constant difference of 0.1 resamples to 0.1 exactly in float64, to 0.10000000149 in float32
+    result = SignificanceUtils.paired_bootstrap(np.zeros(100), np.full(100, 0.1), n_resamples=200, seed=0)
+
+    assert result["ci_low"] == pytest.approx(0.1, rel=1e-12)
+    assert result["ci_high"] == pytest.approx(0.1, rel=1e-12)
+
+
+def test_randomization_test(scores):
+    assert SignificanceUtils.randomization_test(scores, scores, n_resamples=2000, seed=0)["p_value"] == 1.0
+    assert SignificanceUtils.randomization_test(scores, scores + 0.1, n_resamples=2000, seed=0)["p_value"] < 0.001
+
+
+def test_results_do_not_depend_on_workers(scores):
+    one = SignificanceUtils.paired_bootstrap(scores, scores[::-1], n_resamples=500, seed=3, max_workers=1)
+    four = SignificanceUtils.paired_bootstrap(scores, scores[::-1], n_resamples=500, seed=3, max_workers=4)
+
+    assert one == four
@@ -0,0 +1,60 @@
+import pytest
+
+from src.utils.evaluator_utils import MetricSums
+from src.utils.file_utils import FileUtils
+from src.utils.stream_evaluator_utils import StreamingRetrievalEvaluator
+
+RUNS = {
+    "q1": ["d1", "d2", "d3", "d4"],
+    "q2": ["d5", "d6"],
+    "q3": ["d7", "d8", "d9"],
+    "q4": ["d1"],
+}
+QRELS = {
+    "q1": ["d2", "d4"],
+    "q2": ["d9"],
+    "q3": ["d7", "d9"],
+    "q5": ["d1"],
+}
+
+
+def in_memory(runs, qrels, k):
+    sums = MetricSums(k)
+    for query_id, retrieved in runs.items():
+        if query_id in qrels:
+            sums.add(retrieved, qrels[query_id])
+    return {**sums.means(), "num_queries": sums.count}
+
+
+@pytest.mark.parametrize("num_shards", [1, 3])
+def test_matches_in_memory_evaluation(tmp_path, num_shards):
+    FileUtils.write_jsonl([{"query_id": q, "retrieved": docs} for q, docs in RUNS.items()], tmp_path / "run.jsonl")
+    FileUtils.write_jsonl([{"query_id": q, "relevant": docs} for q, docs in QRELS.items()], tmp_path / "qrels.jsonl")
+
+    evaluator = StreamingRetrievalEvaluator(k=3, max_workers=2, num_shards=num_shards)
+    result = evaluator.evaluate(tmp_path / "run.jsonl", tmp_path / "qrels.jsonl")
+
+    assert result == pytest.approx(in_memory(RUNS, QRELS, k=3))
+    assert result["num_queries"] == 3
+
+
+def test_repeated_rows_are_merged_per_query(tmp_path):
+    FileUtils.write_jsonl(
+        [
+            {"query_id": "q1", "retrieved": ["d1", "d2"]},
+            {"query_id": "q1", "retrieved": ["d2", "d3", "d4"]},
+        ],
+        tmp_path / "run.jsonl",
+    )
+    FileUtils.write_jsonl(
+        [
+            {"query_id": "q1", "relevant": ["d2", "d4"]},
+            {"query_id": "q1", "relevant": ["d4"]},
+        ],
+        tmp_path / "qrels.jsonl",
+    )
+
+    result = StreamingRetrievalEvaluator(k=3, max_workers=1).evaluate(tmp_path / "run.jsonl", tmp_path / "qrels.jsonl")
+
+    assert result == pytest.approx(in_memory({"q1": ["d1", "d2", "d3", "d4"]}, {"q1": ["d2", "d4"]}, k=3))
+    assert result["num_queries"] == 1
@@ -0,0 +1,84 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from src.utils.transfer_scheduler_utils import TokenBucket, TransferScheduler, parse_retry_after
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate=10.0, capacity=5.0)
+    start = bucket.updated
+
+    bucket.consume(5.0, start)
+    assert bucket.wait_time(2.0, start) == pytest.approx(0.2)
+    assert bucket.wait_time(2.0, start + 0.2) == pytest.approx(0.0)
+    # Refills up to the capacity only, and an amount above it only needs a full bucket
+    assert bucket.wait_time(50.0, start + 60.0) == 0.0
+    assert bucket.tokens == 5.0
+    bucket.consume(50.0, start + 60.0)
+    assert bucket.wait_time(1.0, start + 60.0) == pytest.approx(4.6)
+
+
+def run_in_thread(func, *args):
+    thread = threading.Thread(target=func, args=args)
+    thread.start()
+    return thread
+
+
+def test_higher_priority_goes_first():
+    scheduler = TransferScheduler(requests_per_second=10.0, burst_seconds=0.1)
+    scheduler.acquire_request("example.com")
+    order = []
+
+    low = run_in_thread(lambda: (scheduler.acquire_request("example.com", "low"), order.append("low")))
+    time.sleep(0.02)
+    high = run_in_thread(lambda: (scheduler.acquire_request("example.com", "high"), order.append("high")))
+    low.join(timeout=5)
+    high.join(timeout=5)
+
+    assert order == ["high", "low"]
+
+
+def test_byte_waiters_do_not_hold_back_requests():
+    scheduler = TransferScheduler(bytes_per_second=1000.0, requests_per_second=1000.0)
+    scheduler.acquire_bytes("example.com", 1000)
+    # Waits about half a second for bandwidth
+    transfer = run_in_thread(scheduler.acquire_bytes, "example.com", 500, "high")
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    scheduler.acquire_request("example.com", "low")
+    assert time.monotonic() - start < 0.2
+    transfer.join(timeout=5)
+
+
+def test_penalize_pauses_only_the_host():
+    scheduler = TransferScheduler()
+    start = time.monotonic()
+
+    assert scheduler.penalize("example.com", "0.2") == 0.2
+    scheduler.acquire_request("other.com")
+    assert time.monotonic() - start < 0.1
+    scheduler.acquire_request("example.com")
+    assert time.monotonic() - start >= 0.2
+    # The pause is forgotten once over, later acquisitions take the fast path again
+    assert scheduler._paused_until == {}
+
+
+def test_penalize_drops_expired_pauses():
+    scheduler = TransferScheduler()
+    scheduler.penalize("a.com", 0)
+    scheduler.penalize("b.com", 10)
+
+    assert list(scheduler._paused_until) == ["b.com"]
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None, default=1.5) == 1.5
+    assert parse_retry_after("soon", default=2.0) == 2.0
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30